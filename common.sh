@@ -129,7 +129,7 @@ COMMON_DIR=$XCCDF_VALUE_REPORT_DIR/common
 #
 # If set to 'sign' (default), GPG signature is consulted.  If 'all',
 # all packages are native.  If set to path to a file, packages listed
-# there are native.
+# there are native.  The package name is the first field of a line.
 #
 DIST_NATIVE=$XCCDF_VALUE_DIST_NATIVE
 
@@ -412,6 +412,23 @@ check_applies_to() {
     fi
 }
 
+_is_pkg_in_log() {
+    #
+    # Function checks if package $1 is listed in log file $2, e.g. $VALUE_RPM_QA.
+    #
+    # The index made by preupg (log file with .idx suffix, sorted by package
+    # names) is searched by binary search when it is up to date.
+    # Return: 0 - package is listed
+    #         1 - package is NOT listed
+    local index="$2.idx"
+    if [ -f "$index" ] && [ ! "$2" -nt "$index" ] && command -v look >/dev/null; then
+        LC_ALL=C look "$1"$'\t' "$index" >/dev/null
+        return $?
+    fi
+    # the same rule as in the Python API: the first field of a line is the name
+    awk -v pkg="$1" '$1 == pkg {found = 1; exit} END {exit !found}' "$2"
+}
+
 is_pkg_installed() {
     #
     # Function checks if package is installed.
@@ -419,7 +436,7 @@ is_pkg_installed() {
     # Parameter is a package name which will be checked.
     # Return: 0 - package is installed
     #         1 - package is NOT installed
-    grep -q "^$1[[:space:]]" $VALUE_RPM_QA || return 1
+    _is_pkg_in_log "$1" $VALUE_RPM_QA || return 1
     return 0
 }
 
@@ -447,7 +464,7 @@ check_rpm_to() {
         RPM_NAME=$(echo "$RPM_NAME" | tr "," " ")
         for pkg in $RPM_NAME
         do
-            grep "^$pkg[[:space:]]" $VALUE_RPM_QA > /dev/null
+            _is_pkg_in_log "$pkg" $VALUE_RPM_QA
             if [ $? -ne 0 ]; then
                 log_high_risk "Package $pkg is not installed."
                 NOT_APPLICABLE=1
@@ -459,7 +476,8 @@ check_rpm_to() {
         BINARY_NAME=$(echo "$BINARY_NAME" | tr "," " ")
         for bin in $BINARY_NAME
         do
-            which "$bin" > /dev/null 2>&1
+            # the builtin does not start which for each binary
+            type -P "$bin" > /dev/null 2>&1
             if [ $? -ne 0 ]; then
                 log_high_risk "Binary $bin is not installed."
                 NOT_APPLICABLE=1
@@ -508,6 +526,32 @@ service_is_enabled() {
     return 1
 }
 
+config_file_changed() {
+    #
+    # Function checks if config file $1 is listed in $VALUE_CONFIGCHANGED
+    #
+    # Return: 0 - config file has been changed
+    #         1 - config file hasn't been changed
+    #
+    [ -f "$VALUE_CONFIGCHANGED" ] || return 1
+    # lines look like 'S.5....T.  c /etc/file'
+    awk -v path="$1" 'index($0, " /") && substr($0, index($0, " /") + 1) == path {found = 1; exit}
+                      END {exit !found}' "$VALUE_CONFIGCHANGED"
+}
+
+config_dir_changed() {
+    #
+    # Function checks if any config file in directory $1 or its subdirectories
+    # is listed in $VALUE_CONFIGCHANGED
+    #
+    # Return: 0 - some config file has been changed
+    #         1 - no config file has been changed
+    #
+    [ -f "$VALUE_CONFIGCHANGED" ] || return 1
+    awk -v dir="${1%/}/" 'index($0, " /") && index(substr($0, index($0, " /") + 1), dir) == 1 {found = 1; exit}
+                          END {exit !found}' "$VALUE_CONFIGCHANGED"
+}
+
 backup_config_file() {
     #
     # backup the config file
@@ -524,7 +568,7 @@ backup_config_file() {
     fi
 
     # config file is changed?
-    grep -qe " ${CONFIG_FILE}" ${VALUE_CONFIGCHANGED} || return 2
+    config_file_changed "$CONFIG_FILE" || return 2
 
     mkdir -p "${VALUE_TMP_PREUPGRADE}/$(dirname "$CONFIG_FILE")"
     cp -f "${CONFIG_FILE}" "${VALUE_TMP_PREUPGRADE}${CONFIG_FILE}"
@@ -597,13 +641,13 @@ is_dist_native() {
     fi
     local pkg=$1
 
-    grep "^$pkg[[:space:]]" $VALUE_RPM_QA > /dev/null
+    _is_pkg_in_log "$pkg" $VALUE_RPM_QA
     if [ $? -ne 0 ]; then
         log_warning "Package $pkg is not installed on Red Hat Enterprise Linux system."
         return 1
     fi
     if [ x"$DEVEL_MODE" == "x0" ]; then
-        grep "^$pkg[[:space:]]" $VALUE_RPM_RHSIGNED > /dev/null
+        _is_pkg_in_log "$pkg" $VALUE_RPM_RHSIGNED
         if [ $? -eq 0 ]; then
             return 0
         else
@@ -615,7 +659,7 @@ is_dist_native() {
                 return 0
                 ;;
             "sign")
-                grep "^$pkg[[:space:]]" $VALUE_RPM_RHSIGNED > /dev/null
+                _is_pkg_in_log "$pkg" $VALUE_RPM_RHSIGNED
                 if [ $? -eq 0 ]; then
                     return 0
                 else
@@ -624,10 +668,8 @@ is_dist_native() {
                 ;;
             *)
                 if [ -f "$DIST_NATIVE" ]; then
-                    grep "^$pkg" "$DIST_NATIVE" > /dev/null
-                    if [ $? -eq 0 ]; then
-                        return 0
-                    fi
+                    _is_pkg_in_log "$pkg" "$DIST_NATIVE"
+                    return $?
                 fi
                 return 1
                 ;;
@@ -635,16 +677,63 @@ is_dist_native() {
     fi
 }
 
+_get_native_pkgs() {
+    #
+    # Function prints installed packages which are listed in the file $1
+    #
+    awk 'FILENAME == ARGV[1] {native[$1]; next} ($1 in native) {print $1}' "$1" "$VALUE_RPM_QA"
+}
+
 get_dist_native_list() {
     #
     # return list of all dist native packages according to is_dist_native()
     #
-    local pkg
-    local line
-    while read line; do
-        pkg=$(echo "$line" | grep -Eom1 '^[^[:space:]]+')
-        is_dist_native "$pkg" >/dev/null && echo "$pkg"
-    done < "$VALUE_RPM_QA"
+    # The list is stored to $PREUPGRADE_CACHE/dist_native.log (shared
+    # with the Python API), so that other modules just read it. The header
+    # contains sizes of the inputs, a change within the same second as
+    # the list was stored is noticed as well.
+    #
+    local cache="$PREUPGRADE_CACHE/dist_native.log"
+    local inputs=("$VALUE_RPM_QA")
+    local input
+    local sizes=""
+    local header
+    local valid=0
+    local list
+
+    if [ x"$DEVEL_MODE" == "x0" ] || [ "$DIST_NATIVE" == "sign" ]; then
+        inputs+=("$VALUE_RPM_RHSIGNED")
+    elif [ "$DIST_NATIVE" != "all" ]; then
+        inputs+=("$DIST_NATIVE")
+    fi
+    for input in "${inputs[@]}"; do
+        sizes+="${sizes:+,}$(stat -c %s "$input" 2>/dev/null || echo -)"
+    done
+    header="# DEVEL_MODE=$DEVEL_MODE DIST_NATIVE=$DIST_NATIVE RPM_QA=$VALUE_RPM_QA SIZES=$sizes"
+    if [ -f "$cache" ] && [ "$(head -n 1 "$cache")" == "$header" ]; then
+        valid=1
+        for input in "${inputs[@]}"; do
+            [ -e "$input" ] && [ ! "$input" -nt "$cache" ] || valid=0
+        done
+    fi
+    if [ $valid -eq 1 ]; then
+        tail -n +2 "$cache"
+        return 0
+    fi
+
+    if [ x"$DEVEL_MODE" == "x0" ] || [ "$DIST_NATIVE" == "sign" ]; then
+        list=$(_get_native_pkgs "$VALUE_RPM_RHSIGNED")
+    elif [ "$DIST_NATIVE" == "all" ]; then
+        list=$(awk '{print $1}' "$VALUE_RPM_QA")
+    elif [ -f "$DIST_NATIVE" ]; then
+        list=$(_get_native_pkgs "$DIST_NATIVE")
+    fi
+    {
+        echo "$header"
+        [ -n "$list" ] && echo "$list"
+    } > "$cache.$$" 2>/dev/null && mv -f "$cache.$$" "$cache" 2>/dev/null || rm -f "$cache.$$"
+    [ -n "$list" ] && echo "$list"
+    return 0
 }
 
 
@@ -7,6 +7,10 @@ from __future__ import unicode_literals, print_function
 import shutil
 import datetime
 import os
+import sys
+import copy
+import signal
+import threading
 import six
 import logging
 from distutils import dir_util
@@ -20,10 +24,16 @@ from preupg import xml_manager, settings
 from preupg.common import Common
 from preupg.settings import ReturnValues
 from preupg.scanning import ScanProgress, ScanningHelper
+from preupg.sce import SCEScanner, ModuleWatchdog
+from preupg.scheduler import ModuleScheduler
+from preupg.incremental import IncrementalCache
+from preupg.history import ModuleHistory
+from preupg.journal import ScanJournal
+from preupg.forkserver import ForkServer
 from preupg.utils import FileHelper, ProcessHelper, DirHelper, OpenSCAPHelper
 from preupg.utils import MessageHelper, TarballHelper, SystemIdentification
-from preupg.utils import PostupgradeHelper, ConfigHelper, ConfigFilesHelper
-from preupg.xccdf import XccdfHelper
+from preupg.utils import PostupgradeHelper, ConfigHelper, ConfigFilesHelper, OutputTail
+from preupg.xccdf import XccdfHelper, RiskSummary
 from preupg.logger import log_message, LoggerHelper, logger, logger_report
 from preupg.logger import logger_debug
 from preupg.report_parser import ReportParser
@@ -101,6 +111,9 @@ class Application(object):
         self.third_party = ""
         self.assessment_dir = None
         self.list_scans = []
+        # journal of the currently scanned content, see --resume
+        self.journal = None
+        self.resuming = False
 
     def _add_report_log_file(self):
         """
@@ -228,25 +241,44 @@ class Application(object):
         """Returns a total check"""
         return self.report_parser.get_number_checks()
 
-    def run_scan_process(self):
-        """Function scans the source system"""
+    def run_scan_process(self, quiet=False):
+        """
+        Function scans the source system
+
+        quiet scan does not show its progress, it is used for 3rdparty
+        contents scanned together with the main one
+        """
         self.xml_mgr = xml_manager.XmlManager(self.conf.assessment_results_dir,
                                               self.get_scenario(),
                                               os.path.basename(self.content),
+                                              OpenSCAPHelper.get_third_party_name(self.third_party) +
                                               self.conf.result_prefix)
 
-        self.report_parser.add_global_tags(self.conf.assessment_results_dir,
-                                           self.get_proper_scenario(self.get_scenario()),
-                                           self.conf.mode,
-                                           self._devel_mode,
-                                           self._dist_mode)
-
-        self.report_parser.modify_result_path(self.conf.assessment_results_dir,
-                                              self.get_proper_scenario(self.get_scenario()),
-                                              self.conf.mode)
+        self.journal = ScanJournal(self.conf.assessment_results_dir,
+                                   self.third_party or self.get_scenario())
+        # the content of the interrupted assessment was already prepared
+        if not self.journal.is_prepared():
+            self.report_parser.begin()
+            try:
+                self.report_parser.add_global_tags(self.conf.assessment_results_dir,
+                                                   self.get_proper_scenario(self.get_scenario()),
+                                                   self.conf.mode,
+                                                   self._devel_mode,
+                                                   self._dist_mode,
+                                                   output_dir=self.get_output_dir())
+
+                self.report_parser.modify_result_path(self.conf.assessment_results_dir,
+                                                      self.get_proper_scenario(self.get_scenario()),
+                                                      self.conf.mode)
+            finally:
+                self.report_parser.commit()
+            self.journal.set_prepared()
         # Execute assessment
-        self.scanning_progress = ScanProgress(self.get_total_check(), self.conf.debug)
+        self.scanning_progress = ScanProgress(self.get_total_check(), self.conf.debug, quiet=quiet)
         self.scanning_progress.set_names(self.report_parser.get_name_of_checks())
+        if quiet:
+            self.run_scan(function=self.scanning_progress.show_progress)
+            return
         log_message('%s:' % settings.assessment_text, new_line=True)
         log_message('%.3d/%.3d ...running (%s)' % (
                     1,
@@ -268,10 +300,172 @@ class Application(object):
         The function is used for either scanning system or
         for applying changes on the target system
         """
+        # check scripts in their own process groups get Ctrl+C too
+        previous_handler = ProcessHelper.forward_interrupt()
+        try:
+            return self._run_scan(function)
+        finally:
+            if previous_handler is not None:
+                signal.signal(signal.SIGINT, previous_handler)
+
+    def _run_sce_scan(self, scanner, function, cache, forkserver):
+        if self.resuming:
+            self.reset_unfinished_modules(scanner.get_rules())
+        if forkserver is not None:
+            forkserver.start()
+        try:
+            ret_val = scanner.run(function=function)
+        finally:
+            if forkserver is not None:
+                forkserver.stop()
+        if self.resuming:
+            log_message("Results of %d modules were taken from the interrupted "
+                        "assessment." % scanner.get_resumed_count())
+        if cache is not None:
+            log_message("Results of %d unchanged modules were reused "
+                        "from the previous assessment." % scanner.get_reused_count())
+        return ret_val
+
+    def _run_scan(self, function):
+        if self.conf.jobs or self.conf.incremental or self.conf.resume or self.conf.forkserver:
+            # check scripts are executed in parallel instead of oscap
+            result_file = self.openscap_helper.get_default_xml_result_path()
+            jobs = self.conf.jobs or 1
+            logger_debug.debug('running %s check scripts in parallel: %s',
+                               jobs, self.content)
+            cache = None
+            if self.conf.incremental:
+                cache = IncrementalCache(self.third_party or self.get_scenario(),
+                                         os.path.join(self.conf.cache_dir, settings.common_name),
+                                         self.conf.common_scripts,
+                                         output_dir=self.get_output_dir())
+            forkserver = None
+            if self.conf.forkserver:
+                forkserver = ForkServer()
+            scanner = SCEScanner(self.content, result_file, jobs, cache=cache,
+                                 history=ModuleHistory(),
+                                 module_timeout=self.get_timeout('module_timeout'),
+                                 scan_timeout=self.get_timeout('scan_timeout'),
+                                 journal=self.journal,
+                                 forkserver=forkserver)
+            unknown_platforms = scanner.get_unknown_platforms()
+            if unknown_platforms:
+                # applicability of the modules would differ from oscap
+                log_message("The platforms %s can be evaluated by oscap only, the modules "
+                            "are executed by oscap." % ', '.join(unknown_platforms))
+            else:
+                return self._run_sce_scan(scanner, function, cache, forkserver)
         cmd = self.openscap_helper.build_command()
         logger_debug.debug('running_command: %s', cmd)
+        module_timeout = self.get_timeout('module_timeout')
+        scan_timeout = self.get_timeout('scan_timeout')
+        rules = SCEScanner(self.content, None, 1).get_rules()
+        watchdog = None
+        if module_timeout or scan_timeout or [x for x in rules if x.get_timeout()]:
+            # oscap does not report which module is running, so the limit
+            # is measured from the last finished module. oscap is not killed
+            # at the end of the assessment, remaining modules are skipped
+            # so that the result file is written
+            watchdog = ModuleWatchdog(module_timeout, rules, scan_timeout)
         # fail if openscap wasn't successful; if debug, continue
-        return ProcessHelper.run_subprocess(cmd, print_output=False, function=function)
+        tail = OutputTail()
+        ret_val = ProcessHelper.run_subprocess(cmd, print_output=False, function=function,
+                                               watchdog=watchdog, tail=tail)
+        # oscap returns 2 when some rules did not pass
+        if ret_val not in (0, 2):
+            logger_debug.debug("oscap failed with %s:\n%s", ret_val, '\n'.join(tail.get_lines()))
+        if self.scanning_progress is not None:
+            # oscap runs modules one by one, so the time between
+            # two finished modules is the duration of the latter one
+            history = ModuleHistory()
+            for rule_id, duration in six.iteritems(self.scanning_progress.get_durations()):
+                history.add(rule_id, duration)
+            history.save()
+        return ret_val
+
+    def can_resume(self):
+        """Returns True if there is an interrupted assessment of the scenario"""
+        journal = ScanJournal(self.conf.assessment_results_dir, self.get_scenario())
+        return journal.is_interrupted() and os.path.exists(os.path.join(self.get_assessment_dir(),
+                                                                     settings.content_file))
+
+    def get_assessment_dir(self):
+        """Returns directory where the assessment is executed"""
+        if self.conf.contents:
+            return os.path.dirname(self.content)
+        return os.path.join(self.conf.assessment_results_dir,
+                            self.get_proper_scenario(self.get_scenario()))
+
+    def reset_unfinished_modules(self, rules):
+        """
+        Function restores solution files of modules which did not finish
+        before the interruption, so that their text is not written twice
+        """
+        source_dir = os.path.join(self.conf.source_dir, self.get_scenario())
+        if self.conf.contents or not os.path.isdir(source_dir):
+            # the assessment is executed directly in the content directory
+            return
+        for rule in rules:
+            if self.journal.get_result(rule) is not None:
+                continue
+            solution_file = IncrementalCache.get_solution_file(rule)
+            source_file = os.path.join(source_dir, os.path.relpath(solution_file, self.assessment_dir))
+            if os.path.exists(source_file):
+                shutil.copy2(source_file, solution_file)
+            elif os.path.exists(solution_file):
+                os.unlink(solution_file)
+
+    def get_timeout(self, key):
+        """
+        Function returns time limit in seconds from preupgrade-assistant.conf
+        or the default one from settings. None means no limit.
+        """
+        value = ConfigHelper.get_preupg_config_file(settings.PREUPG_CONFIG_FILE, key)
+        if value is None or not value.strip():
+            return getattr(settings, key) or None
+        try:
+            return int(value) or None
+        except ValueError:
+            log_message("Wrong value '%s' of '%s' in %s, the default one is used." %
+                        (value, key, settings.PREUPG_CONFIG_FILE), level=logging.WARNING)
+            return getattr(settings, key) or None
+
+    def print_plan(self):
+        """
+        Function prints expected duration of each module and of the whole
+        assessment based on previous assessments. Nothing is executed.
+        """
+        if not os.path.exists(self.content):
+            log_message("The module {0} does not exist.".format(self.content))
+            return ReturnValues.SCENARIO
+        history = ModuleHistory()
+        jobs = self.conf.jobs or 1
+        rules = SCEScanner(self.content, None, jobs).get_rules()
+        if jobs > 1:
+            rules = history.sort_longest_first(rules)
+        if not rules:
+            return 0
+        max_title_length = max([len(x.title) for x in rules]) + 2
+        durations = []
+        unknown = 0
+        log_message("Expected duration of modules:")
+        for rule in rules:
+            duration = history.get_expected(rule.rule_id)
+            if duration is None:
+                unknown += 1
+                log_message("%s unknown" % rule.title.ljust(max_title_length))
+                continue
+            durations.append(duration)
+            log_message("%s %.2d:%.2ds" % (rule.title.ljust(max_title_length),
+                                           duration / 60, duration % 60))
+        total = sum(durations)
+        log_message("Total duration of %d modules: %.2d:%.2ds" % (len(durations), total / 60, total % 60))
+        if jobs > 1:
+            total = ModuleHistory.get_makespan(durations, jobs)
+            log_message("Expected duration with %d jobs: %.2d:%.2ds" % (jobs, total / 60, total % 60))
+        if unknown:
+            log_message("Duration of %d modules is unknown, they were not run yet." % unknown)
+        return 0
 
     def get_scenario(self):
         """The function returns scenario"""
@@ -320,9 +514,12 @@ class Application(object):
         if os.path.isdir(self.conf.assessment_results_dir):
             shutil.rmtree(self.conf.assessment_results_dir)
 
-    def prepare_for_generation(self):
-        """Function prepares the XML file for conversion to HTML format"""
-        for report in self._get_reports():
+    def prepare_for_generation(self, reports):
+        """
+        Function prepares the XML files for conversion to HTML format
+        and generates the HTML reports at the same time
+        """
+        def generate(report):
             if self.conf.old_report_style:
                 ReportParser.write_xccdf_version(report, direction=True)
             self.openscap_helper.run_generate(report,
@@ -330,70 +527,144 @@ class Application(object):
                                               old_style=self.conf.old_report_style)
             if self.conf.old_report_style:
                 ReportParser.write_xccdf_version(report)
+        ModuleScheduler(settings.report_jobs).run(reports, generate)
 
     def prepare_xml_for_html(self):
         """The function prepares a XML file for HTML creation"""
         # Reload XML file
         self.report_parser.reload_xml(self.openscap_helper.get_default_xml_result_path())
-        # Replace fail in case of slight and medium risks with needs_inspection
-        self.report_parser.replace_inplace_risk(scanning_results=self.scanning_progress)
-        if not self.conf.debug:
-            self.report_parser.remove_debug_info()
-        self.report_parser.reload_xml(self.openscap_helper.get_default_xml_result_path())
-        self.report_parser.update_check_description()
-        self.prepare_for_generation()
+        # All changes are written to the file at once
+        self.report_parser.begin()
+        try:
+            # Risks are read and debug information removed in one pass
+            self.report_parser.extract_risks(remove_debug=not self.conf.debug)
+            # Replace fail in case of slight and medium risks with needs_inspection
+            self.report_parser.replace_inplace_risk(scanning_results=self.scanning_progress)
+            self.report_parser.update_check_description()
+        finally:
+            self.report_parser.commit()
+        reports = self._get_reports()
+        # The result file is final, the tree is released before HTML generation
+        # and solution files and risks are read by streaming the file
+        self.report_parser = ReportParser(self.openscap_helper.get_default_xml_result_path(), stream=True)
+        self.prepare_for_generation(reports)
 
         if not self.conf.verbose:
             self.xml_mgr.remove_html_information()
         # This function finalize XML operations
-        self.finalize_xml_files()
+        self.finalize_xml_files(reports)
+        # --riskcheck and the summary read risks without parsing the XML file
+        RiskSummary.write(self.openscap_helper.get_default_xml_result_path(),
+                          self.report_parser.get_rule_risks())
         if self.conf.text:
             ProcessHelper.run_subprocess(self.get_cmd_convertor(), print_output=False, shell=True)
 
     def _get_reports(self):
         reports = [self.openscap_helper.get_default_xml_result_path()]
-        report_admin = self.report_parser.get_report_type(settings.REPORTS[0])
-        if report_admin:
-            reports.append(report_admin)
-        # We separate user contents
-        report_user = self.report_parser.get_report_type(settings.REPORTS[1])
-        if report_user:
-            reports.append(report_user)
+        # We separate admin and user contents
+        report_types = self.report_parser.split_reports(settings.REPORTS)
+        for report_type in settings.REPORTS:
+            if report_type in report_types:
+                reports.append(report_types[report_type])
         return reports
 
-    def finalize_xml_files(self):
+    def finalize_xml_files(self, reports):
         """
         Function copies postupgrade scripts and creates hash postupgrade file.
         It finds solution files and update XML file.
+        Postupgrade scripts are finalized by scan_system when all contents finish.
         """
-        # Copy postupgrade.d special files
-        PostupgradeHelper.special_postupgrade_scripts(self.conf.assessment_results_dir)
-        PostupgradeHelper.hash_postupgrade_file(self.conf.verbose, self.get_postupgrade_dir())
-
         solution_files = self.report_parser.get_solution_files()
-        for report in self._get_reports():
+        for report in reports:
             self.xml_mgr.find_solution_files(report.split('.')[0], solution_files)
 
+    def finalize_postupgrade(self):
+        """Function copies postupgrade.d special files and creates hash postupgrade file"""
+        PostupgradeHelper.special_postupgrade_scripts(self.conf.assessment_results_dir)
+        PostupgradeHelper.hash_postupgrade_file(self.conf.verbose, self.get_postupgrade_dir())
+
     def set_third_party(self, third_party):
         self.third_party = third_party
 
+    def get_output_dir(self):
+        """
+        Returns directory where modules write kickstart, postupgrade.d and
+        other outputs (XCCDF_VALUE_TMP_PREUPGRADE). Each 3rdparty content
+        has its own one, it is merged by wait_third_party_modules.
+        """
+        if self.third_party:
+            return os.path.join(self.conf.assessment_results_dir, settings.add_ons_output_dir, self.third_party)
+        return self.conf.assessment_results_dir
+
+    def scan_third_party(self, third_party, content):
+        """
+        Function scans one 3rdparty content and returns its summary.
+        Results have the 3rdparty prefix, like /root/preupgrade/vendor_result.xml
+        """
+        self.set_third_party(third_party)
+        self.content = content
+        for dir_name in settings.preupgrade_dirs:
+            if dir_name != settings.common_name:
+                DirHelper.check_or_create_temp_dir(os.path.join(self.get_output_dir(), dir_name))
+        self.openscap_helper = OpenSCAPHelper(self.conf.assessment_results_dir,
+                                              self.conf.result_prefix,
+                                              self.conf.xml_result_name,
+                                              self.conf.html_result_name,
+                                              content,
+                                              third_party=third_party)
+        self.report_parser = ReportParser(content)
+        self.run_scan_process(quiet=True)
+        # This function prepare XML and generate HTML
+        self.prepare_xml_for_html()
+        return self.scanning_progress.get_output_data()
+
+    @staticmethod
+    def _run_third_party_scan(app, third_party, content, outcome):
+        try:
+            outcome['report'] = app.scan_third_party(third_party, content)
+        except Exception:
+            outcome['exc_info'] = sys.exc_info()
+
     def run_third_party_modules(self, dir_name):
         """
-        Functions executes a 3rd party contents
+        Functions starts 3rd party contents in background
 
         3rd party contents are stored in
-        /usr/share/preupgrade/RHEL6_7/3rdparty directory
+        /usr/share/preupgrade/RHEL6_7/3rdparty directory.
+        Each of them is scanned by its own copy of the application
+        in a thread, so they run together with the main content.
+        Their modules write to their own output directories, see
+        get_output_dir. Function returns a list for wait_third_party_modules.
         """
+        scans = []
         for third_party, content in six.iteritems(list_contents(dir_name)):
-            third_party_name = self.third_party = third_party
-            log_message("Execution {0} assessments:".format(third_party))
-            self.report_parser.reload_xml(content)
-            self.content = content
-            self.run_scan_process()
-            self.report_data[third_party_name] = self.scanning_progress.get_output_data()
-            # This function prepare XML and generate HTML
-            self.prepare_xml_for_html()
-        self.set_third_party("")
+            log_message("Execution {0} assessments started in background.".format(third_party))
+            outcome = {}
+            app = copy.copy(self)
+            thread = threading.Thread(target=Application._run_third_party_scan,
+                                      args=(app, third_party, content, outcome))
+            thread.daemon = True
+            thread.start()
+            scans.append((app, thread, outcome))
+        return scans
+
+    def wait_third_party_modules(self, scans):
+        """
+        Function waits for 3rd party contents, merges their output
+        directories and adds their summaries to report_data
+        """
+        for app, thread, outcome in scans:
+            while thread.is_alive():
+                # join with timeout can be interrupted by Ctrl+C
+                thread.join(1)
+            if 'exc_info' in outcome:
+                exc_info = outcome['exc_info']
+                six.reraise(exc_info[0], exc_info[1], exc_info[2])
+            DirHelper.merge_dir(app.get_output_dir(), self.conf.assessment_results_dir)
+            self.report_data[app.third_party] = outcome['report']
+        output_dir = os.path.join(self.conf.assessment_results_dir, settings.add_ons_output_dir)
+        if os.path.isdir(output_dir):
+            shutil.rmtree(output_dir)
 
     def get_cmd_convertor(self):
         """Function returns cmd with text convertor string"""
@@ -462,10 +733,18 @@ class Application(object):
     def scan_system(self):
         """The function is used for scanning system with all steps."""
         self._set_devel_mode()
-        if int(self.prepare_scan_system()) != 0:
-            return ReturnValues.SCENARIO
-        if int(self.generate_report()) != 0:
-            return ReturnValues.SCENARIO
+        if self.conf.resume and self.can_resume():
+            # keep the assessment directory with outputs of finished modules
+            log_message("Resuming the interrupted assessment.")
+            self.resuming = True
+            self.assessment_dir = self.get_assessment_dir()
+        else:
+            if self.conf.resume:
+                log_message("There is no interrupted assessment, a new one is started.")
+            if int(self.prepare_scan_system()) != 0:
+                return ReturnValues.SCENARIO
+            if int(self.generate_report()) != 0:
+                return ReturnValues.SCENARIO
         # Update source XML file in temporary directory
         self.content = os.path.join(self.assessment_dir, settings.content_file)
         self.openscap_helper.update_variables(self.conf.assessment_results_dir,
@@ -478,38 +757,46 @@ class Application(object):
         except IOError:
             log_message("The module {0} does not exist.".format(self.content))
             return ReturnValues.SCENARIO
-        if not self.conf.contents:
-            version = SystemIdentification.get_assessment_version(self.conf.scan)
-            if version is None:
-                log_message("Your scan is in a wrong format %s." % version,
-                            level=logging.ERROR)
-                log_message("It should be like 'RHEL6_7' for upgrade from RHEL 6->7.",
-                            level=logging.ERROR)
-                return ReturnValues.SCENARIO
-            self.report_parser.modify_platform_tag(version[0])
-        if self.conf.mode:
-            try:
-                lines = [i.rstrip() for i in FileHelper.get_file_content(os.path.join(self.assessment_dir,
-                                                                                      self.conf.mode),
-                                                                         'rb',
-                                                                         method=True)]
-            except IOError:
-                return
-            self.report_parser.select_rules(lines)
-        if self.conf.select_rules:
-            lines = [i.strip() for i in self.conf.select_rules.split(',')]
-            unknown_rules = self.report_parser.check_rules(lines)
-            if unknown_rules:
-                log_message(settings.unknown_rules % '\n'.join(unknown_rules))
-            self.report_parser.select_rules(lines)
+        # platform tag and selected rules are written to the content at once
+        self.report_parser.begin()
+        try:
+            if not self.conf.contents:
+                version = SystemIdentification.get_assessment_version(self.conf.scan)
+                if version is None:
+                    log_message("Your scan is in a wrong format %s." % version,
+                                level=logging.ERROR)
+                    log_message("It should be like 'RHEL6_7' for upgrade from RHEL 6->7.",
+                                level=logging.ERROR)
+                    return ReturnValues.SCENARIO
+                self.report_parser.modify_platform_tag(version[0])
+            if self.conf.mode:
+                try:
+                    lines = [i.rstrip() for i in FileHelper.get_file_content(os.path.join(self.assessment_dir,
+                                                                                          self.conf.mode),
+                                                                             'rb',
+                                                                             method=True)]
+                except IOError:
+                    return
+                self.report_parser.select_rules(lines)
+            if self.conf.select_rules:
+                lines = [i.strip() for i in self.conf.select_rules.split(',')]
+                unknown_rules = self.report_parser.check_rules(lines)
+                if unknown_rules:
+                    log_message(settings.unknown_rules % '\n'.join(unknown_rules))
+                self.report_parser.select_rules(lines)
+        finally:
+            self.report_parser.commit()
+        third_party_scans = []
+        third_party_dir_name = self.get_third_party_dir(self.assessment_dir)
+        if os.path.exists(third_party_dir_name):
+            third_party_scans = self.run_third_party_modules(third_party_dir_name)
         self.run_scan_process()
         main_report = self.scanning_progress.get_output_data()
         # This function prepare XML and generate HTML
         self.prepare_xml_for_html()
-
-        third_party_dir_name = self.get_third_party_dir(self.assessment_dir)
-        if os.path.exists(third_party_dir_name):
-            self.run_third_party_modules(third_party_dir_name)
+        self.wait_third_party_modules(third_party_scans)
+        # modules of all contents are finished now
+        self.finalize_postupgrade()
 
         self.copy_preupgrade_scripts(self.assessment_dir)
         ConfigFilesHelper.copy_modified_config_files(settings.assessment_results_dir)
@@ -519,9 +806,12 @@ class Application(object):
         for target, report in six.iteritems(self.report_data):
             ScanningHelper.format_rules_to_table(report, "3rdparty content " + target)
 
-        self.tar_ball_name = TarballHelper.tarball_result_dir(self.conf.tarball_name, self.conf.assessment_results_dir, self.conf.verbose)
+        self.tar_ball_name = TarballHelper.tarball_result_dir(self.conf.tarball_name, self.conf.assessment_results_dir,
+                                                              self.conf.verbose, third_parties=list(self.report_data))
         log_message("The tarball with results is stored in '%s' ." % self.tar_ball_name)
         log_message("The latest assessment is stored in the '%s' directory." % self.conf.assessment_results_dir)
+        # --resume does not reuse results of the finished assessment
+        ScanJournal(self.conf.assessment_results_dir, self.get_scenario()).set_completed()
         # pack all configuration files to tarball
         return 0
 
@@ -559,9 +849,11 @@ class Application(object):
         if self.report_data:
             log_message('Summary of the third party providers:')
             for target, dummy_report in six.iteritems(self.report_data):
-                self.third_party = target
+                third_party_path = os.path.join(os.path.dirname(path),
+                                                OpenSCAPHelper.get_third_party_name(target) +
+                                                os.path.basename(path))
                 log_message("Read the third party content {0} {1} for more details.".
-                            format(target, path))
+                            format(target, third_party_path))
         log_message("Upload results to UI by the command:\ne.g. {0} .".format(command))
 
     def _set_devel_mode(self):
@@ -634,7 +926,7 @@ class Application(object):
             log_message(settings.options_not_allowed)
             return ReturnValues.MODE_SELECT_RULES
 
-        if not self.conf.riskcheck and not self.conf.cleanup and not self.conf.kickstart:
+        if not self.conf.riskcheck and not self.conf.cleanup and not self.conf.kickstart and not self.conf.plan:
             # If force option is not mentioned and user select NO then exits
             if not self.conf.force:
                 text = ""
@@ -720,6 +1012,13 @@ class Application(object):
             content_dir = self.conf.contents[:self.conf.contents.find(self.get_scenario())]
             self.conf.source_dir = os.path.join(os.getcwd(), content_dir)
 
+        if self.conf.plan:
+            # nothing is executed, common logs are not gathered either
+            if not self.conf.scan and not self.conf.contents:
+                log_message('Specify the upgrade path with -s or the modules with --contents.')
+                return ReturnValues.SCENARIO
+            return self.print_plan()
+
         self.common = Common(self.conf)
         if not self.conf.skip_common:
             if not self.common.common_results():
@@ -25,6 +25,12 @@ def upload_callback(option, dummy_opt_str, dummy_value, parser):
                     raise OptionValueError("Specify at most one argument for upload option.")
 
 
+def jobs_callback(option, opt_str, value, parser):
+    if value < 1:
+        raise OptionValueError("Option %s requires a positive number." % opt_str)
+    setattr(parser.values, option.dest, value)
+
+
 def optional_rh_arg(arg_default):
     def func(option, opt_str, value, parser):
         if parser.rargs and not parser.rargs[0].startswith('-'):
@@ -173,6 +179,45 @@ Upload results to preupgrade assistant WEB-UI"
             metavar="OLDREPORTSTYLE",
             help="Use old report style without CSS issues."
         )
+        self.parser.add_option(
+            "-j",
+            "--jobs",
+            type="int",
+            metavar="N",
+            action="callback",
+            callback=jobs_callback,
+            help="Run at most N check scripts in parallel"
+        )
+        self.parser.add_option(
+            "--incremental",
+            action="store_true",
+            default=False,
+            help="Reuse results of modules whose inputs did not change since the previous assessment"
+        )
+        self.parser.add_option(
+            "--plan",
+            action="store_true",
+            default=False,
+            help="Print expected duration of modules based on previous assessments and exit"
+        )
+        self.parser.add_option(
+            "--refresh-common",
+            action="store_true",
+            default=False,
+            help="Gather all common logs again even if their inputs did not change"
+        )
+        self.parser.add_option(
+            "--resume",
+            action="store_true",
+            default=False,
+            help="Finish the interrupted assessment without running the already finished modules again"
+        )
+        self.parser.add_option(
+            "--forkserver",
+            action="store_true",
+            default=False,
+            help="Run Python modules in processes forked from one preloaded interpreter"
+        )
 
 if __name__ == '__main__':
     x = CLI()
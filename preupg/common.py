@@ -6,20 +6,131 @@ to assessment
 
 from __future__ import unicode_literals
 import os
+import sys
+import json
 import platform
 import datetime
 import shutil
+import threading
+import six
 from distutils import dir_util
 from preupg.utils import FileHelper, DirHelper, ProcessHelper, SystemIdentification
-from preupg.logger import log_message
+from preupg.logger import log_message, logger_debug
+from preupg.scheduler import ModuleScheduler
+from preupg.incremental import IncrementalHelper
+from preupg.rpmverify import RpmVerifier
+from preupg.pkgindex import PackageIndex
 from preupg import settings
 
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
+
 
 def get_add_on_name(filename, add_on):
     """Function returns the server name with add_on"""
     return filename + "-" + add_on
 
 
+class CommonScript(object):
+
+    """
+    Class holds one line of scripts.txt in format
+
+    command=log_file=BASH_VALUE=name=YES|NO[=kickstart_name[=depends_on[=inputs]]]
+
+    depends_on is a comma separated list of log files which have to be
+    gathered before the command is executed, e.g. rpm_Va.log.
+    inputs is a comma separated list of files the output depends on,
+    e.g. /var/lib/rpm/Packages. The log is gathered again only when
+    some of them changed. Commands which inspect files on disk, like
+    rpm -Va, have no inputs and are gathered on every run.
+    """
+
+    def __init__(self, line):
+        fields = line.strip().split("=", 7)
+        self.cmd, self.log_file, self.bash_value, self.name, self.kickstart = fields[:5]
+        self.kickstart_name = fields[5] if len(fields) > 5 else ""
+        self.depends_on = []
+        if len(fields) > 6:
+            self.depends_on = [x.strip() for x in fields[6].split(",") if x.strip()]
+        self.inputs = []
+        if len(fields) > 7:
+            self.inputs = [x.strip() for x in fields[7].split(",") if x.strip()]
+
+    def is_cacheable(self):
+        """Log without declared inputs or dependencies is gathered every time"""
+        return bool(self.inputs or self.depends_on)
+
+    def __repr__(self):
+        return "<CommonScript %s>" % self.log_file
+
+
+class CommonProgress(object):
+
+    """
+    Class shows state of all gatherers of common logs, one line per gatherer.
+    On a terminal the lines are rewritten in place, otherwise a line
+    is printed when the gatherer finishes.
+    """
+
+    def __init__(self, scripts):
+        self.scripts = scripts
+        self.states = dict((x, "waiting") for x in scripts)
+        self.max_length = max([len(x.name) for x in scripts] + [len(settings.assessment_text)])
+        self.interactive = sys.stdout.isatty()
+        self.drawn = False
+        # gatherers are started from worker threads
+        self.lock = threading.Lock()
+
+    def get_line(self, script):
+        return "%s : %.2d/%d %s" % (script.name.ljust(self.max_length),
+                                    self.scripts.index(script) + 1,
+                                    len(self.scripts),
+                                    self.states[script])
+
+    def _write(self, text):
+        if six.PY2:
+            text = text.encode(settings.defenc)
+        sys.stdout.write(text)
+
+    def _redraw(self):
+        if self.drawn:
+            # move the cursor up to the first line of the progress
+            self._write("\033[%dA" % len(self.scripts))
+        for script in self.scripts:
+            self._write("\033[K%s\n" % self.get_line(script))
+        sys.stdout.flush()
+        self.drawn = True
+
+    def start(self, script):
+        self.lock.acquire()
+        try:
+            self.states[script] = "...running"
+            if self.interactive:
+                self._redraw()
+        finally:
+            self.lock.release()
+
+    def finish(self, script, duration):
+        """duration is None when the log from the previous run was reused"""
+        self.lock.acquire()
+        try:
+            if duration is None:
+                self.states[script] = "unchanged"
+            else:
+                self.states[script] = "finished (time %.2d:%.2ds)" % (duration.seconds / 60,
+                                                                      duration.seconds % 60)
+            if self.interactive:
+                self._redraw()
+                logger_debug.info(self.get_line(script))
+            else:
+                log_message(self.get_line(script))
+        finally:
+            self.lock.release()
+
+
 class Common(object):
 
     """Class handles with common log files"""
@@ -29,7 +140,16 @@ class Common(object):
         self.cwd = ""
         self.lines = FileHelper.get_file_content(self.conf.common_scripts,
                                                  "rb", True)
+        self.scripts = [CommonScript(x) for x in self.lines
+                        if x.strip() and not x.strip().startswith("#")]
         self.common_result_dir = ""
+        self.fingerprints = {}
+        # logs which were not gathered again
+        self.reused = set()
+        # commands from scripts.txt which are done in process when possible
+        verifier = RpmVerifier(index_file=os.path.join(self.conf.cache_dir, settings.rpm_verify_index),
+                               refresh=self.conf.refresh_common)
+        self.builtins = {'rpm -Va': verifier.write_log}
 
     def common_logfiles(self, filename):
         """build path for provided filename"""
@@ -51,32 +171,108 @@ class Common(object):
         """Function switch back to self.cwd"""
         os.chdir(self.cwd)
 
+    def get_requires(self):
+        """Function returns a dictionary script -> list of scripts it depends on"""
+        scripts = dict((x.log_file, x) for x in self.scripts)
+        requires = {}
+        for script in self.scripts:
+            requires[script] = [scripts[x] for x in script.depends_on if x in scripts]
+        return requires
+
+    def get_cache_file(self):
+        return os.path.join(self.conf.cache_dir, settings.common_cache)
+
+    def load_fingerprints(self):
+        """Returns fingerprints of logs gathered in the previous run"""
+        try:
+            return json.loads(FileHelper.get_file_content(self.get_cache_file(), "rb"))
+        except (IOError, ValueError):
+            return {}
+
+    def save_fingerprints(self):
+        try:
+            FileHelper.write_to_file(self.get_cache_file(), "wb", json.dumps(self.fingerprints))
+        except (IOError, OSError):
+            logger_debug.debug("Can not store fingerprints of common logs to '%s'", self.get_cache_file())
+
+    def get_fingerprint(self, script, requires):
+        """
+        Function returns fingerprint of the command, states of its inputs
+        and fingerprints of logs it depends on or None if the log
+        has to be gathered every time
+        """
+        if script.log_file in self.fingerprints:
+            return self.fingerprints[script.log_file]
+        fingerprint = None
+        if script.is_cacheable():
+            hasher = sha1()
+            hasher.update(script.cmd.encode(settings.defenc))
+            for input_file in script.inputs:
+                state = "%s=%s\n" % (input_file, IncrementalHelper.get_file_state(input_file))
+                hasher.update(state.encode(settings.defenc))
+            for dependency in requires.get(script, []):
+                dependency_fingerprint = self.get_fingerprint(dependency, requires)
+                if dependency_fingerprint is None:
+                    break
+                hasher.update(dependency_fingerprint.encode(settings.defenc))
+            else:
+                fingerprint = hasher.hexdigest()
+        self.fingerprints[script.log_file] = fingerprint
+        return fingerprint
+
+    def can_reuse(self, script, previous, requires):
+        """Returns True if the log from the previous run can be used"""
+        if self.conf.refresh_common:
+            return False
+        fingerprint = self.fingerprints.get(script.log_file)
+        if fingerprint is None or previous.get(script.log_file) != fingerprint:
+            return False
+        if not os.path.exists(self.common_logfiles(script.log_file)):
+            return False
+        # a dependency gathered again could have changed
+        return not [x for x in requires.get(script, []) if x.log_file not in self.reused]
+
+    def run_script(self, script, progress=None):
+        """Function runs one command from scripts.txt and returns its duration"""
+        if progress is not None:
+            progress.start(script)
+        start_time = datetime.datetime.now()
+        common_file_path = self.common_logfiles(script.log_file)
+        if script.cmd in self.builtins and RpmVerifier.is_available():
+            self.builtins[script.cmd](common_file_path)
+        else:
+            ProcessHelper.run_subprocess(script.cmd, output=common_file_path, shell=True)
+        # os.chmod(common_file_path, 0640)
+        return datetime.datetime.now() - start_time
+
     def common_results(self):
-        """run common scripts"""
+        """
+        run common scripts
+
+        Independent commands run in parallel, a command with declared
+        dependencies waits until the log files it needs are gathered.
+        """
         log_message("Gathering logs used by the Preupgrade Assistant:")
         self.switch_dir()
         try:
-            max_length = max(max([len(x.split("=", 4)[3]) for x in self.lines]), len(settings.assessment_text))
-            # Log files which will not be updated
-            # when RPM database is not changed
-            for counter, line in enumerate(self.lines):
-                line = line.strip()
-                if line.startswith("#"):
-                    continue
-                cmd, log_file, dummy_bash_value, name, values = line.split("=", 4)
-                log_message("%s : %.2d/%d ...running" % (name.ljust(max_length),
-                                                         counter+1,
-                                                         len(self.lines)),
-                            new_line=False)
-                start_time = datetime.datetime.now()
-                common_file_path = self.common_logfiles(log_file)
-                ProcessHelper.run_subprocess(cmd, output=common_file_path, shell=True)
-                end_time = datetime.datetime.now()
-                diff = end_time - start_time
-                log_message(" %sfinished (time %.2d:%.2ds)" % ('\b' * 8,
-                                                               diff.seconds / 60,
-                                                               diff.seconds % 60))
-                # os.chmod(common_file_path, 0640)
+            progress = CommonProgress(self.scripts)
+            requires = self.get_requires()
+            previous = self.load_fingerprints()
+            for script in self.scripts:
+                self.get_fingerprint(script, requires)
+
+            def gather(script):
+                # Log files which will not be updated
+                # when RPM database is not changed
+                if self.can_reuse(script, previous, requires):
+                    self.reused.add(script.log_file)
+                    return None
+                return self.run_script(script, progress)
+            scheduler = ModuleScheduler(self.conf.jobs or settings.common_jobs)
+            scheduler.run(self.scripts, gather, callback=progress.finish, requires=requires)
+            for log_file in settings.package_logs:
+                PackageIndex.build(self.common_logfiles(log_file))
+            self.save_fingerprints()
             self.switch_back_dir()
         except IOError:
             return 0
@@ -88,19 +284,16 @@ class Common(object):
         self.switch_dir()
 
         try:
-            for line in self.lines:
-                if line.strip().startswith("#"):
-                    continue
-                values = line.strip().split("=", 5)
-                if values[4] == "YES":
-                    shutil.copyfile(values[1],
+            for script in self.scripts:
+                if script.kickstart == "YES":
+                    shutil.copyfile(script.log_file,
                                     os.path.join(self.conf.assessment_results_dir,
                                                  "kickstart",
-                                                 values[5]))
+                                                 script.kickstart_name))
                 else:
                     if os.path.exists(os.path.join(self.conf.assessment_results_dir,
-                                                   values[1])):
-                        os.remove(values[1])
+                                                   script.log_file)):
+                        os.remove(script.log_file)
         except IOError:
             return 0
         else:
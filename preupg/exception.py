@@ -29,3 +29,11 @@ class EmptyTagIniFileError(RuntimeError):
     """
 
     pass
+
+
+class ModuleDependencyError(RuntimeError):
+    """
+    Dependencies between modules are unknown or cyclic
+    """
+
+    pass
@@ -0,0 +1,346 @@
+"""
+The forkserver module runs Python check scripts in processes forked
+from one preloaded interpreter (preupg --forkserver), so that every
+module does not pay for the start of Python and imports of script_api.
+
+The server reads JSON requests from stdin, one per line, and writes
+JSON lines about started and finished children to stdout.
+"""
+
+from __future__ import unicode_literals
+import os
+import sys
+import json
+import errno
+import fcntl
+import select
+import signal
+import threading
+import traceback
+import subprocess
+
+import six
+
+from preupg import settings
+from preupg.logger import logger_debug
+
+# modules imported by check scripts, script_api reads environment
+# of the script in the forked process, see load_environment()
+PRELOADED_MODULES = ['preupg.script_api', 'preupg.utils', 'preupg.pkgindex', 'shutil', 're', 'errno']
+
+
+class ForkServerHelper(object):
+
+    @staticmethod
+    def get_interpreter(full_path):
+        """Function returns the interpreter from the first line of the script or None"""
+        try:
+            f = open(full_path, "rb")
+            try:
+                line = f.readline(256)
+            finally:
+                f.close()
+        except IOError:
+            return None
+        if not line.startswith(b'#!'):
+            return None
+        args = line[2:].decode(settings.defenc, 'replace').split()
+        if args and os.path.basename(args[0]) == 'env':
+            args = args[1:]
+        # interpreter options can not be applied to a forked process
+        if len(args) != 1:
+            return None
+        return os.path.basename(args[0])
+
+    @staticmethod
+    def can_run(full_path):
+        """Returns True if the script is for the same Python as the server"""
+        names = ['python', 'python%d' % sys.version_info[0], 'python%d.%d' % sys.version_info[:2]]
+        return ForkServerHelper.get_interpreter(full_path) in names
+
+    @staticmethod
+    def get_exit_code(exc):
+        """Function returns exit code of the interpreter for SystemExit exception"""
+        code = exc.code
+        if code is None:
+            return 0
+        if isinstance(code, six.integer_types):
+            return code & 0xff
+        sys.stderr.write("%s\n" % code)
+        return 1
+
+
+def _preload():
+    """Function imports modules used by check scripts and maps package indexes"""
+    for name in PRELOADED_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    from preupg.pkgindex import PackageIndex
+    for log_file in settings.package_logs:
+        index = PackageIndex(os.path.join(settings.cache_dir, settings.common_name, log_file))
+        if index.is_valid():
+            index.preload()
+
+
+def _load_environment_on_import():
+    """
+    Function lets preloaded script_api read environment of the script
+    when the script imports it, like the import of script_api does.
+    """
+    script_api = sys.modules.get('preupg.script_api')
+    if script_api is None:
+        return
+    builtins = six.moves.builtins
+    original_import = builtins.__import__
+
+    def import_hook(name, *args, **kwargs):
+        fromlist = args[2] if len(args) > 2 else kwargs.get('fromlist')
+        if name == 'preupg.script_api' or (name == 'preupg' and fromlist and 'script_api' in fromlist):
+            builtins.__import__ = original_import
+            script_api.load_environment()
+        return original_import(name, *args, **kwargs)
+    builtins.__import__ = import_hook
+
+
+def _run_child(request, private_fds):
+    """Function runs the check script in the forked process, it never returns"""
+    status = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        # the script and its children can be killed together
+        os.setpgrp()
+        for fd in private_fds:
+            os.close(fd)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        for fd, name in [(1, 'stdout'), (2, 'stderr')]:
+            output = os.open(request[name], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.dup2(output, fd)
+            os.close(output)
+        os.environ.clear()
+        for key, value in six.iteritems(request['env']):
+            if six.PY2:
+                key, value = key.encode(settings.defenc), value.encode(settings.defenc)
+            os.environ[key] = value
+        os.chdir(request['cwd'])
+        script = request['script']
+        sys.argv = [script]
+        sys.path[0] = os.path.dirname(script)
+        try:
+            _load_environment_on_import()
+            f = open(script, "rb")
+            try:
+                # future statements of this module must not apply to the script
+                code = compile(f.read(), script, 'exec', dont_inherit=True)
+            finally:
+                f.close()
+            six.exec_(code, {'__name__': '__main__', '__file__': script, '__builtins__': six.moves.builtins})
+            status = 0
+        except SystemExit as exc:
+            status = ForkServerHelper.get_exit_code(exc)
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        try:
+            import atexit
+            atexit._run_exitfuncs()
+        except Exception:
+            pass
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(status)
+
+
+def serve():
+    """Main loop of the fork server"""
+    _preload()
+    responses = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    wake_r, wake_w = os.pipe()
+    fcntl.fcntl(wake_w, fcntl.F_SETFL, fcntl.fcntl(wake_w, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    def wake_up(dummy_signum, dummy_frame):
+        try:
+            os.write(wake_w, b'x')
+        except OSError:
+            pass
+    signal.signal(signal.SIGCHLD, wake_up)
+    # writes of responses are not interrupted, select is interrupted anyway
+    signal.siginterrupt(signal.SIGCHLD, False)
+
+    def respond(message):
+        responses.write((json.dumps(message) + "\n").encode(settings.defenc))
+        responses.flush()
+
+    children = {}
+    data = b''
+    stdin_open = True
+    while stdin_open or children:
+        try:
+            ready = select.select([0, wake_r] if stdin_open else [wake_r], [], [])[0]
+        except (select.error, OSError) as exc:
+            if exc.args[0] == errno.EINTR:
+                continue
+            raise
+        if wake_r in ready:
+            os.read(wake_r, 4096)
+        while children:
+            try:
+                pid, status, usage = os.wait4(-1, os.WNOHANG)
+            except OSError as exc:
+                if exc.errno == errno.EINTR:
+                    continue
+                break
+            if pid == 0:
+                break
+            respond({'id': children.pop(pid), 'status': status, 'cpu_time': usage.ru_utime + usage.ru_stime,
+                     'max_rss': usage.ru_maxrss})
+        if 0 not in ready:
+            continue
+        chunk = os.read(0, 65536)
+        if not chunk:
+            # preupg does not have other requests, finish running children
+            stdin_open = False
+            continue
+        data += chunk
+        while b'\n' in data:
+            line, data = data.split(b'\n', 1)
+            request = json.loads(line.decode(settings.defenc))
+            pid = os.fork()
+            if pid == 0:
+                _run_child(request, [responses.fileno(), wake_r, wake_w])
+            children[pid] = request['id']
+            respond({'id': request['id'], 'pid': pid})
+
+
+class ForkRequest(object):
+
+    """Class holds state of one check script executed by the fork server"""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.pid = None
+        self.status = None
+        self.cpu_time = None
+        self.max_rss = None
+        self.started = threading.Event()
+        self.finished = threading.Event()
+
+    def get_returncode(self):
+        """Returns exit code of the script like Popen.returncode"""
+        if self.status is None:
+            return None
+        if os.WIFSIGNALED(self.status):
+            return -os.WTERMSIG(self.status)
+        return os.WEXITSTATUS(self.status)
+
+
+class ForkServer(object):
+
+    """Class starts the fork server and sends check scripts to it from several threads"""
+
+    def __init__(self):
+        self.process = None
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.last_id = 0
+
+    @staticmethod
+    def can_run(full_path):
+        return ForkServerHelper.can_run(full_path)
+
+    def start(self):
+        """Function starts the server process"""
+        env = dict(os.environ)
+        # the server imports the same preupg as this process
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join([x for x in [package_dir, env.get('PYTHONPATH')] if x])
+        env[settings.forkserver_env] = "1"
+        self.process = subprocess.Popen([sys.executable, '-c',
+                                         'from preupg.forkserver import serve; serve()'],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        close_fds=True,
+                                        cwd='/',
+                                        env=env)
+        reader = threading.Thread(target=self._read_responses)
+        reader.daemon = True
+        reader.start()
+        logger_debug.debug("Fork server started with PID %d", self.process.pid)
+
+    def _read_responses(self):
+        for line in iter(self.process.stdout.readline, b''):
+            try:
+                message = json.loads(line.decode(settings.defenc))
+            except ValueError:
+                continue
+            self.lock.acquire()
+            try:
+                request = self.requests.get(message.get('id'))
+                if request is not None and 'status' in message:
+                    del self.requests[request.request_id]
+            finally:
+                self.lock.release()
+            if request is None:
+                continue
+            if 'pid' in message:
+                request.pid = message['pid']
+                request.started.set()
+            else:
+                request.status = message['status']
+                request.cpu_time = message['cpu_time']
+                request.max_rss = message['max_rss']
+                request.finished.set()
+        # the server died, nobody would finish the waiting requests
+        self.lock.acquire()
+        try:
+            for request in self.requests.values():
+                request.started.set()
+                request.finished.set()
+            self.requests = {}
+            self.process = None
+        finally:
+            self.lock.release()
+
+    def run(self, script, env, cwd, stdout, stderr):
+        """
+        Function starts the script in a forked process and returns ForkRequest.
+        Output of the script is written to files stdout and stderr.
+        Returns None if the server is not running.
+        """
+        self.lock.acquire()
+        try:
+            if self.process is None:
+                return None
+            self.last_id += 1
+            request = ForkRequest(self.last_id)
+            self.requests[request.request_id] = request
+            message = {'id': request.request_id, 'script': script, 'env': env,
+                       'cwd': cwd, 'stdout': stdout, 'stderr': stderr}
+            try:
+                self.process.stdin.write((json.dumps(message) + "\n").encode(settings.defenc))
+                self.process.stdin.flush()
+            except (IOError, OSError):
+                del self.requests[request.request_id]
+                return None
+            return request
+        finally:
+            self.lock.release()
+
+    def stop(self):
+        """Function lets the server finish, it exits when its children finish"""
+        self.lock.acquire()
+        try:
+            process = self.process
+            self.process = None
+        finally:
+            self.lock.release()
+        if process is not None:
+            process.stdin.close()
+            process.wait()
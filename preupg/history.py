@@ -0,0 +1,107 @@
+"""
+The history module keeps durations and resource usage of modules
+from previous assessments. It is used for planning of the assessment
+(preupg --plan) and for starting the slowest modules first.
+"""
+
+from __future__ import unicode_literals
+import os
+import json
+import heapq
+import threading
+
+from preupg import settings
+from preupg.logger import logger_debug
+from preupg.utils import FileHelper, DirHelper
+
+
+class ModuleHistory(object):
+
+    """Class stores the last measurements of each module"""
+
+    # How many measurements of one module are kept
+    max_records = 5
+
+    # main and 3rdparty contents can be scanned at the same time
+    save_lock = threading.Lock()
+
+    def __init__(self, history_file=None):
+        self.history_file = history_file or settings.module_history
+        self.records = self._load()
+        self.updated = set()
+
+    def _load(self):
+        try:
+            return json.loads(FileHelper.get_file_content(self.history_file, "rb"))
+        except (IOError, ValueError):
+            return {}
+
+    def add(self, rule_id, wall_time, cpu_time=None, max_rss=None):
+        """
+        Function adds one measurement of the module
+
+        :param rule_id: xccdf_preupg_rule_... id
+        :param wall_time: duration of the check script in seconds
+        :param cpu_time: user and system CPU time in seconds
+        :param max_rss: maximum resident set size in kB
+        """
+        self.updated.add(rule_id)
+        records = self.records.setdefault(rule_id, [])
+        records.append({'wall': round(wall_time, 3),
+                        'cpu': cpu_time if cpu_time is None else round(cpu_time, 3),
+                        'rss': max_rss})
+        del records[:-self.max_records]
+
+    def get_records(self, rule_id):
+        """Returns list of measurements of the module, the newest is the last one"""
+        return self.records.get(rule_id, [])
+
+    def get_expected(self, rule_id):
+        """Returns average duration of the module in seconds or None if it was not measured"""
+        records = self.get_records(rule_id)
+        if not records:
+            return None
+        return sum([x['wall'] for x in records]) / len(records)
+
+    def sort_longest_first(self, rules):
+        """
+        Function returns rules ordered from the slowest to the fastest one.
+        Modules without history are expected to take an average time.
+        """
+        expected = [self.get_expected(x.rule_id) for x in rules]
+        known = [x for x in expected if x is not None]
+        default = sum(known) / len(known) if known else 0
+        order = []
+        for index, rule in enumerate(rules):
+            duration = expected[index]
+            if duration is None:
+                duration = default
+            # index keeps the document order for modules with the same duration
+            order.append((-duration, index, rule))
+        return [x[2] for x in sorted(order, key=lambda x: x[:2])]
+
+    def save(self):
+        """Function stores updated modules, records of other modules saved meanwhile are kept"""
+        ModuleHistory.save_lock.acquire()
+        try:
+            records = self._load()
+            for rule_id in self.updated:
+                records[rule_id] = self.records[rule_id]
+            try:
+                DirHelper.check_or_create_temp_dir(os.path.dirname(self.history_file))
+                FileHelper.write_to_file(self.history_file, "wb", json.dumps(records))
+            except (IOError, OSError):
+                logger_debug.debug("Can not store module history to '%s'", self.history_file)
+        finally:
+            ModuleHistory.save_lock.release()
+
+    @staticmethod
+    def get_makespan(durations, jobs):
+        """
+        Function returns expected duration of the whole assessment when
+        the slowest modules are started first on jobs workers
+        """
+        workers = [0] * max(1, int(jobs))
+        for duration in sorted(durations, reverse=True):
+            heapq.heapreplace(workers, workers[0] + duration)
+        return max(workers)
@@ -0,0 +1,225 @@
+"""
+The incremental module stores results of check scripts together with
+fingerprints of their inputs, so that an unchanged rule does not have
+to be executed again in the next assessment (preupg --incremental)
+"""
+
+from __future__ import unicode_literals
+import os
+import json
+import threading
+
+from preupg import settings
+from preupg.logger import logger_debug
+from preupg.utils import FileHelper, DirHelper
+from preupg.sce import SCEResult
+
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
+
+
+class IncrementalHelper(object):
+
+    @staticmethod
+    def get_file_hash(full_path):
+        """Function returns sha1 of file content or empty string if it does not exist"""
+        try:
+            content = FileHelper.get_file_content(full_path, "rb", False, False)
+        except IOError:
+            return ""
+        return sha1(content).hexdigest()
+
+    @staticmethod
+    def get_file_state(full_path):
+        """Function returns 'mtime:size' of the file or empty string if it does not exist"""
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return ""
+        return "%s:%s" % (int(stat.st_mtime), stat.st_size)
+
+    @staticmethod
+    def get_rpmdb_state(packages=None):
+        """
+        Function returns a string describing state of the RPM database.
+        Every installation or removal of a package changes it.
+        """
+        return IncrementalHelper.get_file_state(packages or settings.rpmdb_packages)
+
+    @staticmethod
+    def get_dir_state(dirs):
+        """
+        Function returns a dictionary path -> (mtime, size) of all files
+        in the directories, missing directories are skipped
+        """
+        state = {}
+        for dir_name in dirs:
+            for root, dummy_dirs, files in os.walk(dir_name):
+                for name in files:
+                    full_path = os.path.join(root, name)
+                    try:
+                        stat = os.lstat(full_path)
+                    except OSError:
+                        continue
+                    state[full_path] = (stat.st_mtime, stat.st_size)
+        return state
+
+    @staticmethod
+    def get_common_logs(common_scripts):
+        """
+        Function returns a list of (log file, BASH_VALUE) pairs
+        from file with definitions of common logs
+        """
+        logs = []
+        try:
+            lines = FileHelper.get_file_content(common_scripts, "rb", True)
+        except IOError:
+            return logs
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                dummy_cmd, log_file, bash_value, dummy_rest = line.split("=", 3)
+            except ValueError:
+                continue
+            logs.append((log_file, bash_value))
+        return logs
+
+
+class IncrementalCache(object):
+
+    """Class holds results of the previous assessment and their fingerprints"""
+
+    # main and 3rdparty contents can be scanned at the same time
+    save_lock = threading.Lock()
+
+    def __init__(self, content_key, common_dir, common_scripts,
+                 cache_file=None, rpmdb_state=None, output_dir=None):
+        """
+        :param content_key: name of the assessment, e.g. RHEL6_7
+        :param common_dir: directory with common logs
+        :param common_scripts: file with definitions of common logs
+        :param cache_file: JSON file with stored results
+        :param rpmdb_state: state of RPM database, see get_rpmdb_state
+        :param output_dir: directory with kickstart, postupgrade.d and
+                           other outputs of modules
+        """
+        self.content_key = content_key
+        self.common_dir = common_dir
+        self.cache_file = cache_file or settings.incremental_cache
+        output_dir = output_dir or settings.assessment_results_dir
+        self.output_dirs = [os.path.join(output_dir, x) for x in settings.preupgrade_dirs
+                            if x != settings.common_name]
+        # rules which were running while files in output_dirs changed
+        self.writers = set()
+        self.common_logs = IncrementalHelper.get_common_logs(common_scripts)
+        if rpmdb_state is None:
+            rpmdb_state = IncrementalHelper.get_rpmdb_state()
+        self.rpmdb_state = rpmdb_state
+        self.fingerprints = {}
+        self.log_hashes = {}
+        self.previous = self._load().get(self.content_key, {})
+
+    def _load(self):
+        try:
+            return json.loads(FileHelper.get_file_content(self.cache_file, "rb"))
+        except (IOError, ValueError):
+            return {}
+
+    def _get_log_hash(self, log_file):
+        if log_file not in self.log_hashes:
+            self.log_hashes[log_file] = IncrementalHelper.get_file_hash(os.path.join(self.common_dir,
+                                                                                     log_file))
+        return self.log_hashes[log_file]
+
+    @staticmethod
+    def get_solution_file(rule):
+        """Returns full path to the solution file of the rule"""
+        return os.path.join(os.path.dirname(rule.script),
+                            rule.exports.get('XCCDF_VALUE_SOLUTION_FILE', 'solution.txt'))
+
+    def get_fingerprint(self, rule):
+        """
+        Function returns fingerprint of all inputs of the rule:
+        check script, solution file, exported values, all common logs
+        and state of RPM database. Common logs are read by script_api
+        and common.sh functions too, so every rule depends on all of them.
+        It has to be called before the check script is executed.
+        """
+        if rule.rule_id in self.fingerprints:
+            return self.fingerprints[rule.rule_id]
+        hasher = sha1()
+        for full_path in [rule.script, IncrementalCache.get_solution_file(rule)]:
+            hasher.update(IncrementalHelper.get_file_hash(full_path).encode(settings.defenc))
+        for key in sorted(rule.exports):
+            hasher.update(("%s=%s\n" % (key, rule.exports[key])).encode(settings.defenc))
+        for log_file, dummy_bash_value in self.common_logs:
+            hasher.update(("%s=%s\n" % (log_file, self._get_log_hash(log_file))).encode(settings.defenc))
+        hasher.update(self.rpmdb_state.encode(settings.defenc))
+        self.fingerprints[rule.rule_id] = hasher.hexdigest()
+        return self.fingerprints[rule.rule_id]
+
+    def run_watched(self, rule, function):
+        """
+        Function returns function(rule). If files in output directories change
+        meanwhile, the rule is not stored, because its kickstart, postupgrade.d
+        or dirtyconf files would be missing when the result is reused.
+        Rules running at the same time are all excluded, because the writer
+        can not be told apart.
+        """
+        before = IncrementalHelper.get_dir_state(self.output_dirs)
+        try:
+            return function(rule)
+        finally:
+            if IncrementalHelper.get_dir_state(self.output_dirs) != before:
+                logger_debug.debug("Rule '%s' was running while module outputs changed", rule.rule_id)
+                self.writers.add(rule.rule_id)
+
+    def get_result(self, rule):
+        """
+        Function returns the previous SCEResult of the rule if its inputs
+        did not change, otherwise None. The previous solution text is
+        restored to the module directory.
+        """
+        fingerprint = self.get_fingerprint(rule)
+        entry = self.previous.get(rule.rule_id)
+        if entry is None or entry.get('fingerprint') != fingerprint:
+            return None
+        try:
+            result = SCEResult.from_dict(entry['result'])
+        except (KeyError, ValueError):
+            return None
+        if entry.get('solution') is not None:
+            FileHelper.write_to_file(IncrementalCache.get_solution_file(rule), "wb", entry['solution'])
+        result.reused = True
+        logger_debug.debug("Reusing result '%s' of rule '%s'", result.result, rule.rule_id)
+        return result
+
+    def save(self, rules, results):
+        """Function stores results of all executed rules with their fingerprints"""
+        entries = {}
+        for rule in rules:
+            result = results.get(rule.rule_id)
+            if result is None or rule.rule_id in self.writers:
+                continue
+            try:
+                solution = FileHelper.get_file_content(IncrementalCache.get_solution_file(rule), "rb")
+            except (IOError, ValueError, UnicodeDecodeError):
+                solution = None
+            entries[rule.rule_id] = {'fingerprint': self.get_fingerprint(rule),
+                                     'result': result.to_dict(),
+                                     'solution': solution}
+        IncrementalCache.save_lock.acquire()
+        try:
+            data = self._load()
+            data[self.content_key] = entries
+            try:
+                DirHelper.check_or_create_temp_dir(os.path.dirname(self.cache_file))
+                FileHelper.write_to_file(self.cache_file, "wb", json.dumps(data))
+            except (IOError, OSError):
+                logger_debug.debug("Can not store results to '%s'", self.cache_file)
+        finally:
+            IncrementalCache.save_lock.release()
@@ -0,0 +1,114 @@
+"""
+The journal module records results of finished rules to the assessment
+directory as soon as they finish, so that an interrupted assessment
+can be finished later without running them again (preupg --resume)
+"""
+
+from __future__ import unicode_literals
+import os
+import json
+import threading
+
+from preupg import settings
+from preupg.logger import logger_debug
+from preupg.utils import FileHelper
+from preupg.sce import SCEResult
+
+
+class ScanJournal(object):
+
+    """
+    Class appends one JSON line per event to the journal file:
+    content prepared for the scan, result of a finished rule
+    or the finished assessment.
+    Main and 3rdparty contents share the file, each has its own key.
+    """
+
+    # main and 3rdparty contents can be scanned at the same time
+    write_lock = threading.Lock()
+
+    def __init__(self, result_dir, content_key, journal_file=None):
+        """
+        :param result_dir: directory with the assessment, e.g. /root/preupgrade
+        :param content_key: name of the content, e.g. RHEL6_7
+        :param journal_file: name of the journal file in result_dir
+        """
+        self.journal_file = os.path.join(result_dir, journal_file or settings.scan_journal)
+        self.content_key = content_key
+        self.prepared = False
+        self.completed = False
+        self.results = {}
+        # the journal does not end with a new line when preupg was killed
+        self.broken_end = False
+        self._load()
+
+    def _load(self):
+        try:
+            lines = FileHelper.get_file_content(self.journal_file, "rb", True)
+        except IOError:
+            return
+        self.broken_end = bool(lines) and not lines[-1].endswith("\n")
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                if entry['content'] != self.content_key:
+                    continue
+                if entry.get('prepared'):
+                    self.prepared = True
+                elif entry.get('completed'):
+                    self.completed = True
+                else:
+                    result = SCEResult.from_dict(entry['result'])
+                    self.results[result.rule_id] = result
+            except (ValueError, KeyError, TypeError):
+                # the last line can be incomplete when preupg was killed
+                logger_debug.debug("Skipping broken line in journal '%s'", self.journal_file)
+
+    def _append(self, entry):
+        """Function appends the entry and makes sure that it is on the disk"""
+        line = json.dumps(entry) + "\n"
+        if self.broken_end:
+            line = "\n" + line
+            self.broken_end = False
+        ScanJournal.write_lock.acquire()
+        try:
+            f = open(self.journal_file, "ab")
+            try:
+                f.write(line.encode(settings.defenc))
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+        finally:
+            ScanJournal.write_lock.release()
+
+    def is_prepared(self):
+        """Returns True if the content was already prepared for the scan"""
+        return self.prepared
+
+    def set_prepared(self):
+        """Function records that global values were already added to the content"""
+        self.prepared = True
+        self._append({'content': self.content_key, 'prepared': True})
+
+    def set_completed(self):
+        """Function records that the whole assessment finished"""
+        self.completed = True
+        self._append({'content': self.content_key, 'completed': True})
+
+    def is_interrupted(self):
+        """
+        Returns True if the assessment was interrupted after some modules finished.
+        A finished assessment has nothing to resume and without results of modules,
+        e.g. when oscap was used, their outputs could be written twice.
+        """
+        return self.prepared and not self.completed and bool(self.results)
+
+    def get_result(self, rule):
+        """Returns SCEResult of the rule finished before the interruption or None"""
+        return self.results.get(rule.rule_id)
+
+    def add(self, result):
+        """Function records result of the finished rule"""
+        self.results[result.rule_id] = result
+        self._append({'content': self.content_key, 'result': result.to_dict()})
@@ -0,0 +1,114 @@
+"""
+The pkgindex module makes sorted copies of common logs with package
+names in the first column (rpm_qa.log, rpm_rhsigned.log), so that
+modules find a package by binary search instead of reading the log.
+"""
+
+from __future__ import unicode_literals
+import os
+import mmap
+
+from preupg import settings
+from preupg.logger import logger_debug
+from preupg.utils import FileHelper
+
+
+class PackageIndex(object):
+
+    """
+    Class searches the index of a log. Each line of the index is the
+    package name, tab and the original line. Lines are sorted bytewise,
+    so the index can be searched also by 'LC_ALL=C look' from Bash.
+    """
+
+    # indexes mapped by the fork server for its children,
+    # index file -> (mtime, data)
+    preloaded = {}
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.index_file = PackageIndex.get_index_file(log_file)
+        self.data = None
+
+    @staticmethod
+    def get_index_file(log_file):
+        """Returns path to the index of the log"""
+        return log_file + settings.package_index_suffix
+
+    @staticmethod
+    def build(log_file):
+        """Function creates index of the log, returns False if the log does not exist"""
+        try:
+            f = open(log_file, "rb")
+            try:
+                lines = f.read().splitlines()
+            finally:
+                f.close()
+        except IOError:
+            return False
+        entries = []
+        for line in lines:
+            fields = line.split()
+            if fields:
+                entries.append(fields[0] + b'\t' + line + b'\n')
+        entries.sort()
+        index_file = PackageIndex.get_index_file(log_file)
+        # modules can be reading the old index
+        FileHelper.write_to_file(index_file + ".tmp", "wb", b''.join(entries), False)
+        os.rename(index_file + ".tmp", index_file)
+        logger_debug.debug("Index of %d packages written to '%s'", len(entries), index_file)
+        return True
+
+    def is_valid(self):
+        """Returns True if the index exists and it is not older than the log"""
+        try:
+            return os.stat(self.index_file).st_mtime >= os.stat(self.log_file).st_mtime
+        except OSError:
+            return False
+
+    def preload(self):
+        """Function maps the index, so that forked processes do not have to"""
+        self.data = None
+        PackageIndex.preloaded[self.index_file] = (os.stat(self.index_file).st_mtime, self._get_data())
+
+    def _get_data(self):
+        if self.data is None and self.index_file in PackageIndex.preloaded:
+            mtime, data = PackageIndex.preloaded[self.index_file]
+            try:
+                if os.stat(self.index_file).st_mtime == mtime:
+                    self.data = data
+            except OSError:
+                pass
+        if self.data is None:
+            f = open(self.index_file, "rb")
+            try:
+                if os.fstat(f.fileno()).st_size == 0:
+                    self.data = b''
+                else:
+                    self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            finally:
+                f.close()
+        return self.data
+
+    def contains(self, pkg_name):
+        """Function returns True if the package is in the log"""
+        data = self._get_data()
+        key = pkg_name.encode(settings.defenc) + b'\t'
+        # lo and hi are always starts of lines
+        lo, hi = 0, len(data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = data.rfind(b'\n', lo, mid) + 1 or lo
+            end = data.find(b'\n', start)
+            if end == -1:
+                end = len(data)
+            if data[start:start + len(key)] < key:
+                lo = end + 1
+            else:
+                hi = start
+        return data[lo:lo + len(key)] == key
+
+    def get_names(self):
+        """Returns sorted list of all package names in the log"""
+        data = self._get_data()
+        return [x.split(b'\t', 1)[0].decode(settings.defenc) for x in data[:].splitlines()]
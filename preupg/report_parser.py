@@ -1,7 +1,6 @@
 from __future__ import print_function, unicode_literals
 import re
 import os
-import shutil
 import six
 
 from preupg.utils import FileHelper
@@ -9,10 +8,7 @@ from preupg.xccdf import XccdfHelper
 from preupg import settings
 from preupg.settings import ModuleValues
 from preupg.logger import logger_report, log_message
-try:
-    from xml.etree import ElementTree
-except ImportError:
-    from elementtree import ElementTree
+from preupg import xmltree
 from preupg.xmlgen import xml_tags
 
 
@@ -57,20 +53,37 @@ class ReportParser(object):
 
     """Class manipulates with XML files created by oscap"""
 
-    def __init__(self, report_path):
+    def __init__(self, report_path, stream=False):
+        """
+        With stream=True the tree is not loaded and only get_all_result_rules,
+        get_all_results and get_solution_files can be used. They read the file
+        by elements, which are freed when the next one is read.
+        """
         self.path = report_path
         self.element_prefix = "{http://checklists.nist.gov/xccdf/1.2}"
-        try:
-            # ElementTree.fromstring can't parse safely unicode string
-            content = FileHelper.get_file_content(report_path, 'rb', False, False)
-        except IOError:
-            raise
-        if not content:
-            return None
-        self.target_tree = ElementTree.fromstring(content)
+        # count of unfinished begin() calls and changes not written yet
+        self.batch_level = 0
+        self.dirty = False
+        self.stream = stream
+        self.target_tree = None
+        self._reset_indexes()
         self.profile = "Profile"
         self.changed_results = {}
         self.output_data = []
+        if not stream:
+            self.target_tree = ReportParser._parse(report_path)
+
+    @staticmethod
+    def _parse(path):
+        # the parser reads the file by blocks, the content is never in memory
+        # together with the tree
+        f = open(path, 'rb')
+        try:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return xmltree.parse(f)
+        finally:
+            f.close()
 
     def filter_children(self, tree, tag):
         return self.get_nodes(tree, tag, prefix='./')
@@ -79,9 +92,9 @@ class ReportParser(object):
         return len(self.get_nodes(tree, tag, prefix='./')) > 0
 
     def filter_grandchildren(self, tree, parent_tag, tag):
-        return tree.findall('./%s%s/%s%s' % (self.element_prefix,
-                                             parent_tag,
-                                             self.element_prefix, tag))
+        return xmltree.findall(tree, './%s%s/%s%s' % (self.element_prefix,
+                                                      parent_tag,
+                                                      self.element_prefix, tag))
 
     def get_child(self, tree, tag):
         return get_node(tree, tag, self.element_prefix, prefix='./')
@@ -93,7 +106,7 @@ class ReportParser(object):
             return ''
 
     def get_nodes(self, tree, tag, prefix=''):
-        return tree.findall(prefix + self.element_prefix + tag)
+        return xmltree.findall(tree, prefix + self.element_prefix + tag)
 
     def get_nodes_text(self, tree, tag):
         try:
@@ -107,12 +120,41 @@ class ReportParser(object):
 
     def reload_xml(self, path):
         """Function updates self.target_tree with the new path"""
+        self.flush()
         self.path = path
-        # ElementTree.fromstring can't parse safely unicode string
-        content = FileHelper.get_file_content(self.path, 'rb', False, False)
-        if not content:
+        if self.stream:
+            return None
+        target_tree = ReportParser._parse(self.path)
+        if target_tree is None:
             return None
-        self.target_tree = ElementTree.fromstring(content)
+        self.target_tree = target_tree
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        # id -> node indexes are built on the first lookup of the loaded tree
+        self.indexes = {}
+        # rule-result id -> inplace risks, see extract_risks
+        self.risks = None
+
+    def _get_index(self, name, get_nodes, attrib):
+        if name not in self.indexes:
+            index = {}
+            for node in get_nodes():
+                index.setdefault(node.get(attrib), node)
+            self.indexes[name] = index
+        return self.indexes[name]
+
+    def get_rule(self, rule_id):
+        """Function returns Rule node with the id or None"""
+        return self._get_index('rule', self._get_all_rules, 'id').get(rule_id)
+
+    def get_select(self, idref):
+        """Function returns select node of the Profile for the rule or None"""
+        return self._get_index('select', self.get_select_rules, 'idref').get(idref)
+
+    def get_rule_result(self, idref):
+        """Function returns rule-result node in TestResult for the rule or None"""
+        return self._get_index('rule-result', self.get_all_result_rules, 'idref').get(idref)
 
     def get_select_rules(self):
         selected = self.filter_grandchildren(self.target_tree, self.profile, "select")
@@ -135,15 +177,15 @@ class ReportParser(object):
     def get_name_of_checks(self):
         """Function returns a names of rules"""
         list_names = {}
-        rule_nodes = self._get_all_rules()
         for select in self.get_allowed_selected_rules():
             id_ref = select.get('idref', '')
-            rule = [x for x in rule_nodes if x.get('id', '') == id_ref]
-            list_names[id_ref] = self.get_nodes_text(rule[0], "title")
+            list_names[id_ref] = self.get_nodes_text(self.get_rule(id_ref), "title")
         return list_names
 
     def get_all_result_rules(self):
         """Function returns all rul-result in TestResult xml tag"""
+        if self.stream:
+            return XccdfHelper.iter_elements(self.path, "rule-result")
         return self.filter_grandchildren(self.target_tree, "TestResult", "rule-result")
 
     def get_all_results(self):
@@ -161,7 +203,11 @@ class ReportParser(object):
         xccdf_preupg_backup_solution_file=solution.txt
         """
         dict_solution = {}
-        for values in self.get_nodes(self.target_tree, "Value", prefix='.//'):
+        if self.stream:
+            nodes = XccdfHelper.iter_elements(self.path, "Value")
+        else:
+            nodes = self.get_nodes(self.target_tree, "Value", prefix='.//')
+        for values in nodes:
             value_id = values.get('id')
             if not value_id.endswith("_state_solution_file"):
                 continue
@@ -172,13 +218,37 @@ class ReportParser(object):
         logger_report.debug(dict_solution)
         return dict_solution
 
+    def begin(self):
+        """
+        Function starts a batch of changes. Modifying methods change
+        only the tree in memory and the file is written once by commit().
+        """
+        self.batch_level += 1
+
+    def commit(self):
+        """Function finishes the batch of changes and writes them to the file"""
+        self.batch_level = max(0, self.batch_level - 1)
+        if not self.batch_level:
+            self.flush()
+
+    def flush(self):
+        """Function writes changes which were postponed by begin()"""
+        if self.dirty:
+            self._write_file()
+
     def write_xml(self):
-        """Function writes XML document to file"""
-        self.target_tree.set('xmlns:xhtml', 'http://www.w3.org/1999/xhtml/')
+        """Function writes XML document to file, within begin() and commit() only marks it changed"""
+        if self.batch_level:
+            self.dirty = True
+            return
+        self._write_file()
+
+    def _write_file(self):
+        xmltree.set_namespace(self.target_tree, 'xhtml', 'http://www.w3.org/1999/xhtml/')
         # we really must set encoding here! and suppress it in write_to_file
-        data = ElementTree.tostring(self.target_tree, "utf-8")
+        data = xmltree.tostring(self.target_tree, "utf-8")
         FileHelper.write_to_file(self.path, 'wb', data, False)
-        self.target_tree = ElementTree.parse(self.path).getroot()
+        self.dirty = False
 
     def modify_result_path(self, result_dir, scenario, mode):
         """Function modifies result path in XML file"""
@@ -200,9 +270,35 @@ class ReportParser(object):
 
         self.write_xml()
 
+    def extract_risks(self, remove_debug=False):
+        """
+        Function reads inplace risks of all rule-results in one pass and keeps
+        them for get_inplace_risk. With remove_debug=True it removes debug
+        information from the report in the same pass.
+        """
+        self.risks = {}
+        for rule in self.get_all_result_rules():
+            self.risks[rule.get("idref")] = XccdfHelper.get_check_import_inplace_risk(rule, remove_debug)
+        if remove_debug:
+            self.write_xml()
+        return self.risks
+
+    def get_inplace_risk(self, rule):
+        """Function returns inplace risks of the rule-result"""
+        if self.risks is None:
+            self.extract_risks()
+        try:
+            return self.risks[rule.get("idref")]
+        except KeyError:
+            return XccdfHelper.get_check_import_inplace_risk(rule)
+
+    def get_rule_risks(self):
+        """Function returns list of (rule id, result, inplace risks) of all rule-results"""
+        return XccdfHelper.get_rule_risks(self.get_all_result_rules(), self.get_inplace_risk)
+
     def update_inplace_risk(self, scanning_progress, rule, res):
         """Function updates inplace risk"""
-        inplace_risk = XccdfHelper.get_check_import_inplace_risk(rule)
+        inplace_risk = self.get_inplace_risk(rule)
         if inplace_risk:
             logger_report.debug("Update_inplace_risk '%s'", inplace_risk)
             return_value = XccdfHelper.get_and_print_inplace_risk(0, inplace_risk)
@@ -234,7 +330,7 @@ class ReportParser(object):
             result = [x for x in self.get_nodes(rule, "result") if x.text == "fail"]
             # Get all affected rules and taken their names
             for res in result:
-                inplace_risk = XccdfHelper.get_check_import_inplace_risk(rule)
+                inplace_risk = self.get_inplace_risk(rule)
                 logger_report.debug(inplace_risk)
                 # In case that report has state fail and
                 # no log_risk than it should be needs_inspection
@@ -268,19 +364,7 @@ class ReportParser(object):
 
     def remove_debug_info(self):
         """Function removes debug information from report"""
-        re_expr = r'^preupg.log.DEBUG.*'
-        for rule in self.get_all_result_rules():
-            for check_import in self.filter_grandchildren(rule,
-                                                          "check",
-                                                          "check-import"):
-                if check_import.text is not None:
-                    new_check = []
-                    for check in check_import.text.split('\n'):
-                        matched = re.match(re_expr, check)
-                        if not matched:
-                            new_check.append(check)
-                    check_import.text = '\n'.join(new_check)
-        self.write_xml()
+        self.extract_risks(remove_debug=True)
 
     @staticmethod
     def write_xccdf_version(file_name, direction=False):
@@ -347,6 +431,9 @@ class ReportParser(object):
         """
         unknown_rules = []
         for select in list_rules:
+            if self.get_select(select) is not None:
+                continue
+            # a part of the rule name is accepted too
             found = [i for i in self.get_select_rules() if select in i.get('idref')]
             if not found:
                 unknown_rules.append(select)
@@ -369,52 +456,81 @@ class ReportParser(object):
         """
         if not os.path.exists(self.path):
             return None
-        orig_name = self.path
-        new_report_name = os.path.join(os.path.dirname(self.path),
-                                       settings.result_prefix + '-' + report_type + '.xml')
-        shutil.copyfile(self.path, new_report_name)
-        self.reload_xml(new_report_name)
-        list_dict = {}
+        return self.split_reports([report_type]).get(report_type)
+
+    def get_result_parts(self, report_types):
+        """Function returns a dictionary report type -> set of modules with the result part"""
+        modules = dict((x, set()) for x in report_types)
         for values in self.get_nodes(self.target_tree, "Value", prefix='.//'):
             values_id = values.get('id')
             if not values_id.endswith('_state_result_part'):
                 continue
             for value in self.get_nodes(values, "value"):
-                if value.text == report_type:
-                    values_id = values_id.replace('_state_result_part', '').replace('xccdf_preupg_value_', '')
-                    group_id = '_'.join(values_id.split('_')[:-1])
-                    list_dict[group_id] = values_id
-
-        if not list_dict:
-            self.reload_xml(orig_name)
-            os.unlink(new_report_name)
-            return None
-
-        # Remove all reports from TestResult node
-        for test_result in self.get_nodes(self.target_tree, 'TestResult'):
-            for rule in self.get_nodes(test_result, 'rule-result'):
-                idref = rule.get('idref').replace('xccdf_preupg_rule_', '')
-                if idref not in list_dict.values():
-                    test_result.remove(rule)
+                if value.text in modules:
+                    module = values_id.replace('_state_result_part', '').replace('xccdf_preupg_value_', '')
+                    modules[value.text].add(module)
+        return modules
 
-        self.write_xml()
+    def split_reports(self, report_types):
+        """
+        Function writes a report for each report type, e.g. result-admin.xml,
+        with rule-results of modules of the type only. All reports are written
+        from the loaded tree, rule-results are classified once.
 
-        self.reload_xml(orig_name)
-        return new_report_name
+        :return: a dictionary report type -> report path, types without modules are missing
+        """
+        self.flush()
+        modules = self.get_result_parts(report_types)
+        rule_result_tag = self.element_prefix + 'rule-result'
+        # TestResult -> list of (child, module of rule-result or None)
+        test_results = []
+        for test_result in self.get_nodes(self.target_tree, 'TestResult'):
+            children = []
+            for child in test_result:
+                module = None
+                if child.tag == rule_result_tag:
+                    module = child.get('idref').replace('xccdf_preupg_rule_', '')
+                children.append((child, module))
+            test_results.append((test_result, children))
+        xmltree.set_namespace(self.target_tree, 'xhtml', 'http://www.w3.org/1999/xhtml/')
+        reports = {}
+        try:
+            for report_type in report_types:
+                # 3rdparty results have their own prefix, e.g. vendor_result-admin.xml
+                report_name = os.path.join(os.path.dirname(self.path),
+                                           os.path.splitext(os.path.basename(self.path))[0] +
+                                           '-' + report_type + '.xml')
+                if not modules[report_type]:
+                    # a report of the previous assessment
+                    if os.path.exists(report_name):
+                        os.unlink(report_name)
+                    continue
+                for test_result, children in test_results:
+                    test_result[:] = [child for child, module in children
+                                      if module is None or module in modules[report_type]]
+                xmltree.write(self.target_tree, report_name)
+                reports[report_type] = report_name
+        finally:
+            for test_result, children in test_results:
+                test_result[:] = [child for child, dummy_module in children]
+        return reports
 
     def get_path(self):
         """Function return path to report"""
         return self.path
 
-    def add_global_tags(self, result_dir, scenario, mode, devel_mode, dist_native):
-
+    def add_global_tags(self, result_dir, scenario, mode, devel_mode, dist_native, output_dir=None):
+        """
+        Function adds values for check scripts to the profile.
+        output_dir is the directory for outputs of modules, result_dir by default
+        """
         for child in self.get_nodes(self.target_tree, self.profile):
             last_child = child
             for key, val in six.iteritems(xml_tags.GLOBAL_DIC_VALUES):
                 if key == 'result_part':
                     continue
                 if key == "tmp_preupgrade":
-                    val = result_dir
+                    val = output_dir or result_dir
                 elif key == "migrate" or key == "upgrade":
                     if not mode or 'migrate' in mode or 'upgrade' in mode:
                         val = "1"
@@ -430,12 +546,12 @@ class ReportParser(object):
                     else:
                         val = dist_native
                 logger_report.debug("'%s:%s'", key, val)
-                new_child = ElementTree.Element(self.element_prefix + 'Value',
-                                                {'id': xml_tags.TAG_VALUE + key,
-                                                 'type': 'string'
-                                                 })
-                sub_child = ElementTree.SubElement(new_child, self.element_prefix + 'value')
+                new_child = xmltree.Element(self.element_prefix + 'Value',
+                                            {'id': xml_tags.TAG_VALUE + key,
+                                             'type': 'string'
+                                             })
+                sub_child = xmltree.SubElement(new_child, self.element_prefix + 'value')
                 sub_child.text = val
-                self.target_tree.insert(self.target_tree._children.index(last_child) + 1,
+                self.target_tree.insert(list(self.target_tree).index(last_child) + 1,
                                         new_child)
         self.write_xml()
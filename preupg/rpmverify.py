@@ -0,0 +1,388 @@
+"""
+The rpmverify module verifies installed packages the same way as
+'rpm -Va' does, but in process and with files of several packages
+checked at the same time. Its output has the 'rpm -Va' format.
+Prelinked ELF files are verified by their content before prelinking.
+"""
+
+from __future__ import unicode_literals
+import os
+import pwd
+import grp
+import stat
+import json
+import hashlib
+import subprocess
+
+try:
+    import rpm
+except ImportError:
+    rpm = None
+
+from preupg import settings
+from preupg.logger import logger_debug
+from preupg.scheduler import ModuleScheduler
+from preupg.utils import FileHelper, DirHelper
+
+# RPMVERIFY_* flags, the attributes which are checked
+VERIFY_SIZE = 1 << 0
+VERIFY_DIGEST = 1 << 1
+VERIFY_LINKTO = 1 << 2
+VERIFY_USER = 1 << 3
+VERIFY_GROUP = 1 << 4
+VERIFY_MTIME = 1 << 5
+VERIFY_MODE = 1 << 6
+VERIFY_RDEV = 1 << 7
+VERIFY_CAPS = 1 << 8
+
+# columns of 'rpm -Va' output in their order
+VERIFY_COLUMNS = [(VERIFY_SIZE, 'S'),
+                  (VERIFY_MODE, 'M'),
+                  (VERIFY_DIGEST, '5'),
+                  (VERIFY_RDEV, 'D'),
+                  (VERIFY_LINKTO, 'L'),
+                  (VERIFY_USER, 'U'),
+                  (VERIFY_GROUP, 'G'),
+                  (VERIFY_MTIME, 'T'),
+                  (VERIFY_CAPS, 'P')]
+
+# RPMFILE_* attributes of files
+FILE_CONFIG = 1 << 0
+FILE_DOC = 1 << 1
+FILE_MISSINGOK = 1 << 3
+FILE_GHOST = 1 << 6
+FILE_LICENSE = 1 << 7
+FILE_README = 1 << 8
+
+FILE_ATTRIBUTES = [(FILE_CONFIG, 'c'),
+                   (FILE_DOC, 'd'),
+                   (FILE_GHOST, 'g'),
+                   (FILE_LICENSE, 'l'),
+                   (FILE_README, 'r')]
+
+# RPMFILE_STATE_NORMAL, other files are replaced, not installed etc.
+FILE_STATE_NORMAL = 0
+
+# values of RPMTAG_FILEDIGESTALGO
+DIGEST_ALGORITHMS = {1: 'md5', 2: 'sha1', 8: 'sha256', 9: 'sha384', 10: 'sha512', 11: 'sha224'}
+
+# helper which undoes prelinking of ELF files, rpm verifies the original content
+PRELINK = "/usr/sbin/prelink"
+ELF_MAGIC = b"\x7fELF"
+
+# attributes which are not checked for other file types than regular files
+SPECIAL_FILE_SKIP = VERIFY_DIGEST | VERIFY_SIZE | VERIFY_MTIME | VERIFY_LINKTO | VERIFY_CAPS
+SYMLINK_SKIP = VERIFY_DIGEST | VERIFY_SIZE | VERIFY_MTIME | VERIFY_MODE | VERIFY_CAPS
+
+
+class PackageFile(object):
+
+    """Class holds metadata of one file from the RPM database"""
+
+    def __init__(self, name, size, mode, mtime, flags, rdev, state, vflags,
+                 user, group, digest, linkto="", algorithm="md5"):
+        self.name = name
+        self.size = size
+        self.mode = mode
+        self.mtime = mtime
+        # RPMFILE_* attributes
+        self.flags = flags
+        self.rdev = rdev
+        self.state = state
+        # RPMVERIFY_* attributes which are checked
+        self.vflags = vflags
+        self.user = user
+        self.group = group
+        self.digest = digest
+        self.linkto = linkto
+        self.algorithm = algorithm
+
+
+class RpmVerifyHelper(object):
+
+    @staticmethod
+    def _update_digest(hasher, f):
+        """Function reads the file object into the hasher and returns count of read bytes"""
+        size = 0
+        while True:
+            data = f.read(65536)
+            if not data:
+                break
+            hasher.update(data)
+            size += len(data)
+        return size
+
+    @staticmethod
+    def is_prelinked(full_path):
+        """Returns True if the file is ELF and prelink is installed, like rpm does"""
+        if not os.access(PRELINK, os.X_OK):
+            return False
+        f = open(full_path, "rb")
+        try:
+            return f.read(len(ELF_MAGIC)) == ELF_MAGIC
+        finally:
+            f.close()
+
+    @staticmethod
+    def get_file_digest(full_path, algorithm):
+        """
+        Function returns (hex digest, size) of the file content. Prelinking
+        of ELF files is undone by 'prelink -y' first, like 'rpm -Va' does.
+        """
+        if RpmVerifyHelper.is_prelinked(full_path):
+            hasher = hashlib.new(algorithm)
+            devnull = open(os.devnull, "wb")
+            try:
+                sp = subprocess.Popen([PRELINK, "-y", full_path], stdout=subprocess.PIPE,
+                                      stderr=devnull, close_fds=True)
+            finally:
+                devnull.close()
+            try:
+                size = RpmVerifyHelper._update_digest(hasher, sp.stdout)
+            finally:
+                sp.stdout.close()
+            # the file is not prelinked or prelink failed, the file is read as it is
+            if sp.wait() == 0:
+                return hasher.hexdigest(), size
+        hasher = hashlib.new(algorithm)
+        f = open(full_path, "rb")
+        try:
+            size = RpmVerifyHelper._update_digest(hasher, f)
+        finally:
+            f.close()
+        return hasher.hexdigest(), size
+
+    @staticmethod
+    def get_attribute(flags):
+        """Returns the character printed by 'rpm -Va' before the file name"""
+        for flag, char in FILE_ATTRIBUTES:
+            if flags & flag:
+                return char
+        return ' '
+
+    @staticmethod
+    def get_user_name(uid, names={}):
+        if uid not in names:
+            try:
+                names[uid] = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                names[uid] = None
+        return names[uid]
+
+    @staticmethod
+    def get_group_name(gid, names={}):
+        if gid not in names:
+            try:
+                names[gid] = grp.getgrgid(gid).gr_name
+            except KeyError:
+                names[gid] = None
+        return names[gid]
+
+    @staticmethod
+    def get_failures(entry, file_stat, index=None):
+        """
+        Function returns a dictionary RPMVERIFY_* -> True if the attribute
+        differs or None if it can not be checked, like rpmVerifyFile does.
+        Digests of files which were not touched are taken from DigestIndex.
+        Size of prelinked files is the size of the original content.
+        """
+        file_size = file_stat.st_size
+        flags = entry.vflags
+        file_mode = file_stat.st_mode
+        if stat.S_ISDIR(file_mode) or stat.S_ISFIFO(file_mode) or \
+                stat.S_ISCHR(file_mode) or stat.S_ISBLK(file_mode):
+            flags &= ~SPECIAL_FILE_SKIP
+        elif stat.S_ISLNK(file_mode):
+            flags &= ~SYMLINK_SKIP
+        else:
+            flags &= ~VERIFY_LINKTO
+        failures = {}
+        if flags & VERIFY_DIGEST and entry.digest:
+            try:
+                if index is None:
+                    digest, file_size = RpmVerifyHelper.get_file_digest(entry.name, entry.algorithm)
+                else:
+                    digest, file_size = index.get_digest(entry.name, file_stat, entry.algorithm)
+                if digest != entry.digest:
+                    failures[VERIFY_DIGEST] = True
+            except (IOError, OSError, ValueError):
+                failures[VERIFY_DIGEST] = None
+        if flags & VERIFY_LINKTO:
+            try:
+                if os.readlink(entry.name) != entry.linkto:
+                    failures[VERIFY_LINKTO] = True
+            except OSError:
+                failures[VERIFY_LINKTO] = None
+        if flags & VERIFY_SIZE and file_size != entry.size:
+            failures[VERIFY_SIZE] = True
+        if flags & VERIFY_MODE and file_mode != entry.mode:
+            failures[VERIFY_MODE] = True
+        if flags & VERIFY_RDEV:
+            is_device = stat.S_ISCHR(file_mode) or stat.S_ISBLK(file_mode)
+            if stat.S_IFMT(file_mode) != stat.S_IFMT(entry.mode) or \
+                    (is_device and file_stat.st_rdev != entry.rdev):
+                failures[VERIFY_RDEV] = True
+        if flags & VERIFY_MTIME and int(file_stat.st_mtime) != entry.mtime:
+            failures[VERIFY_MTIME] = True
+        if flags & VERIFY_USER and RpmVerifyHelper.get_user_name(file_stat.st_uid) != entry.user:
+            failures[VERIFY_USER] = True
+        if flags & VERIFY_GROUP and RpmVerifyHelper.get_group_name(file_stat.st_gid) != entry.group:
+            failures[VERIFY_GROUP] = True
+        return failures
+
+    @staticmethod
+    def format_line(entry, failures):
+        """Function returns the line in 'rpm -Va' format"""
+        columns = []
+        for flag, char in VERIFY_COLUMNS:
+            if flag not in failures:
+                columns.append('.')
+            elif failures[flag] is None:
+                columns.append('?')
+            else:
+                columns.append(char)
+        return "%s  %s %s" % (''.join(columns), RpmVerifyHelper.get_attribute(entry.flags), entry.name)
+
+    @staticmethod
+    def verify_file(entry, index=None):
+        """Function returns 'rpm -Va' line of the file or None if it is not changed"""
+        if entry.state != FILE_STATE_NORMAL or entry.flags & FILE_GHOST:
+            return None
+        try:
+            file_stat = os.lstat(entry.name)
+        except OSError:
+            if entry.flags & FILE_MISSINGOK:
+                return None
+            return "missing   %s %s" % (RpmVerifyHelper.get_attribute(entry.flags), entry.name)
+        failures = RpmVerifyHelper.get_failures(entry, file_stat, index)
+        if not failures:
+            return None
+        return RpmVerifyHelper.format_line(entry, failures)
+
+
+class DigestIndex(object):
+
+    """
+    Class holds digests of files from the previous verification together
+    with (inode, size, mtime, ctime) of the files at that time. A file
+    with the same values was not touched and is not read again.
+    """
+
+    def __init__(self, index_file, refresh=False):
+        """
+        :param index_file: JSON file with the index,
+                           path -> [inode, size, mtime, ctime, algorithm, digest, digested size]
+        :param refresh: do not use digests from the previous verification
+        """
+        self.index_file = index_file
+        self.previous = {}
+        if not refresh:
+            self.previous = self._load()
+        self.current = {}
+        # count of files which were read
+        self.digested = 0
+
+    def _load(self):
+        try:
+            data = json.loads(FileHelper.get_file_content(self.index_file, "rb"))
+        except (IOError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return data
+
+    @staticmethod
+    def get_state(file_stat):
+        return [file_stat.st_ino, file_stat.st_size, file_stat.st_mtime, file_stat.st_ctime]
+
+    def get_digest(self, full_path, file_stat, algorithm):
+        """
+        Function returns (digest, size) of the file like get_file_digest(),
+        it is computed only if the file was touched
+        """
+        state = DigestIndex.get_state(file_stat) + [algorithm]
+        entry = self.previous.get(full_path)
+        if entry is not None and entry[:-2] == state:
+            digest, size = entry[-2:]
+        else:
+            digest, size = RpmVerifyHelper.get_file_digest(full_path, algorithm)
+            self.digested += 1
+        self.current[full_path] = state + [digest, size]
+        return digest, size
+
+    def save(self):
+        """Function stores digests of files checked in this verification"""
+        try:
+            DirHelper.check_or_create_temp_dir(os.path.dirname(self.index_file))
+            FileHelper.write_to_file(self.index_file, "wb", json.dumps(self.current, separators=(',', ':')))
+        except (IOError, OSError):
+            logger_debug.debug("Can not store digests to '%s'", self.index_file)
+
+
+class RpmVerifier(object):
+
+    """Class verifies files of installed packages in a pool of threads"""
+
+    def __init__(self, jobs=None, index_file=None, refresh=False):
+        """
+        :param jobs: count of threads
+        :param index_file: file with DigestIndex, digests are not reused without it
+        :param refresh: compute digests of all files
+        """
+        self.jobs = jobs or settings.rpm_verify_jobs
+        self.index_file = index_file
+        self.refresh = refresh
+
+    @staticmethod
+    def is_available():
+        """Returns True if the rpm Python bindings are installed"""
+        return rpm is not None
+
+    @staticmethod
+    def get_packages():
+        """Function returns a list with list of PackageFile for each installed package"""
+        algorithm_tag = getattr(rpm, 'RPMTAG_FILEDIGESTALGO', None)
+        packages = []
+        ts = rpm.TransactionSet()
+        for header in ts.dbMatch():
+            algorithm = 'md5'
+            if algorithm_tag is not None:
+                algorithm = DIGEST_ALGORITHMS.get(header[algorithm_tag] or 1, 'md5')
+            files = []
+            fi = header.fiFromHeader()
+            for (name, size, mode, mtime, flags, rdev, dummy_inode, dummy_nlink,
+                 state, vflags, user, group, digest) in fi:
+                files.append(PackageFile(name, size, mode, mtime, flags, rdev, state, vflags,
+                                         user, group, digest, fi.FLink(), algorithm))
+            if files:
+                packages.append(files)
+        return packages
+
+    def verify(self, packages=None):
+        """
+        Function returns 'rpm -Va' lines of all packages. Packages are
+        verified in parallel, lines keep the order of the RPM database.
+        """
+        if packages is None:
+            packages = RpmVerifier.get_packages()
+        index = None
+        if self.index_file:
+            index = DigestIndex(self.index_file, self.refresh)
+
+        def verify_package(package):
+            return [x for x in [RpmVerifyHelper.verify_file(y, index) for y in packages[package]] if x]
+        tasks = range(len(packages))
+        results = ModuleScheduler(self.jobs).run(tasks, verify_package)
+        lines = []
+        for package in tasks:
+            lines.extend(results[package])
+        if index is not None:
+            logger_debug.debug("%d files were read by the native RPM verification", index.digested)
+            index.save()
+        return lines
+
+    def write_log(self, output):
+        """Function writes output of 'rpm -Va' to the output file"""
+        lines = self.verify()
+        logger_debug.debug("%d changed files found by the native RPM verification", len(lines))
+        FileHelper.write_to_file(output, "wb", ''.join([x + "\n" for x in lines]))
@@ -1,6 +1,7 @@
 
 from __future__ import unicode_literals
 import os
+import datetime
 from preupg.logger import settings, logger_report, log_message, logging
 
 
@@ -53,14 +54,20 @@ class ScanningHelper(object):
 
 class ScanProgress(object):
     """The class is used for showing progress during the scan check."""
-    def __init__(self, total_count, debug):
+    def __init__(self, total_count, debug, quiet=False):
         self.total_count = total_count
+        # results are only collected, e.g. for 3rdparty contents scanned
+        # in the background
+        self.quiet = quiet
         self.current_count = 0
         self.output_data = []
         self.debug = debug
         self.names = {}
         self.list_names = []
         self.width_size = 0
+        # wall time of each rule in seconds; valid only for sequential scan
+        self.durations = {}
+        self.last_time = datetime.datetime.now()
 
     def get_full_name(self, count):
         """Function returns full name from dictionary"""
@@ -99,10 +106,17 @@ class ScanProgress(object):
             print (stdout_data)
             return
         self.output_data.append(u'{0}:{1}'.format(self.names[xccdf_rule], stdout_data.strip()))
+        now = datetime.datetime.now()
+        diff = now - self.last_time
+        self.durations[xccdf_rule] = diff.days * 86400 + diff.seconds + diff.microseconds / 1000000.0
+        self.last_time = now
         self.current_count += 1
+        if self.quiet:
+            return
         old_width = self.width_size
         self.width_size -= 21
-        prev_msg = self._return_correct_msg(self.get_full_name(self.current_count - 1))
+        # rules finish in a different order than they start with --jobs
+        prev_msg = self._return_correct_msg(self.names[xccdf_rule])
         self.width_size = old_width
         cur_msg = self._return_correct_msg(self.get_full_name(self.current_count))
         cnt_back = 7 + len(prev_msg) + 3
@@ -125,12 +139,20 @@ class ScanProgress(object):
         self.names = names
         self.list_names = sorted(names)
 
+    def get_durations(self):
+        """Function returns a dictionary rule -> duration in seconds"""
+        return self.durations
+
     def get_output_data(self):
         """Function gets an output data from oscap"""
         return self.output_data
 
     def update_data(self, changed_fields):
         """Function updates a data"""
+        changed_results = {}
+        for field in changed_fields:
+            rule_id, result = field.split(':', 1)
+            changed_results.setdefault(rule_id, result)
         for index, row in enumerate(self.output_data):
             try:
                 title, rule_id, dummy_result = row.split(':')
@@ -138,6 +160,5 @@ class ScanProgress(object):
             except ValueError:
                 continue
             else:
-                result_list = [x for x in changed_fields if rule_id in x]
-                if result_list:
-                    self.output_data[index] = u"%s:%s:%s" % (title, rule_id, result_list[0].split(':')[1])
+                if rule_id in changed_results:
+                    self.output_data[index] = u"%s:%s:%s" % (title, rule_id, changed_results[rule_id])
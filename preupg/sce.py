@@ -0,0 +1,793 @@
+# -*- coding: utf-8 -*-
+"""
+The sce module executes SCE check scripts of selected rules the same way
+as the oscap SCE engine does and stores results to the XCCDF result file.
+It is used as an alternative to the sequential 'oscap xccdf eval'.
+"""
+
+from __future__ import unicode_literals
+import os
+import re
+import copy
+import errno
+import threading
+import signal
+import socket
+import time
+import datetime
+import tempfile
+import subprocess
+
+import six
+
+from preupg import settings
+from preupg import xmltree
+from preupg.logger import log_message, logging, logger_debug
+from preupg.scheduler import ModuleScheduler
+from preupg.utils import FileHelper, ProcessHelper
+from preupg.xccdf import XMLNS, XccdfHelper
+
+SCE_SYSTEM = "http://open-scap.org/page/SCE"
+
+# Results in the order used by oscap; a check script exits with
+# SCE_RESULT_BASE + position, e.g. 101 for pass or 105 for notapplicable
+SCE_RESULTS = [('PASS', 'pass'),
+               ('FAIL', 'fail'),
+               ('ERROR', 'error'),
+               ('UNKNOWN', 'unknown'),
+               ('NOT_APPLICABLE', 'notapplicable'),
+               ('NOT_CHECKED', 'notchecked'),
+               ('NOT_SELECTED', 'notselected'),
+               ('INFORMATIONAL', 'informational'),
+               ('FIXED', 'fixed')]
+SCE_RESULT_BASE = 100
+
+TEST_RESULT_ID = "xccdf_org.open-scap_testresult_"
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+REUSED_MESSAGE = "The result is reused from the previous assessment, inputs of the module did not change."
+
+TIMEOUT_MESSAGE = "The module was killed after %d seconds, its output is incomplete."
+
+SKIPPED_MESSAGE = "The module was not executed, the time limit of the assessment was reached."
+
+# The only CPE names evaluated without the CPE dictionary of oscap, the
+# platform of the assessment is set to them, see ReportParser.modify_platform_tag
+RHEL_CPE = "cpe:/o:redhat:enterprise_linux"
+
+REDHAT_RELEASE = "/etc/redhat-release"
+
+
+def get_time_stamp(time=None):
+    """Function returns time in the format used by XCCDF results"""
+    if time is None:
+        time = datetime.datetime.now()
+    return time.strftime(TIME_FORMAT)
+
+
+def get_env_value(value):
+    """Environment of child processes has to be in system encoding on Python 2"""
+    if six.PY2 and isinstance(value, six.text_type):
+        return value.encode(settings.defenc)
+    return value
+
+
+def get_text_value(value):
+    """Environment of this process is in system encoding on Python 2"""
+    if isinstance(value, six.binary_type):
+        return value.decode(settings.defenc, 'replace')
+    return value
+
+
+class SCERule(object):
+
+    """Class holds everything needed for execution of one check script"""
+
+    def __init__(self, rule_id, title, script, check, exports):
+        """
+        :param rule_id: xccdf_preupg_rule_... id
+        :param title: title of the rule
+        :param script: full path to the check script
+        :param check: check element of the rule
+        :param exports: dictionary with XCCDF_VALUE_* variables
+        """
+        self.rule_id = rule_id
+        self.title = title
+        self.script = script
+        self.check = check
+        self.exports = exports
+
+    def is_exclusive(self):
+        """Exclusive modules touch shared state and have to run alone"""
+        return self.exports.get('XCCDF_VALUE_EXCLUSIVE', '0') == '1'
+
+    def get_timeout(self, default=None):
+        """
+        Returns time limit of the module in seconds or None for no limit.
+        The timeout from module INI file overrides the default one.
+        """
+        timeout = self.exports.get('XCCDF_VALUE_TIMEOUT', '')
+        if timeout.isdigit():
+            return int(timeout) or None
+        return default or None
+
+    def __repr__(self):
+        return "<SCERule %s>" % self.rule_id
+
+
+class SCEResult(object):
+
+    """Class holds a result of one executed check script"""
+
+    def __init__(self, rule_id, result, stdout="", stderr="",
+                 start_time=None, end_time=None, message=None):
+        self.rule_id = rule_id
+        self.result = result
+        self.stdout = stdout
+        self.stderr = stderr
+        self.start_time = start_time
+        self.end_time = end_time
+        self.message = message
+        # result is taken from the previous assessment (--incremental)
+        self.reused = False
+        # CPU time in seconds and maximum RSS in kB of the check script
+        self.cpu_time = None
+        self.max_rss = None
+
+    def get_wall_time(self):
+        """Returns duration of the check script in seconds"""
+        if self.start_time is None or self.end_time is None:
+            return None
+        diff = self.end_time - self.start_time
+        return diff.days * 86400 + diff.seconds + diff.microseconds / 1000000.0
+
+    def get_progress_line(self):
+        """Returns the line printed by 'oscap xccdf eval --progress'"""
+        return "%s:%s\n" % (self.rule_id, self.result)
+
+    def to_dict(self):
+        """Returns the result as a dictionary which can be stored in JSON"""
+        return {'rule_id': self.rule_id,
+                'result': self.result,
+                'stdout': self.stdout,
+                'stderr': self.stderr,
+                'start_time': get_time_stamp(self.start_time),
+                'end_time': get_time_stamp(self.end_time),
+                'message': self.message}
+
+    @staticmethod
+    def from_dict(data):
+        """Creates the result from a dictionary made by to_dict"""
+        times = []
+        for key in ['start_time', 'end_time']:
+            times.append(datetime.datetime.strptime(data[key], TIME_FORMAT))
+        return SCEResult(data['rule_id'], data['result'],
+                         data.get('stdout', ""), data.get('stderr', ""),
+                         times[0], times[1], data.get('message'))
+
+
+class SCEHelper(object):
+
+    @staticmethod
+    def get_result_env():
+        """Function returns XCCDF_RESULT_* variables set by the SCE engine"""
+        env = {}
+        for index, (name, dummy_result) in enumerate(SCE_RESULTS):
+            env['XCCDF_RESULT_' + name] = str(SCE_RESULT_BASE + index + 1)
+        return env
+
+    @staticmethod
+    def get_result_name(returncode):
+        """Function translates exit code of check script to XCCDF result"""
+        index = int(returncode) - SCE_RESULT_BASE - 1
+        if 0 <= index < len(SCE_RESULTS):
+            return SCE_RESULTS[index][1]
+        return 'error'
+
+    @staticmethod
+    def get_values(tree):
+        """Function returns a dictionary value_id -> (value, type)"""
+        values = {}
+        for value_node in xmltree.findall(tree, ".//" + XMLNS + "Value"):
+            text = ""
+            for value in value_node.findall(XMLNS + "value"):
+                if value.get("selector") is None:
+                    text = value.text or ""
+                    break
+            values[value_node.get("id")] = (text, value_node.get("type", "string"))
+        return values
+
+    @staticmethod
+    def get_selected(tree, profile):
+        """Function returns a dictionary idref -> selected from the profile"""
+        selected = {}
+        for profile_node in tree.findall(XMLNS + "Profile"):
+            if profile_node.get("id") != profile:
+                continue
+            for select in profile_node.findall(XMLNS + "select"):
+                selected[select.get("idref")] = select.get("selected") == "true"
+        return selected
+
+    @staticmethod
+    def get_system_platform():
+        """Function returns CPE name of the running RHEL, e.g. cpe:/o:redhat:enterprise_linux:6, or None"""
+        try:
+            release = FileHelper.get_file_content(REDHAT_RELEASE, 'rb')
+        except IOError:
+            return None
+        matched = re.match(r'Red Hat Enterprise Linux.* release (\d+)', release)
+        if matched:
+            return RHEL_CPE + ":" + matched.group(1)
+        return None
+
+    @staticmethod
+    def is_platform_applicable(idref, system_platform):
+        """
+        Function returns True if the platform idref matches the running system,
+        False if it does not match and None if it can be evaluated by oscap only
+        """
+        if idref != RHEL_CPE and not idref.startswith(RHEL_CPE + ":"):
+            return None
+        version = idref[len(RHEL_CPE) + 1:]
+        if version and not version.isdigit():
+            return None
+        if system_platform is None:
+            return False
+        return not version or idref == system_platform
+
+    @staticmethod
+    def get_rule_env(rule):
+        """Function returns environment of the check script"""
+        env = dict(os.environ)
+        env.update(SCEHelper.get_result_env())
+        env.update(rule.exports)
+        return env
+
+    @staticmethod
+    def run_rule(rule, timeout=None, forkserver=None):
+        """
+        Function runs check script of the rule and returns SCEResult.
+
+        The script is executed from its directory with XCCDF_VALUE_*
+        and XCCDF_RESULT_* variables like in case of the oscap SCE engine.
+        If it runs longer than timeout seconds, the script is killed
+        together with its process group and the result is error.
+        Python scripts are forked from the ForkServer if it is given.
+        """
+        if forkserver is not None and forkserver.can_run(rule.script):
+            result = SCEHelper.run_forked(rule, timeout, forkserver)
+            if result is not None:
+                return result
+        env = dict((get_env_value(key), get_env_value(val))
+                   for key, val in six.iteritems(SCEHelper.get_rule_env(rule)))
+        start_time = datetime.datetime.now()
+        try:
+            sp = subprocess.Popen([rule.script],
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE,
+                                  cwd=os.path.dirname(rule.script),
+                                  env=env,
+                                  close_fds=True,
+                                  preexec_fn=os.setpgrp if timeout else None)
+        except OSError as exc:
+            logger_debug.debug("Execution of '%s' failed: %s", rule.script, exc)
+            return SCEResult(rule.rule_id, 'error',
+                             start_time=start_time,
+                             end_time=datetime.datetime.now(),
+                             message="Check script %s can not be executed: %s" % (rule.script,
+                                                                                  exc.strerror))
+        killed = []
+        timer = None
+        if timeout:
+            ProcessHelper.add_process_group(sp.pid)
+            timer = threading.Timer(timeout, SCEHelper.kill_rule, (rule, sp.pid, killed))
+            timer.daemon = True
+            timer.start()
+        try:
+            stdout, stderr, usage = SCEHelper.communicate(sp)
+        finally:
+            if timer is not None:
+                timer.cancel()
+                ProcessHelper.remove_process_group(sp.pid)
+        result = SCEResult(rule.rule_id,
+                           'error' if killed else SCEHelper.get_result_name(sp.returncode),
+                           stdout.decode(settings.defenc, 'replace'),
+                           stderr.decode(settings.defenc, 'replace'),
+                           start_time,
+                           datetime.datetime.now(),
+                           TIMEOUT_MESSAGE % timeout if killed else None)
+        if usage is not None:
+            result.cpu_time = usage.ru_utime + usage.ru_stime
+            result.max_rss = usage.ru_maxrss
+        return result
+
+    @staticmethod
+    def run_forked(rule, timeout, forkserver):
+        """
+        Function runs the Python check script in a process forked
+        from the fork server. Returns None if the server is not running.
+        """
+        start_time = datetime.datetime.now()
+        outputs = []
+        for name in ['stdout', 'stderr']:
+            fd, path = tempfile.mkstemp(prefix='preupg-' + name + '-')
+            os.close(fd)
+            outputs.append(path)
+        try:
+            env = dict((get_text_value(key), get_text_value(val))
+                       for key, val in six.iteritems(SCEHelper.get_rule_env(rule)))
+            request = forkserver.run(rule.script, env, os.path.dirname(rule.script),
+                                     outputs[0], outputs[1])
+            if request is None:
+                return None
+            request.started.wait()
+            if request.pid is None:
+                return None
+            killed = []
+            timer = None
+            # forked scripts always run in their own process group
+            ProcessHelper.add_process_group(request.pid)
+            if timeout:
+                timer = threading.Timer(timeout, SCEHelper.kill_rule, (rule, request.pid, killed))
+                timer.daemon = True
+                timer.start()
+            try:
+                request.finished.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                ProcessHelper.remove_process_group(request.pid)
+            if request.status is None:
+                return None
+            stdout, stderr = [FileHelper.get_file_content(x, "rb", False, False) for x in outputs]
+        finally:
+            for path in outputs:
+                os.unlink(path)
+        result = SCEResult(rule.rule_id,
+                           'error' if killed else SCEHelper.get_result_name(request.get_returncode()),
+                           stdout.decode(settings.defenc, 'replace'),
+                           stderr.decode(settings.defenc, 'replace'),
+                           start_time,
+                           datetime.datetime.now(),
+                           TIMEOUT_MESSAGE % timeout if killed else None)
+        result.cpu_time = request.cpu_time
+        result.max_rss = request.max_rss
+        return result
+
+    @staticmethod
+    def kill_rule(rule, pid, killed):
+        """Function kills the hung check script with all its children"""
+        log_message("Module '%s' reached its time limit and it is killed." % rule.rule_id,
+                    level=logging.WARNING)
+        killed.append(pid)
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError as exc:
+            logger_debug.debug("Check script %s can not be killed: %s", rule.script, exc.strerror)
+
+    @staticmethod
+    def wait(pid):
+        """Function waits for the process and returns its status and resource usage"""
+        while True:
+            try:
+                dummy_pid, status, usage = os.wait4(pid, 0)
+                return status, usage
+            except OSError as exc:
+                if exc.errno != errno.EINTR:
+                    raise
+
+    @staticmethod
+    def communicate(sp):
+        """
+        Function reads stdout and stderr of the process like
+        Popen.communicate() and returns them together with
+        resource usage of the process
+        """
+        stderr = []
+        reader = threading.Thread(target=lambda: stderr.append(sp.stderr.read()))
+        reader.daemon = True
+        reader.start()
+        stdout = sp.stdout.read()
+        reader.join()
+        sp.stdout.close()
+        sp.stderr.close()
+        try:
+            status, usage = SCEHelper.wait(sp.pid)
+        except OSError:
+            # the process was already reaped, resource usage is unknown
+            sp.wait()
+            return stdout, stderr[0], None
+        if os.WIFSIGNALED(status):
+            sp.returncode = -os.WTERMSIG(status)
+        else:
+            sp.returncode = os.WEXITSTATUS(status)
+        return stdout, stderr[0], usage
+
+
+class ModuleWatchdog(object):
+
+    """
+    Class kills check scripts executed by oscap when the running module
+    exceeds its time limit. oscap itself is not killed, so that the killed
+    module is reported as error and the scan continues.
+
+    oscap does not report which module is running, it is the next rule
+    after the last one printed by 'oscap xccdf eval --progress'. When the
+    time limit of the whole assessment is reached, check scripts of the
+    remaining modules are killed as soon as they start.
+    """
+
+    # how often new check scripts are looked for after the end of the assessment
+    poll_interval = 0.5
+
+    def __init__(self, timeout, rules=None, scan_timeout=None):
+        """
+        :param timeout: default time limit of one module in seconds
+        :param rules: SCERules in the order of execution, their timeouts override the default one
+        :param scan_timeout: time limit of the whole assessment in seconds
+        """
+        self.timeout = timeout
+        self.rules = rules or []
+        self.indexes = dict((rule.rule_id, index) for index, rule in enumerate(self.rules))
+        # index of the running rule
+        self.current = 0
+        self.scan_timeout = scan_timeout
+        self.deadline = None
+        self.skipping = False
+        self.partial = b''
+        self.pid = None
+        self.timer = None
+        self.stopped = False
+        self.lock = threading.Lock()
+
+    def get_timeout(self):
+        """Returns time limit of the running module in seconds or None"""
+        if self.current < len(self.rules):
+            return self.rules[self.current].get_timeout(self.timeout)
+        return self.timeout
+
+    def _get_interval(self):
+        """
+        Returns seconds until the running module has to be killed or None
+        and True if it is because of the end of the assessment
+        """
+        timeout = self.get_timeout()
+        if self.deadline is None:
+            return timeout, False
+        remaining = self.deadline - time.time()
+        if remaining <= 0:
+            return self.poll_interval, True
+        if timeout and timeout < remaining:
+            return timeout, False
+        return remaining, True
+
+    def _expired(self, at_deadline):
+        # check scripts and their children are descendants of oscap
+        pids = ProcessHelper.get_descendants(self.pid)
+        if at_deadline:
+            if pids and not self.skipping:
+                log_message("The time limit of the assessment was reached, remaining modules are skipped.",
+                            level=logging.WARNING)
+                self.skipping = True
+        elif pids:
+            log_message("A module runs longer than %d seconds and it is killed." % self.get_timeout(),
+                        level=logging.WARNING)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError as exc:
+                logger_debug.debug("Process %d can not be killed: %s", pid, exc.strerror)
+        self.reset()
+
+    def start(self, pid):
+        """Function starts watching check scripts of the oscap process"""
+        self.pid = pid
+        if self.scan_timeout:
+            self.deadline = time.time() + self.scan_timeout
+        self.reset()
+
+    def _update(self, output):
+        """Function moves to the rule after the last finished one in the output"""
+        lines = (self.partial + output).split(b'\n')
+        self.partial = lines.pop()[-settings.subprocess_chunk:]
+        for line in lines:
+            rule_id = line.decode(settings.defenc, 'replace').strip().rsplit(':', 1)[0]
+            index = self.indexes.get(rule_id)
+            if index is not None and index >= self.current:
+                self.current = index + 1
+
+    def reset(self, output=None):
+        """
+        Function starts measuring of the time limit again, e.g. when a module
+        finished. output is the output of oscap with finished modules.
+        """
+        self.lock.acquire()
+        try:
+            if output:
+                self._update(output)
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            interval, at_deadline = self._get_interval()
+            if not self.stopped and interval:
+                self.timer = threading.Timer(interval, self._expired, (at_deadline,))
+                self.timer.daemon = True
+                self.timer.start()
+        finally:
+            self.lock.release()
+
+    def stop(self):
+        self.lock.acquire()
+        try:
+            self.stopped = True
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        finally:
+            self.lock.release()
+
+
+class SCEScanner(object):
+
+    """Class evaluates the XCCDF content by running check scripts in parallel"""
+
+    def __init__(self, content, result_file, jobs, profile=None, cache=None, history=None,
+                 module_timeout=None, scan_timeout=None, journal=None, forkserver=None):
+        """
+        :param content: path to all-xccdf.xml file with the assessment
+        :param result_file: path where the result.xml will be stored
+        :param jobs: count of check scripts running at the same time
+        :param profile: XCCDF profile, settings.profile by default
+        :param cache: IncrementalCache with results of the previous run
+        :param history: ModuleHistory with durations of modules
+        :param module_timeout: default time limit of one module in seconds
+        :param scan_timeout: time limit of the whole assessment in seconds
+        :param journal: ScanJournal where results are checkpointed
+        :param forkserver: started ForkServer which runs Python check scripts
+        """
+        self.content = content
+        self.result_file = result_file
+        self.jobs = jobs
+        self.profile = profile or settings.profile
+        self.cache = cache
+        self.history = history
+        self.module_timeout = module_timeout
+        self.scan_timeout = scan_timeout
+        self.deadline = None
+        self.journal = journal
+        self.forkserver = forkserver
+        self.resumed = 0
+        self.target_tree = xmltree.parse(content)
+        self.values = SCEHelper.get_values(self.target_tree)
+        self.rules = []
+        self.not_selected = []
+        self.not_applicable = []
+        self.unknown_platforms = set()
+        self.results = {}
+        self._load_rules()
+
+    def _get_exports(self, check):
+        exports = {}
+        for export in check.findall(XMLNS + "check-export"):
+            value, value_type = self.values.get(export.get("value-id"), ("", "string"))
+            exports['XCCDF_VALUE_' + export.get("export-name")] = value
+            exports['XCCDF_TYPE_' + export.get("export-name")] = value_type.upper()
+        return exports
+
+    def _is_applicable(self, node, system_platform):
+        """Function returns True if the node has no platform or one of its platforms matches"""
+        idrefs = [x.get("idref") for x in node.findall(XMLNS + "platform")]
+        applicable = not idrefs
+        for idref in idrefs:
+            matched = SCEHelper.is_platform_applicable(idref, system_platform)
+            if matched is None:
+                self.unknown_platforms.add(idref)
+            elif matched:
+                applicable = True
+        return applicable
+
+    def _iter_rules(self, node, applicable, system_platform):
+        """Function yields (rule, applicable) in document order, platforms of groups apply to their rules"""
+        for child in node:
+            if child.tag == XMLNS + "Group":
+                for item in self._iter_rules(child, applicable and self._is_applicable(child, system_platform),
+                                             system_platform):
+                    yield item
+            elif child.tag == XMLNS + "Rule":
+                yield child, applicable and self._is_applicable(child, system_platform)
+
+    def _load_rules(self):
+        """Function collects all selected rules with SCE check in document order"""
+        content_dir = os.path.dirname(os.path.abspath(self.content))
+        selected = SCEHelper.get_selected(self.target_tree, self.profile)
+        system_platform = SCEHelper.get_system_platform()
+        applicable = self._is_applicable(self.target_tree, system_platform)
+        for rule, is_applicable in self._iter_rules(self.target_tree, applicable, system_platform):
+            rule_id = rule.get("id")
+            is_selected = selected.get(rule_id, rule.get("selected", "true") == "true")
+            check = rule.find(XMLNS + "check")
+            if not is_selected or check is None or check.get("system") != SCE_SYSTEM:
+                self.not_selected.append(rule_id)
+                continue
+            # oscap does not execute rules for other platforms
+            if not is_applicable:
+                self.not_applicable.append(rule_id)
+                continue
+            content_ref = check.find(XMLNS + "check-content-ref")
+            title = rule.find(XMLNS + "title")
+            self.rules.append(SCERule(rule_id,
+                                      title.text.strip() if title is not None and title.text else "",
+                                      os.path.join(content_dir, content_ref.get("href")),
+                                      check,
+                                      self._get_exports(check)))
+
+    def get_rules(self):
+        """Returns list of rules which will be executed"""
+        return self.rules
+
+    def get_unknown_platforms(self):
+        """Returns sorted platforms of the content which can be evaluated by oscap only"""
+        return sorted(self.unknown_platforms)
+
+    def get_requires(self):
+        """Function returns a dictionary rule -> list of prerequisite rules"""
+        rules = dict((x.rule_id, x) for x in self.rules)
+        dependencies = XccdfHelper.get_rule_dependencies(self.target_tree, ignore_unknown=True)
+        requires = {}
+        for rule in self.rules:
+            requires[rule] = [rules[x] for x in dependencies.get(rule.rule_id, []) if x in rules]
+        return requires
+
+    def run_rule(self, rule):
+        """
+        Function runs the rule with its time limit which is shortened
+        so that the module does not exceed the end of the assessment
+        """
+        timeout = rule.get_timeout(self.module_timeout)
+        if self.deadline is not None:
+            now = datetime.datetime.now()
+            remaining = self.deadline - now
+            remaining = remaining.days * 86400 + remaining.seconds + remaining.microseconds / 1000000.0
+            if remaining <= 0:
+                return SCEResult(rule.rule_id, 'error', start_time=now, end_time=now,
+                                 message=SKIPPED_MESSAGE)
+            timeout = min(timeout or remaining, remaining)
+        if self.cache is not None:
+            return self.cache.run_watched(rule, lambda x: SCEHelper.run_rule(x, timeout, self.forkserver))
+        return SCEHelper.run_rule(rule, timeout, self.forkserver)
+
+    def run(self, function=None):
+        """
+        Function runs all selected check scripts and writes result file.
+
+        function gets the same lines as oscap prints with --progress option
+        """
+        start_time = datetime.datetime.now()
+        if self.scan_timeout:
+            self.deadline = start_time + datetime.timedelta(seconds=self.scan_timeout)
+
+        def rule_finished(rule, result, checkpoint=True):
+            self.results[rule.rule_id] = result
+            if checkpoint and self.journal is not None:
+                self.journal.add(result)
+            if function is not None:
+                function(result.get_progress_line())
+
+        for rule_id in self.not_applicable:
+            if function is not None:
+                function(SCEResult(rule_id, 'notapplicable').get_progress_line())
+        rules = self.rules
+        if self.journal is not None:
+            # rules finished before the assessment was interrupted
+            rules = []
+            for rule in self.rules:
+                result = self.journal.get_result(rule)
+                if result is None:
+                    rules.append(rule)
+                else:
+                    self.resumed += 1
+                    rule_finished(rule, result, checkpoint=False)
+        if self.cache is not None:
+            cached = rules
+            rules = []
+            for rule in cached:
+                result = self.cache.get_result(rule)
+                if result is None:
+                    rules.append(rule)
+                else:
+                    rule_finished(rule, result)
+        if self.history is not None and self.jobs > 1:
+            # the slowest modules go first so that the end of the scan is not
+            # spent waiting for one long module
+            rules = self.history.sort_longest_first(rules)
+        scheduler = ModuleScheduler(self.jobs)
+        scheduler.run(rules, self.run_rule, callback=rule_finished,
+                      requires=self.get_requires(),
+                      exclusive=set([x for x in rules if x.is_exclusive()]))
+        self.write_results(start_time, datetime.datetime.now())
+        if self.cache is not None:
+            self.cache.save(self.rules, self.results)
+        if self.history is not None:
+            self.update_history()
+        return 0
+
+    def update_history(self):
+        """Function stores durations of executed modules to the history"""
+        for rule in self.rules:
+            result = self.results.get(rule.rule_id)
+            if result is None or result.reused or result.get_wall_time() is None:
+                continue
+            self.history.add(rule.rule_id, result.get_wall_time(), result.cpu_time, result.max_rss)
+        self.history.save()
+
+    def get_resumed_count(self):
+        """Returns count of rules with results from the interrupted assessment"""
+        return self.resumed
+
+    def get_reused_count(self):
+        """Returns count of rules with results from the previous assessment"""
+        return len([x for x in six.itervalues(self.results) if x.reused])
+
+    def _get_rule_result(self, rule, result):
+        rule_result = xmltree.Element(XMLNS + "rule-result",
+                                      {'idref': rule.rule_id,
+                                       'time': get_time_stamp(result.end_time),
+                                       'weight': "1.000000"})
+        xmltree.SubElement(rule_result, XMLNS + "result").text = result.result
+        if result.message:
+            message = xmltree.SubElement(rule_result, XMLNS + "message", {'severity': 'error'})
+            message.text = result.message
+        if result.reused:
+            message = xmltree.SubElement(rule_result, XMLNS + "message", {'severity': 'info'})
+            message.text = REUSED_MESSAGE
+        check = copy.deepcopy(rule.check)
+        outputs = {'stdout': result.stdout, 'stderr': result.stderr}
+        for check_import in check.findall(XMLNS + "check-import"):
+            check_import.text = outputs.get(check_import.get("import-name"), check_import.text)
+        rule_result.append(check)
+        return rule_result
+
+    def get_test_result(self, start_time, end_time):
+        """Function returns TestResult element with results of all rules"""
+        test_result = xmltree.Element(XMLNS + "TestResult",
+                                      {'id': TEST_RESULT_ID + self.profile,
+                                       'start-time': get_time_stamp(start_time),
+                                       'end-time': get_time_stamp(end_time),
+                                       'version': "1.0"})
+        xmltree.SubElement(test_result, XMLNS + "benchmark",
+                           {'href': self.content,
+                            'id': self.target_tree.get("id", "")})
+        xmltree.SubElement(test_result, XMLNS + "title").text = "OSCAP Scan Result"
+        identity = xmltree.SubElement(test_result, XMLNS + "identity",
+                                      {'authenticated': "false",
+                                       'privileged': "false"})
+        identity.text = os.environ.get("USER", "root")
+        xmltree.SubElement(test_result, XMLNS + "profile", {'idref': self.profile})
+        xmltree.SubElement(test_result, XMLNS + "target").text = socket.gethostname()
+        for value_id in sorted(self.values):
+            set_value = xmltree.SubElement(test_result, XMLNS + "set-value", {'idref': value_id})
+            set_value.text = self.values[value_id][0]
+        passed = 0
+        for rule in self.rules:
+            result = self.results[rule.rule_id]
+            if result.result in ('pass', 'fixed'):
+                passed += 1
+            test_result.append(self._get_rule_result(rule, result))
+        for rule_id in self.not_applicable:
+            rule_result = xmltree.SubElement(test_result, XMLNS + "rule-result", {'idref': rule_id})
+            xmltree.SubElement(rule_result, XMLNS + "result").text = "notapplicable"
+        for rule_id in self.not_selected:
+            rule_result = xmltree.SubElement(test_result, XMLNS + "rule-result", {'idref': rule_id})
+            xmltree.SubElement(rule_result, XMLNS + "result").text = "notselected"
+        score = xmltree.SubElement(test_result, XMLNS + "score",
+                                   {'system': "urn:xccdf:scoring:flat",
+                                    'maximum': "%f" % len(self.rules)})
+        score.text = "%f" % passed
+        return test_result
+
+    def write_results(self, start_time, end_time):
+        """Function writes the benchmark with TestResult to result file"""
+        self.target_tree.append(self.get_test_result(start_time, end_time))
+        data = xmltree.tostring(self.target_tree, "utf-8")
+        FileHelper.write_to_file(self.result_file, 'wb', data, False)
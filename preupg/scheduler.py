@@ -0,0 +1,150 @@
+"""
+The scheduler module runs tasks, like check scripts of modules,
+in a bounded pool of worker threads with respect to their dependencies
+"""
+
+from __future__ import unicode_literals
+import sys
+import threading
+
+import six
+from six.moves import queue
+
+from preupg.logger import logger_debug
+from preupg.exception import ModuleDependencyError
+
+
+class ModuleScheduler(object):
+
+    """Class runs tasks in a bounded pool of worker threads"""
+
+    # How long the main thread waits for a finished task in one step.
+    # Blocking get() without timeout can not be interrupted by Ctrl+C
+    poll_interval = 1
+
+    def __init__(self, jobs):
+        self.jobs = max(1, int(jobs))
+        self.todo = queue.Queue()
+        self.done = queue.Queue()
+
+    def _worker(self, function):
+        """Function runs tasks from the todo queue until it gets None"""
+        while True:
+            task = self.todo.get()
+            if task is None:
+                break
+            try:
+                result = function(task)
+            except Exception:
+                self.done.put((task, None, sys.exc_info()))
+            else:
+                self.done.put((task, result, None))
+
+    def _start_workers(self, function, count):
+        workers = []
+        for dummy_index in range(count):
+            worker = threading.Thread(target=self._worker, args=(function,))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        return workers
+
+    def _stop_workers(self, workers):
+        for dummy_worker in workers:
+            self.todo.put(None)
+
+    def _get_finished(self):
+        """Function waits for the next finished task"""
+        while True:
+            try:
+                return self.done.get(True, self.poll_interval)
+            except queue.Empty:
+                continue
+
+    def _pop_ready(self, waiting, unfinished, running, requires, exclusive):
+        """
+        Function returns the first waiting task which can be started or None.
+
+        A task can be started when all its prerequisites are finished.
+        An exclusive task runs alone, nothing else is started meanwhile.
+        """
+        if len(running) >= self.jobs or [x for x in running if x in exclusive]:
+            return None
+        for index, task in enumerate(waiting):
+            if [x for x in requires.get(task, []) if x in unfinished]:
+                continue
+            if task in exclusive and running:
+                # do not let other tasks overtake the exclusive one
+                return None
+            return waiting.pop(index)
+        return None
+
+    def run(self, tasks, function, callback=None, requires=None, exclusive=None):
+        """
+        Function runs function(task) for each task and returns
+        a dictionary with results of all tasks.
+
+        At most self.jobs tasks run at the same time. callback(task, result)
+        is called from the calling thread whenever a task finishes.
+        requires is a dictionary task -> list of tasks which have to finish
+        before the task is started and exclusive is a set of tasks which
+        can not run together with any other task.
+        """
+        waiting = list(tasks)
+        requires = requires or {}
+        exclusive = exclusive or set()
+        results = {}
+        if not waiting:
+            return results
+        cycle = ModuleScheduler.find_cycle(requires)
+        if cycle:
+            raise ModuleDependencyError("Cyclic dependency between modules: %s" % ' -> '.join(cycle))
+        unfinished = set(waiting)
+        running = set()
+        workers = self._start_workers(function, min(self.jobs, len(waiting)))
+        try:
+            while waiting or running:
+                task = self._pop_ready(waiting, unfinished, running, requires, exclusive)
+                while task is not None:
+                    self.todo.put(task)
+                    running.add(task)
+                    task = self._pop_ready(waiting, unfinished, running, requires, exclusive)
+                task, result, exc_info = self._get_finished()
+                running.remove(task)
+                unfinished.remove(task)
+                if exc_info is not None:
+                    logger_debug.debug("Task '%s' raised an exception", task)
+                    six.reraise(exc_info[0], exc_info[1], exc_info[2])
+                results[task] = result
+                if callback is not None:
+                    callback(task, result)
+        finally:
+            self._stop_workers(workers)
+        return results
+
+    @staticmethod
+    def find_cycle(requires):
+        """
+        Function returns a list of tasks which form a cycle in the dependency
+        dictionary task -> list of prerequisites or None if there is no cycle
+        """
+        finished = set()
+        for start in requires:
+            if start in finished:
+                continue
+            # stack of (task, iterator over its prerequisites)
+            path = [start]
+            stack = [iter(requires.get(start, []))]
+            while stack:
+                try:
+                    task = next(stack[-1])
+                except StopIteration:
+                    finished.add(path.pop())
+                    stack.pop()
+                    continue
+                if task in path:
+                    return [str(x) for x in path[path.index(task):]] + [str(task)]
+                if task not in finished:
+                    path.append(task)
+                    stack.append(iter(requires.get(task, [])))
+        return None
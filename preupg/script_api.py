@@ -38,7 +38,8 @@ except ImportError:
     import ConfigParser as configparser
 
 from preupg import settings
-from preupg.utils import FileHelper, ProcessHelper
+from preupg.utils import FileHelper
+from preupg.pkgindex import PackageIndex
 
 __all__ = (
     'log_debug',
@@ -170,110 +171,134 @@ VALUE_EXECUTABLES = os.path.join(PREUPGRADE_CACHE, "executable.log")
 VALUE_RPM_RHSIGNED = os.path.join(PREUPGRADE_CACHE, "rpm_rhsigned.log")
 
 #
-# Variable which referes to temporary directory directory provided by module
+# File in PREUPGRADE_CACHE with the list of dist native packages,
+# see get_dist_native_list
 #
-VALUE_TMP_PREUPGRADE = os.environ['XCCDF_VALUE_TMP_PREUPGRADE']
-
-#
-# Variable which referes to current directory directory provided by module
-#
-VALUE_CURRENT_DIRECTORY = os.environ['XCCDF_VALUE_CURRENT_DIRECTORY']
-
-#
-# Variable which referes to solution file provided by module
-#
-SOLUTION_FILE = os.environ['XCCDF_VALUE_SOLUTION_FILE']
-
-#
-# Variable which referes to current upgrade path directory
-#
-VALUE_REPORT_DIR = os.environ['XCCDF_VALUE_REPORT_DIR']
-
-#
-# Name of module being currently executed
-#
-try:
-    MODULE_PATH = os.environ['XCCDF_VALUE_MODULE_PATH']
-except KeyError:
-    MODULE_PATH = VALUE_CURRENT_DIRECTORY.replace(VALUE_REPORT_DIR, '')
-    MODULE_PATH = MODULE_PATH.replace('/', '_')
+DIST_NATIVE_LIST = "dist_native.log"
 
 
-#
-# MIGRATE means if preupg binary was used with `--mode migrate` parameter
-# UPGRADE means if preupg binary was used with `--mode upgrade` parameter
-# These modes are used if `--mode` is not used
-#
-try:
-    MIGRATE = os.environ['XCCDF_VALUE_MIGRATE']
-    UPGRADE = os.environ['XCCDF_VALUE_UPGRADE']
-except KeyError:
-    MIGRATE = 1
-    UPGRADE = 1
-
-#
-# Variable which indicates DEVEL mode.
-#
-try:
-    DEVEL_MODE = os.environ['XCCDF_VALUE_DEVEL_MODE']
-except KeyError:
-    DEVEL_MODE = 0
-
-#
-# Override mode for is_dist_native() and similar
-#
-# Affects which packages are considered native:
-#
-# If set to 'sign' (default), GPG signature is consulted.  If 'all',
-# all packages are native.  If set to path to a file, packages listed
-# there are native.
-#
-try:
-    DIST_NATIVE = os.environ['XCCDF_VALUE_DIST_NATIVE']
-except KeyError:
-    DIST_NATIVE = 'sign'
+def load_environment():
+    """
+    Function sets variables provided by preupg in environment of the check
+    script and loads configuration of preupgrade-assistant.
 
-#
-# postupgrade directory used by in-place upgrades.
-#
-# Scripts mentioned there are executed automatically by redhat-upgrade-tool
-#
-POSTUPGRADE_DIR = os.path.join(VALUE_TMP_PREUPGRADE, "postupgrade.d")
+    The fork server imports the module before the environment is known
+    and calls the function in the forked process.
+    """
+    global VALUE_TMP_PREUPGRADE, VALUE_CURRENT_DIRECTORY, SOLUTION_FILE, VALUE_REPORT_DIR
+    global MODULE_PATH, MIGRATE, UPGRADE, DEVEL_MODE, DIST_NATIVE, POSTUPGRADE_DIR, KICKSTART_DIR
+    global KICKSTART_README, KICKSTART_SCRIPTS, KICKSTART_POSTUPGRADE, COMMON_DIR, SPECIAL_PKG_LIST
+    global NOAUTO_POSTUPGRADE_D
+    #
+    # Variable which referes to temporary directory directory provided by module
+    #
+    VALUE_TMP_PREUPGRADE = os.environ['XCCDF_VALUE_TMP_PREUPGRADE']
 
-#
-# Directory which is used for kickstart generation
-#
-KICKSTART_DIR = os.path.join(VALUE_TMP_PREUPGRADE, "kickstart")
+    #
+    # Variable which referes to current directory directory provided by module
+    #
+    VALUE_CURRENT_DIRECTORY = os.environ['XCCDF_VALUE_CURRENT_DIRECTORY']
 
-#
-# README file which contains description about all files in kickstart directory
-#
-KICKSTART_README = os.path.join(KICKSTART_DIR, "README")
+    #
+    # Variable which referes to solution file provided by module
+    #
+    SOLUTION_FILE = os.environ['XCCDF_VALUE_SOLUTION_FILE']
 
-#
-# Directory with scripts which can be executed after installation by administrator
-#
-KICKSTART_SCRIPTS = os.path.join(KICKSTART_DIR, "scripts")
+    #
+    # Variable which referes to current upgrade path directory
+    #
+    VALUE_REPORT_DIR = os.environ['XCCDF_VALUE_REPORT_DIR']
 
-#
-# The same as $KICKSTART_SCRIPTS
-#
-KICKSTART_POSTUPGRADE = KICKSTART_SCRIPTS
+    #
+    # Name of module being currently executed
+    #
+    try:
+        MODULE_PATH = os.environ['XCCDF_VALUE_MODULE_PATH']
+    except KeyError:
+        MODULE_PATH = VALUE_CURRENT_DIRECTORY.replace(VALUE_REPORT_DIR, '')
+        MODULE_PATH = MODULE_PATH.replace('/', '_')
 
-#
-# Variable which refers to static data used by preupgrade-assistant and modules
-#
-COMMON_DIR = os.path.join(os.environ['XCCDF_VALUE_REPORT_DIR'], "common")
 
-#
-# Variable which contains file with packages add to the kickstart anyway
-#
-SPECIAL_PKG_LIST = os.path.join(KICKSTART_DIR, 'special_pkg_list')
+    #
+    # MIGRATE means if preupg binary was used with `--mode migrate` parameter
+    # UPGRADE means if preupg binary was used with `--mode upgrade` parameter
+    # These modes are used if `--mode` is not used
+    #
+    try:
+        MIGRATE = os.environ['XCCDF_VALUE_MIGRATE']
+        UPGRADE = os.environ['XCCDF_VALUE_UPGRADE']
+    except KeyError:
+        MIGRATE = 1
+        UPGRADE = 1
+
+    #
+    # Variable which indicates DEVEL mode.
+    #
+    try:
+        DEVEL_MODE = os.environ['XCCDF_VALUE_DEVEL_MODE']
+    except KeyError:
+        DEVEL_MODE = 0
+
+    #
+    # Override mode for is_dist_native() and similar
+    #
+    # Affects which packages are considered native:
+    #
+    # If set to 'sign' (default), GPG signature is consulted.  If 'all',
+    # all packages are native.  If set to path to a file, packages listed
+    # there are native.  The package name is the first field of a line.
+    #
+    try:
+        DIST_NATIVE = os.environ['XCCDF_VALUE_DIST_NATIVE']
+    except KeyError:
+        DIST_NATIVE = 'sign'
+
+    #
+    # postupgrade directory used by in-place upgrades.
+    #
+    # Scripts mentioned there are executed automatically by redhat-upgrade-tool
+    #
+    POSTUPGRADE_DIR = os.path.join(VALUE_TMP_PREUPGRADE, "postupgrade.d")
+
+    #
+    # Directory which is used for kickstart generation
+    #
+    KICKSTART_DIR = os.path.join(VALUE_TMP_PREUPGRADE, "kickstart")
+
+    #
+    # README file which contains description about all files in kickstart directory
+    #
+    KICKSTART_README = os.path.join(KICKSTART_DIR, "README")
+
+    #
+    # Directory with scripts which can be executed after installation by administrator
+    #
+    KICKSTART_SCRIPTS = os.path.join(KICKSTART_DIR, "scripts")
+
+    #
+    # The same as $KICKSTART_SCRIPTS
+    #
+    KICKSTART_POSTUPGRADE = KICKSTART_SCRIPTS
+
+    #
+    # Variable which refers to static data used by preupgrade-assistant and modules
+    #
+    COMMON_DIR = os.path.join(os.environ['XCCDF_VALUE_REPORT_DIR'], "common")
+
+    #
+    # Variable which contains file with packages add to the kickstart anyway
+    #
+    SPECIAL_PKG_LIST = os.path.join(KICKSTART_DIR, 'special_pkg_list')
+
+    #
+    # Postupgrade directory which is not executed automatically after an upgrade or migration
+    #
+    NOAUTO_POSTUPGRADE_D = os.path.join(VALUE_TMP_PREUPGRADE, 'noauto_postupgrade.d')
+
+    load_pa_configuration()
+    shorten_envs()
+    os.chdir(VALUE_CURRENT_DIRECTORY)
 
-#
-# Postupgrade directory which is not executed automatically after an upgrade or migration
-#
-NOAUTO_POSTUPGRADE_D = os.path.join(VALUE_TMP_PREUPGRADE, 'noauto_postupgrade.d')
 
 #
 # variables set by PA config file #
@@ -490,6 +515,24 @@ def switch_to_content():
     os.chdir(os.environ['CURRENT_DIRECTORY'])
 
 
+# opened package indexes, log file -> PackageIndex
+_PACKAGE_INDEXES = {}
+
+
+def _is_pkg_in_log(pkg_name, log_file):
+    """
+    Function checks if package is listed in the log file, e.g. VALUE_RPM_QA.
+    The index made by preupg is used when it is up to date.
+    """
+    if log_file not in _PACKAGE_INDEXES:
+        index = PackageIndex(log_file)
+        if not index.is_valid():
+            lines = FileHelper.get_file_content(log_file, "rb", True)
+            return bool([x for x in lines if x.split() and x.split()[0] == pkg_name])
+        _PACKAGE_INDEXES[log_file] = index
+    return _PACKAGE_INDEXES[log_file].contains(pkg_name)
+
+
 def is_pkg_installed(pkg_name):
     """
     Function checks if package is installed.
@@ -498,12 +541,7 @@ def is_pkg_installed(pkg_name):
     :return: 0 - package is installed
              1 - package is NOT installed
     """
-    lines = FileHelper.get_file_content(VALUE_RPM_QA, "rb", True)
-    found = [x for x in lines if x.split()[0] == pkg_name]
-    if found:
-        return True
-    else:
-        return False
+    return _is_pkg_in_log(pkg_name, VALUE_RPM_QA)
 
 
 def check_applies_to(check_applies=""):
@@ -526,6 +564,28 @@ def check_applies_to(check_applies=""):
     return not_applicable
 
 
+# resolved executables, name -> full path or None
+_EXECUTABLES = {}
+
+
+def _find_executable(binary):
+    """
+    Function returns full path of the executable like 'which' does
+    or None if it does not exist
+    """
+    if binary not in _EXECUTABLES:
+        if "/" in binary:
+            candidates = [binary]
+        else:
+            candidates = [os.path.join(x, binary) for x in os.environ.get("PATH", os.defpath).split(os.pathsep)]
+        _EXECUTABLES[binary] = None
+        for candidate in candidates:
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                _EXECUTABLES[binary] = candidate
+                break
+    return _EXECUTABLES[binary]
+
+
 def check_rpm_to(check_rpm="", check_bin=""):
     """
     Function checks if relevant package is installed and if relevant binary exists on the system.
@@ -540,19 +600,15 @@ def check_rpm_to(check_rpm="", check_bin=""):
 
     if check_rpm != "":
         rpms = check_rpm.split(',')
-        lines = FileHelper.get_file_content(VALUE_RPM_QA, "rb", True)
         for rpm in rpms:
-            lst = [x for x in lines if rpm == x.split('\t')[0]]
-            if not lst:
+            if not _is_pkg_in_log(rpm, VALUE_RPM_QA):
                 log_high_risk("Package %s is not installed." % rpm)
                 not_applicable = 1
 
     if check_bin != "":
         binaries = check_bin.split(',')
-        lines = FileHelper.get_file_content(VALUE_EXECUTABLES, "rb", True)
         for binary in binaries:
-            cmd = "which %s" % binary
-            if ProcessHelper.run_subprocess(cmd, print_output=False, shell=True) != 0:
+            if _find_executable(binary) is None:
                 log_high_risk("Binary %s is not installed." % binary)
                 not_applicable = 1
 
@@ -591,6 +647,37 @@ def service_is_enabled(service_name):
     return return_value
 
 
+# parsed VALUE_CONFIGCHANGED, log file -> (changed files, their parent directories)
+_CHANGED_CONFIGS = {}
+
+
+def _get_changed_configs():
+    """
+    Function returns a set of changed config files from VALUE_CONFIGCHANGED
+    and a set of all directories which contain some of them
+    """
+    if VALUE_CONFIGCHANGED not in _CHANGED_CONFIGS:
+        files = set()
+        dirs = set()
+        try:
+            lines = FileHelper.get_file_content(VALUE_CONFIGCHANGED, "rb", True)
+        except IOError:
+            lines = []
+        for line in lines:
+            # S.5....T.  c /etc/file
+            start = line.find(" /")
+            if start == -1:
+                continue
+            path = line[start + 1:].rstrip("\n")
+            files.add(path)
+            path = os.path.dirname(path)
+            while path not in dirs and path != "/":
+                dirs.add(path)
+                path = os.path.dirname(path)
+        _CHANGED_CONFIGS[VALUE_CONFIGCHANGED] = (files, dirs)
+    return _CHANGED_CONFIGS[VALUE_CONFIGCHANGED]
+
+
 def config_file_changed(config_file_name):
     """
     Searches cached data in VALUE_CONFIGCHANGED
@@ -599,16 +686,18 @@ def config_file_changed(config_file_name):
     True if given config file has been changed
     False if given config file hasn't been changed
     """
-    config_changed = False
-    try:
-        lines = FileHelper.get_file_content(VALUE_CONFIGCHANGED, "rb", True)
-        for line in lines:
-            if line.find(config_file_name) != -1:
-                config_changed = True
-                break
-    except:
-        pass
-    return config_changed
+    return os.path.normpath(config_file_name) in _get_changed_configs()[0]
+
+
+def config_dir_changed(dir_name):
+    """
+    Searches cached data in VALUE_CONFIGCHANGED
+
+    returns:
+    True if any config file in the directory or its subdirectories has been changed
+    False otherwise
+    """
+    return os.path.normpath(dir_name) in _get_changed_configs()[1]
 
 
 def backup_config_file(config_file_name):
@@ -649,14 +738,11 @@ def is_dist_native(pkg):
     DIST_NATIVE = path_to_file: return True if package is in file else return False
     """
 
-    rpm_qa = FileHelper.get_file_content(VALUE_RPM_QA, "rb", True)
-    found = [x for x in rpm_qa if x.split()[0] == pkg]
-    if not found:
+    if not _is_pkg_in_log(pkg, VALUE_RPM_QA):
         log_warning("Package %s is not installed on Red Hat Enterprise Linux system.")
         return False
 
-    rpm_signed = FileHelper.get_file_content(VALUE_RPM_RHSIGNED, "rb", True)
-    found = [x for x in rpm_signed if x.split()[0] == pkg]
+    found = _is_pkg_in_log(pkg, VALUE_RPM_RHSIGNED)
 
     if int(DEVEL_MODE) == 0:
         if found:
@@ -672,23 +758,88 @@ def is_dist_native(pkg):
             else:
                 return False
         if os.path.exists(DIST_NATIVE):
-            list_native = FileHelper.get_file_content(DIST_NATIVE, "r", method=True)
-            if pkg in list_native:
-                return True
+            return _is_pkg_in_log(pkg, DIST_NATIVE)
         return False
 
 
+def _get_pkg_names(log_file):
+    """Returns names of packages listed in the log file, see _is_pkg_in_log()"""
+    lines = FileHelper.get_file_content(log_file, "rb", True)
+    return [x.split()[0] for x in lines if x.split()]
+
+
+def _get_dist_native_inputs():
+    """Returns files which decide which packages are dist native"""
+    inputs = [VALUE_RPM_QA]
+    if int(DEVEL_MODE) == 0 or DIST_NATIVE == "sign":
+        inputs.append(VALUE_RPM_RHSIGNED)
+    elif DIST_NATIVE != "all":
+        inputs.append(DIST_NATIVE)
+    return inputs
+
+
+def _get_dist_native_header():
+    """Returns the header of the stored list, it describes the settings and inputs"""
+    sizes = []
+    for input_file in _get_dist_native_inputs():
+        try:
+            sizes.append(str(os.stat(input_file).st_size))
+        except OSError:
+            sizes.append("-")
+    return "# DEVEL_MODE=%s DIST_NATIVE=%s RPM_QA=%s SIZES=%s\n" % (DEVEL_MODE, DIST_NATIVE,
+                                                                   VALUE_RPM_QA, ",".join(sizes))
+
+
+def _read_dist_native_list(header):
+    """Returns the stored list of dist native packages or None if it is not up to date"""
+    cache = os.path.join(PREUPGRADE_CACHE, DIST_NATIVE_LIST)
+    try:
+        cache_mtime = os.stat(cache).st_mtime
+        for input_file in _get_dist_native_inputs():
+            if os.stat(input_file).st_mtime > cache_mtime:
+                return None
+        lines = FileHelper.get_file_content(cache, "rb", True)
+    except (IOError, OSError):
+        return None
+    if not lines or lines[0] != header:
+        return None
+    return [x.strip() for x in lines[1:] if x.strip()]
+
+
 def get_dist_native_list():
     """
     return list of all dist native packages according to is_dist_native()
+
+    The list is stored to PREUPGRADE_CACHE, so that other modules
+    get it without reading of the logs again. The header of the list
+    contains sizes of the inputs, a change within the same second as
+    the list was stored is noticed as well.
     """
+    header = _get_dist_native_header()
+    native_pkgs = _read_dist_native_list(header)
+    if native_pkgs is not None:
+        return native_pkgs
+
+    pkgs = _get_pkg_names(VALUE_RPM_QA)
+    if int(DEVEL_MODE) != 0 and DIST_NATIVE == "all":
+        native_pkgs = pkgs
+    else:
+        if int(DEVEL_MODE) == 0 or DIST_NATIVE == "sign":
+            native = set(_get_pkg_names(VALUE_RPM_RHSIGNED))
+        elif os.path.exists(DIST_NATIVE):
+            native = set(_get_pkg_names(DIST_NATIVE))
+        else:
+            native = set()
+        native_pkgs = [x for x in pkgs if x in native]
 
-    native_pkgs = []
-    tmp = FileHelper.get_file_content(VALUE_RPM_QA, "rb", True)
-    pkgs = [i.split("\t")[0] for i in tmp]
-    for pkg in pkgs:
-        if is_dist_native(pkg) is True:
-            native_pkgs.append(pkg)
+    cache = os.path.join(PREUPGRADE_CACHE, DIST_NATIVE_LIST)
+    try:
+        # other modules can be reading the list at the same time
+        FileHelper.write_to_file(cache + ".%d" % os.getpid(), "wb",
+                                 header + "".join([x + "\n" for x in native_pkgs]))
+        os.rename(cache + ".%d" % os.getpid(), cache)
+    except (IOError, OSError):
+        pass
     return native_pkgs
 
 
@@ -824,8 +975,6 @@ def deploy_hook(*args):
         log_error("Unknown hook option '%s'" % deploy_name)
         exit_error()
 
-load_pa_configuration()
-
-shorten_envs()
-
-os.chdir(VALUE_CURRENT_DIRECTORY)
+# the fork server calls load_environment() in the forked process
+if not os.environ.get(settings.forkserver_env):
+    load_environment()
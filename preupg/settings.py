@@ -28,6 +28,8 @@ tarball_name = tarball_prefix + tarball_base + "-{0}"
 
 xml_result_name = result_prefix + '.xml'
 html_result_name = result_prefix + '.html'
+# risks of the result XML file, e.g. result-risks.json
+risk_summary_suffix = '-risks.json'
 
 xsl_sheet = "xccdf-report.xsl"
 
@@ -44,6 +46,24 @@ lock_file = "/var/run/preupgrade.pid"
 cache_dir = "/var/cache/preupgrade"
 log_dir = "/var/log/preupgrade"
 
+# file with rule results of the previous assessment used by --incremental
+incremental_cache = os.path.join(cache_dir, "incremental.json")
+
+# file with durations and resource usage of modules from previous runs
+module_history = os.path.join(cache_dir, "module_history.json")
+
+# RPM database; its state is a part of fingerprints of the rules
+rpmdb_packages = "/var/lib/rpm/Packages"
+
+# journal with results of finished rules in the assessment directory,
+# it is used by --resume after an interrupted assessment
+scan_journal = "scan-journal.json"
+
+# default time limits in seconds for one module and for the whole
+# assessment, 0 means no limit; see preupgrade-assistant.conf
+module_timeout = 0
+scan_timeout = 0
+
 # preupg log file
 preupg_log = os.path.join(log_dir, "preupg.log")
 
@@ -73,9 +93,37 @@ common_name = "common"
 
 # path to file with definitions of common scripts
 common_scripts = os.path.join(data_dir, "preassessment", "scripts.txt")
+# count of common logs gathered at the same time if --jobs is not used
+common_jobs = 4
+# file in cache_dir with fingerprints of inputs of common logs,
+# logs with unchanged inputs are not gathered again
+common_cache = "common_fingerprints.json"
+# common logs with package names in the first column which are indexed
+# for script_api, the index is the log with package_index_suffix
+package_logs = ["rpm_qa.log", "rpm_rhsigned.log"]
+package_index_suffix = ".idx"
+# variable in environment of the fork server, script_api preloaded there
+# reads environment of a check script in the forked process
+forkserver_env = "PREUPG_FORKSERVER"
+# count of threads which verify installed packages instead of 'rpm -Va'
+rpm_verify_jobs = 8
+# count of HTML reports generated at the same time
+report_jobs = 4
+# file in cache_dir with digests of files from the last verification,
+# only files touched since then are read again
+rpm_verify_index = "rpm_verify_index.json"
+
+# size of chunks in which output of commands is read
+subprocess_chunk = 65536
+# count of the last lines of command output kept for error messages
+subprocess_tail = 20
 
 # Addons dir for 3rdparty contents
 add_ons = "3rdparty"
+# directory in assessment_results_dir with outputs of modules of 3rdparty
+# contents, e.g. .3rdparty/vendor/kickstart. The contents are scanned together
+# with the main one and their outputs are merged when they finish
+add_ons_output_dir = ".3rdparty"
 
 # Default content file
 content_file = "all-xccdf.xml"
@@ -9,7 +9,7 @@ import logging
 
 import re
 
-from xml.etree import ElementTree
+from preupg import xmltree
 
 logger = logging.getLogger('preup_ui')
 
@@ -48,7 +48,7 @@ def stringify_children(node):
     for c in node:
         # 'method' argument is not present on python-2.6:
         #   method="html"
-        child_str = ElementTree.tostring(c, encoding="UTF-8")
+        child_str = xmltree.tostring(c, encoding="UTF-8")
 
         child_str = xml_to_html(child_str)
 
@@ -241,7 +241,7 @@ class ReportParser(object):
         """ parse info about each test result """
         # element.iter is not on python-2.6
         #for result in root.iter(self.element_prefix + 'rule-result'):
-        for result in root.findall('.//' + self.element_prefix + 'rule-result'):
+        for result in xmltree.findall(root, './/' + self.element_prefix + 'rule-result'):
             result_state = self.get_nodes_text(result, 'result')
             idref = result.attrib['idref']
             if result_state in ['error', 'notchecked']:
@@ -278,7 +278,7 @@ class ReportParser(object):
 
     def parse_report(self):
         """ parse XML report """
-        root = ElementTree.parse(self.path).getroot()
+        root = xmltree.parse(self.path)
         # rules & groups first
         self.parse_groups(root)
         self.parse_rule_results(root)
@@ -5,7 +5,7 @@ import unittest
 import tempfile
 import preup
 
-from xml.etree import ElementTree
+from preupg import xmltree
 from preupg.application import Application
 from preupg.conf import DummyConf, Conf
 from report.processing import xml_to_html, stringify_children, parse_report
@@ -40,19 +40,19 @@ Another link <a href="__INSERT_URL__?path=kickstart/noverifycfg/" target="_blank
         self.assertEqual(got_b, expected_b)
 
     def test_stringify_children(self):
-        node = ElementTree.fromstring("""<content xmlns:html="http://www.w3.org/1999/xhtml"> \
+        node = xmltree.fromstring("""<content xmlns:html="http://www.w3.org/1999/xhtml"> \
 Text outside tag <html:div>Text <html:em>inside</html:em> tag</html:div> x <b>y</b> z asd\
 </content>""")
         r = stringify_children(node).strip()
         expected_r = 'Text outside tag <div>Text <em>inside</em> tag</div> x <b>y</b> z asd'
         self.assertEqual(r, expected_r)
 
-        node2 = ElementTree.fromstring("""<x xmlns:html="http://www.w3.org/1999/xhtml"> \
+        node2 = xmltree.fromstring("""<x xmlns:html="http://www.w3.org/1999/xhtml"> \
 <html:y>a</html:y></x>""")
         r2 = stringify_children(node2).strip()
         self.assertEqual(r2, '<y>a</y>')
 
-        node3 = ElementTree.fromstring("""<x xmlns:html="http://www.w3.org/1999/xhtml"> a \
+        node3 = xmltree.fromstring("""<x xmlns:html="http://www.w3.org/1999/xhtml"> a \
 <html:y>t<html:y2>a</html:y2>y</html:y>y</x>""")
         r3 = stringify_children(node3).strip()
         self.assertEqual(r3, 'a <y>t<y2>a</y2>y</y>y')
@@ -5,14 +5,16 @@ import datetime
 import re
 import subprocess
 import fnmatch
+import filecmp
 import os
 import sys
 import shutil
 import mimetypes
 import platform
-import random
-import string
 import codecs
+import signal
+import threading
+import collections
 
 try:
     import configparser
@@ -20,6 +22,7 @@ except ImportError:
     import ConfigParser as configparser
 
 from preupg import settings
+from preupg import xmltree
 from preupg.logger import log_message, logging, logger, logger_debug
 
 from os import path, access, W_OK, R_OK, X_OK
@@ -337,6 +340,36 @@ class DirHelper(object):
                 if fnmatch.fnmatch(f, pattern):
                     os.unlink(os.path.join(root, f))
 
+    @staticmethod
+    def merge_dir(source_dir, target_dir):
+        """
+        Function moves files from source_dir to target_dir and removes source_dir.
+        A file which is already in target_dir is kept if it has the same
+        content, otherwise the source file is appended to it, like lines
+        added to kickstart/special_pkg_list by modules of more contents.
+        """
+        for root, dirs, files in os.walk(source_dir):
+            target_root = os.path.join(target_dir, os.path.relpath(root, source_dir))
+            DirHelper.check_or_create_temp_dir(target_root)
+            for name in files + [x for x in dirs if os.path.islink(os.path.join(root, x))]:
+                source = os.path.join(root, name)
+                target = os.path.join(target_root, name)
+                if not os.path.lexists(target):
+                    shutil.move(source, target)
+                elif os.path.islink(source) or os.path.islink(target):
+                    continue
+                elif not filecmp.cmp(source, target, shallow=False):
+                    f_source = open(source, "rb")
+                    try:
+                        f_target = open(target, "ab")
+                        try:
+                            shutil.copyfileobj(f_source, f_target)
+                        finally:
+                            f_target.close()
+                    finally:
+                        f_source.close()
+        shutil.rmtree(source_dir)
+
     @staticmethod
     def get_upgrade_dir_path(dirname):
         """
@@ -349,44 +382,211 @@ class DirHelper(object):
         is_dir = lambda x: os.path.isdir(os.path.join(dirname, x))
         dirs = os.listdir(dirname)
         for d in filter(is_dir, dirs):
+            # e.g. outputs of 3rdparty contents, settings.add_ons_output_dir
+            if d.startswith('.'):
+                continue
             upgrade_path = [x for x in settings.preupgrade_dirs if d in x]
             if not upgrade_path:
                 return d
         return None
 
 
+class OutputTail(object):
+
+    """Class keeps the last lines of output of a command"""
+
+    def __init__(self, count=None):
+        self.lines = collections.deque(maxlen=count or settings.subprocess_tail)
+        # the last line without new line character
+        self.partial = b''
+
+    def add(self, data):
+        """Function adds raw output, it does not have to end with a new line"""
+        lines = (self.partial + data).split(b'\n')
+        # a line can not make the buffer unbounded
+        self.partial = lines.pop()[-settings.subprocess_chunk:]
+        self.lines.extend(lines)
+
+    def get_lines(self):
+        """Returns the last lines as unicode strings"""
+        lines = list(self.lines)
+        if self.partial:
+            lines.append(self.partial)
+        return [x.decode(settings.defenc, 'replace') for x in lines]
+
+
 class ProcessHelper(object):
 
+    # commands running in their own process group do not get Ctrl+C
+    # from the terminal, it is forwarded to them, see forward_interrupt
+    process_groups = set()
+    process_groups_lock = threading.Lock()
+
     @staticmethod
-    def run_subprocess(cmd, output=None, print_output=False, shell=False, function=None):
-        """wrapper for Popen"""
-        sp = subprocess.Popen(cmd,
-                              stdout=subprocess.PIPE,
-                              stderr=subprocess.STDOUT,
-                              shell=shell,
-                              bufsize=1)
-        stdout = six.binary_type() # FIXME should't be this bytes()?
-        for stdout_data in iter(sp.stdout.readline, b''):
-            # communicate() method buffers everything in memory, we will read stdout directly
-            stdout += stdout_data
-            if function is None:
-                if print_output:
-                    print (stdout_data, end="")
-                else:
-                    pass
-            else:
-                # I don't know what functions can come here, however
-                # it's not common so put only unicode data here again.
-                # Should be always raw data so we don't need test stdout_data
-                # on type
-                function(stdout_data.decode(settings.defenc))
-        sp.communicate()
+    def add_process_group(pgid):
+        """Function registers the process group, Ctrl+C is forwarded to it"""
+        ProcessHelper.process_groups_lock.acquire()
+        try:
+            ProcessHelper.process_groups.add(pgid)
+        finally:
+            ProcessHelper.process_groups_lock.release()
+
+    @staticmethod
+    def remove_process_group(pgid):
+        ProcessHelper.process_groups_lock.acquire()
+        try:
+            ProcessHelper.process_groups.discard(pgid)
+        finally:
+            ProcessHelper.process_groups_lock.release()
+
+    @staticmethod
+    def signal_process_groups(signum):
+        """Function sends the signal to all registered process groups"""
+        ProcessHelper.process_groups_lock.acquire()
+        try:
+            pgids = list(ProcessHelper.process_groups)
+        finally:
+            ProcessHelper.process_groups_lock.release()
+        for pgid in pgids:
+            try:
+                os.killpg(pgid, signum)
+            except OSError:
+                pass
+
+    @staticmethod
+    def forward_interrupt():
+        """
+        Function installs SIGINT handler which sends the signal to registered
+        process groups before KeyboardInterrupt is raised. It returns the previous
+        handler or None if the handler can not be installed, e.g. outside the main thread.
+        """
+        previous = signal.getsignal(signal.SIGINT)
+        if not callable(previous):
+            # SIGINT is ignored or handled by the system
+            return None
 
+        def handler(signum, frame):
+            ProcessHelper.signal_process_groups(signum)
+            previous(signum, frame)
+        try:
+            signal.signal(signal.SIGINT, handler)
+        except ValueError:
+            return None
+        return previous
+
+    @staticmethod
+    def run_subprocess(cmd, output=None, print_output=False, shell=False, function=None,
+                       timeout=None, watchdog=None, tail=None):
+        """
+        wrapper for Popen
+
+        Output of the command is not kept in memory, it is written to the
+        output file as it comes. function gets the output line by line,
+        otherwise it is read in chunks of any size. tail is OutputTail
+        which gets the last lines of the output, e.g. for error messages.
+
+        If timeout in seconds is set, the command runs in its own process
+        group and the whole group is killed when the time limit is reached.
+        watchdog.start(pid) is called when the command is started,
+        watchdog.reset(output) whenever it prints something and watchdog.stop()
+        when it finishes.
+        """
+        output_file = None
         if output is not None:
-            # raw data, so without encoding
-            FileHelper.write_to_file(output, "wb", stdout, False)
+            output_file = open(output, "wb")
+        try:
+            sp = subprocess.Popen(cmd,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT,
+                                  shell=shell,
+                                  bufsize=-1 if function is None else 1,
+                                  preexec_fn=os.setpgrp if timeout else None)
+        except OSError:
+            if output_file is not None:
+                output_file.close()
+            raise
+        timer = None
+        if timeout:
+            ProcessHelper.add_process_group(sp.pid)
+            timer = threading.Timer(timeout, ProcessHelper.kill_process_group, (sp.pid, timeout))
+            timer.daemon = True
+            timer.start()
+        if watchdog is not None:
+            watchdog.start(sp.pid)
+        if function is None:
+            # raw data as they come, the command does not have to print lines
+            stdout_fd = sp.stdout.fileno()
+            chunks = iter(lambda: os.read(stdout_fd, settings.subprocess_chunk), b'')
+        else:
+            chunks = iter(sp.stdout.readline, b'')
+        try:
+            for stdout_data in chunks:
+                if output_file is not None:
+                    # raw data, so without encoding
+                    output_file.write(stdout_data)
+                if tail is not None:
+                    tail.add(stdout_data)
+                if watchdog is not None:
+                    watchdog.reset(stdout_data)
+                if function is None:
+                    if print_output:
+                        print (stdout_data.decode(settings.defenc, 'replace'), end="")
+                else:
+                    # I don't know what functions can come here, however
+                    # it's not common so put only unicode data here again.
+                    # Should be always raw data so we don't need test stdout_data
+                    # on type
+                    function(stdout_data.decode(settings.defenc))
+            sp.communicate()
+        finally:
+            if timer is not None:
+                timer.cancel()
+                ProcessHelper.remove_process_group(sp.pid)
+            if watchdog is not None:
+                watchdog.stop()
+            if output_file is not None:
+                output_file.close()
         return sp.returncode
 
+    @staticmethod
+    def kill_process_group(pgid, timeout=None):
+        """Function kills all processes in the process group"""
+        if timeout is not None:
+            log_message("The time limit %d seconds was reached, the process is killed." % timeout,
+                        level=logging.WARNING)
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except OSError as exc:
+            logger_debug.debug("Process group %d can not be killed: %s", pgid, exc.strerror)
+
+    @staticmethod
+    def get_descendants(pid, min_depth=1):
+        """
+        Function returns PIDs of all descendants of the process.
+        Children have depth 1, grandchildren 2 and so on.
+        """
+        children = {}
+        for name in os.listdir('/proc'):
+            if not name.isdigit():
+                continue
+            try:
+                stat = FileHelper.get_file_content(os.path.join('/proc', name, 'stat'), 'rb')
+            except (IOError, OSError, ValueError):
+                # the process has already finished
+                continue
+            # the command name can contain spaces, state and PPID follow it
+            ppid = int(stat[stat.rfind(')') + 2:].split()[1])
+            children.setdefault(ppid, []).append(int(name))
+        descendants = []
+        level = [pid]
+        depth = 0
+        while level:
+            depth += 1
+            level = [child for parent in level for child in children.get(parent, [])]
+            if depth >= min_depth:
+                descendants.extend(level)
+        return descendants
+
 
 class PreupgHelper(object):
     @staticmethod
@@ -497,13 +697,15 @@ class TarballHelper(object):
         return os.path.join(root_dir, filename)
 
     @staticmethod
-    def tarball_result_dir(result_file, dirname, quiet, direction=True):
+    def tarball_result_dir(result_file, dirname, quiet, direction=True, third_parties=None):
         """
         pack results to tarball
 
         direction is used as a flag for packing or extracting
         For packing True
         For unpacking False
+        third_parties are names of 3rdparty contents, their results
+        have the prefix like vendor_result.xml
         """
         current_dir = os.getcwd()
         tar_binary = "/bin/tar"
@@ -527,9 +729,11 @@ class TarballHelper(object):
                                 os.path.join(bkp_tar_dir, preupg_dir),
                                 symlinks=True)
             files_to_copy = [settings.PREUPG_README]
+            prefixes = tuple(["result"] + [OpenSCAPHelper.get_third_party_name(x) + "result"
+                                           for x in third_parties or []])
             for root, subdirs, files in os.walk(dirname):
                 for f in files:
-                    if f.startswith("result"):
+                    if f.startswith(prefixes):
                         files_to_copy.append(f)
             for f in files_to_copy:
                 shutil.copyfile(os.path.join(dirname, f),
@@ -543,7 +747,9 @@ class TarballHelper(object):
             cmd.append(result_file)
 
         cmd.extend(tar_options)
-        ProcessHelper.run_subprocess(cmd, print_output=quiet)
+        tail = OutputTail()
+        if ProcessHelper.run_subprocess(cmd, print_output=quiet, tail=tail) != 0:
+            logger_debug.debug("Command '%s' failed:\n%s", ' '.join(cmd), '\n'.join(tail.get_lines()))
         shutil.rmtree(bkp_tar_dir)
         if direction:
             try:
@@ -698,7 +904,9 @@ class PostupgradeHelper(object):
                 continue
             log_message('Executing script %s' % scr)
             cmd = "{0} {1}".format(interpreter, scr)
-            ProcessHelper.run_subprocess(cmd, print_output=False, shell=True)
+            tail = OutputTail()
+            if ProcessHelper.run_subprocess(cmd, print_output=False, shell=True, tail=tail) != 0:
+                logger_debug.debug("Script %s failed:\n%s", scr, '\n'.join(tail.get_lines()))
             log_message("Executing script %s ...done" % scr)
 
     @staticmethod
@@ -849,12 +1057,12 @@ class OpenSCAPHelper(object):
     def get_default_xml_result_path(self):
         """Returns full XML result path"""
         return os.path.join(self.result_dir,
-                            OpenSCAPHelper.get_third_party_name("") + self.xml_result_name)
+                            OpenSCAPHelper.get_third_party_name(self.third_party or "") + self.xml_result_name)
 
     def get_default_html_result_path(self):
         """Returns full HTML result path"""
         return os.path.join(self.result_dir,
-                            OpenSCAPHelper.get_third_party_name("") + self.html_result_name)
+                            OpenSCAPHelper.get_third_party_name(self.third_party or "") + self.html_result_name)
 
     def get_default_txt_result_path(self):
         """
@@ -863,19 +1071,37 @@ class OpenSCAPHelper(object):
         :return: default txt result path
         """
         return os.path.join(self.result_dir,
-                            OpenSCAPHelper.get_third_party_name("") + self.result_name + ".txt")
+                            OpenSCAPHelper.get_third_party_name(self.third_party or "") + self.result_name + ".txt")
+
+    @staticmethod
+    def generate_in_process(xml_file, html_file, old_style=False):
+        """
+        Function generates the HTML report by the XSL stylesheet compiled
+        once per process. Returns False if it is not possible, then
+        oscap has to be used.
+        """
+        if SystemIdentification.get_system() or not xmltree.is_available('lxml'):
+            # oscap uses its own stylesheet there
+            return False
+        try:
+            xmltree.transform(OpenSCAPHelper.get_xsl_stylesheet(old_style=old_style), xml_file, html_file,
+                              {'pwd': os.getcwd()})
+        except xmltree.XSLTError as err:
+            logger_debug.debug("HTML report '%s' is generated by oscap: %s", html_file, err)
+            return False
+        return True
 
     def run_generate(self, xml_file, html_file, old_style=False):
         """
         The function generates result.html file from result.xml file
         which was modified by preupgrade assistant
         """
+        if OpenSCAPHelper.generate_in_process(xml_file, html_file, old_style=old_style):
+            return 0
         cmd = self.build_generate_command(xml_file, html_file, old_style=old_style)
-        generate_tempfile = os.path.join('/tmp', ''.join(random.SystemRandom().choice(string.ascii_letters)))
-        ret_val = ProcessHelper.run_subprocess(cmd, print_output=False, output=generate_tempfile)
-        if os.path.exists(generate_tempfile):
-            lines = FileHelper.get_file_content(generate_tempfile, 'r', method=True)
-            logger.debug('%s', '\n'.join(lines))
+        tail = OutputTail()
+        ret_val = ProcessHelper.run_subprocess(cmd, print_output=False, tail=tail)
+        logger.debug('%s', '\n'.join(tail.get_lines()))
         return ret_val
 
 
@@ -3,16 +3,25 @@
 from __future__ import unicode_literals
 import re
 import os
+import json
 import six
 from operator import itemgetter
-from xml.etree import ElementTree
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
 
 from preupg import settings
+from preupg import xmltree
 from preupg.settings import ModuleValues
 from preupg.logger import log_message, logger_report
 from preupg.utils import FileHelper, SystemIdentification
+from preupg.exception import ModuleDependencyError
 
 XMLNS = "{http://checklists.nist.gov/xccdf/1.2}"
+RISK_LEVELS = ['SLIGHT', 'MEDIUM', 'HIGH', 'EXTREME']
+RISK_PATTERN = re.compile(r"preupg\.risk\.(?P<level>\w+): (?P<message>.+)")
+DEBUG_PATTERN = re.compile(r"preupg\.log\.DEBUG")
 
 
 class XccdfHelper(object):
@@ -49,24 +58,91 @@ class XccdfHelper(object):
         return return_value
 
     @staticmethod
-    def get_check_import_inplace_risk(tree):
+    def iter_elements(xccdf_file, tag):
+        """
+        Function yields elements with the tag from the file one by one
+        without building the whole tree. Other parsed elements are freed
+        as the parser goes, so the memory is bounded by the largest element.
+        """
+        tag = XMLNS + tag
+        # open elements which are not inside a yielded one
+        parents = []
+        inside = 0
+        for event, elem in xmltree.iterparse(xccdf_file, events=('start', 'end')):
+            if event == 'start':
+                if inside:
+                    if elem.tag == tag:
+                        inside += 1
+                    continue
+                if elem.tag == tag:
+                    inside = 1
+                parents.append(elem)
+                continue
+            if inside:
+                if elem.tag != tag:
+                    continue
+                inside -= 1
+                if inside:
+                    continue
+                yield elem
+            parents.pop()
+            # the element is the last child of its parent at its end
+            if parents and len(parents[-1]) and parents[-1][-1] is elem:
+                del parents[-1][-1]
+            elem.clear()
+
+    @staticmethod
+    def get_check_import_inplace_risk(tree, remove_debug=False):
         """
         Function returns implace risks
+
+        With remove_debug=True debug lines are removed
+        from check-imports in the same pass.
         """
         inplace_risk = []
-        risk_regex = "preupg\.risk\.(?P<level>\w+): (?P<message>.+)"
-        for check in tree.findall(".//" + XMLNS + "check-import"):
+        found = set()
+        for check in xmltree.findall(tree, ".//" + XMLNS + "check-import"):
             if not check.text:
                 continue
-            lines = check.text.strip().split('\n')
-            for line in lines:
-                match = re.match(risk_regex, line)
-                if match:
+            if remove_debug and 'DEBUG' in check.text:
+                lines = check.text.split('\n')
+                new_lines = [x for x in lines if not DEBUG_PATTERN.match(x)]
+                if len(new_lines) != len(lines):
+                    check.text = '\n'.join(new_lines)
+            # most of outputs do not contain any risk
+            if 'preupg.risk.' not in check.text:
+                continue
+            for line in check.text.strip().split('\n'):
+                if line not in found and RISK_PATTERN.match(line):
                     logger_report.debug(line)
-                    if line not in inplace_risk:
-                        inplace_risk.append(line)
+                    found.add(line)
+                    inplace_risk.append(line)
         return inplace_risk
 
+    @staticmethod
+    def get_max_risk(inplace_risk):
+        """Function returns the highest risk level like 'HIGH' or None"""
+        levels = [x.split(':', 1)[0].replace('preupg.risk.', '') for x in inplace_risk]
+        levels = [RISK_LEVELS.index(x) for x in levels if x in RISK_LEVELS]
+        if not levels:
+            return None
+        return RISK_LEVELS[max(levels)]
+
+    @staticmethod
+    def get_rule_risks(rule_results, get_risks=None):
+        """
+        Function returns list of (rule id, result, inplace risks) of the rule-results,
+        get_risks returns risks of a rule-result, e.g. cached ones
+        """
+        get_risks = get_risks or XccdfHelper.get_check_import_inplace_risk
+        rules = []
+        for rule_result in rule_results:
+            result_value = None
+            for check in rule_result.findall(XMLNS + "result"):
+                result_value = check.text
+            rules.append((rule_result.get("idref"), result_value, get_risks(rule_result)))
+        return rules
+
     @staticmethod
     def check_inplace_risk(xccdf_file, verbose):
         """
@@ -76,32 +152,29 @@ class XccdfHelper(object):
         """
         message = "'preupg' command was not run yet. Run 'preupg' before getting list of risks."
         try:
-            content = FileHelper.get_file_content(xccdf_file, 'rb', False, False)
-            if not content:
-                # WE NEED TO RETURN -1 FOR RED-HAT-UPGRADE-TOOL
-                log_message(message)
-                return -1
-        except IOError:
+            empty = os.stat(xccdf_file).st_size == 0
+        except OSError:
+            empty = True
+        if empty:
             # WE NEED TO RETURN -1 FOR RED-HAT-UPGRADE-TOOL
             log_message(message)
             return -1
 
-        target_tree = ElementTree.fromstring(content)
+        rules = RiskSummary.load(xccdf_file)
+        if rules is None:
+            # the results can be big, so they are not loaded at once
+            rules = XccdfHelper.get_rule_risks(XccdfHelper.iter_elements(xccdf_file, "rule-result"))
+            RiskSummary.write(xccdf_file, rules)
         results = {}
-        for profile in target_tree.findall(XMLNS + "TestResult"):
-            # Collect all inplace risk for each return values
-            for rule_result in profile.findall(XMLNS + "rule-result"):
-                result_value = None
-                for check in rule_result.findall(XMLNS + "result"):
-                    result_value = check.text
-                if check.text not in results:
-                    results[check.text] = []
-                inplace_risk = XccdfHelper.get_check_import_inplace_risk(rule_result)
-                if not inplace_risk:
-                    continue
-                for risk in inplace_risk:
-                    if risk not in results[result_value]:
-                        results[result_value].append(risk)
+        # Collect all inplace risk for each return values
+        for dummy_rule_id, result_value, inplace_risk in rules:
+            if result_value not in results:
+                results[result_value] = []
+            if not inplace_risk:
+                continue
+            for risk in inplace_risk:
+                if risk not in results[result_value]:
+                    results[result_value].append(risk)
         logger_report.debug(results)
         return_val = 0
         for result in settings.ORDERED_LIST:
@@ -162,3 +235,90 @@ class XccdfHelper(object):
                 line = line.replace('PLATFORM_ID', platform_id[0])
             file_lines[index] = line
         FileHelper.write_to_file(full_path, 'wb', file_lines)
+
+    @staticmethod
+    def get_rule_dependencies(tree, ignore_unknown=False):
+        """
+        Function returns a dictionary rule_id -> list of rule ids
+        which have to finish before the rule is started.
+
+        Rules declare dependencies by <requires idref="..."/> elements.
+        Reference to a group means all rules inside the group.
+        """
+        items = {}
+        for group in xmltree.findall(tree, ".//" + XMLNS + "Group"):
+            items[group.get("id")] = [x.get("id") for x in xmltree.findall(group, ".//" + XMLNS + "Rule")]
+        rules = xmltree.findall(tree, ".//" + XMLNS + "Rule")
+        for rule in rules:
+            items[rule.get("id")] = [rule.get("id")]
+        dependencies = {}
+        for rule in rules:
+            rule_id = rule.get("id")
+            dependencies[rule_id] = []
+            for requires in rule.findall(XMLNS + "requires"):
+                idref = requires.get("idref")
+                if idref not in items:
+                    if ignore_unknown:
+                        continue
+                    raise ModuleDependencyError("Rule '%s' requires unknown module '%s'" % (rule_id, idref))
+                dependencies[rule_id].extend([x for x in items[idref] if x != rule_id])
+        return dependencies
+
+
+class RiskSummary(object):
+
+    """
+    Class stores risks of all rules next to the result XML file, so that
+    they are known without parsing it. The summary is used only for
+    the XML file with the same checksum.
+    """
+
+    @staticmethod
+    def get_path(xccdf_file):
+        """Returns path to the summary of the XML file"""
+        return os.path.splitext(xccdf_file)[0] + settings.risk_summary_suffix
+
+    @staticmethod
+    def get_checksum(xccdf_file):
+        """Function returns SHA1 checksum of the file"""
+        hasher = sha1()
+        f = open(xccdf_file, "rb")
+        try:
+            for chunk in iter(lambda: f.read(65536), b''):
+                hasher.update(chunk)
+        finally:
+            f.close()
+        return hasher.hexdigest()
+
+    @staticmethod
+    def write(xccdf_file, rules):
+        """
+        Function writes the summary of the XML file, rules are
+        returned by XccdfHelper.get_rule_risks. Returns False on error.
+        """
+        summary = {'checksum': None, 'rules': []}
+        try:
+            summary['checksum'] = RiskSummary.get_checksum(xccdf_file)
+            for rule_id, result, inplace_risk in rules:
+                summary['rules'].append({'id': rule_id,
+                                         'result': result,
+                                         'risk': XccdfHelper.get_max_risk(inplace_risk),
+                                         'messages': inplace_risk})
+            FileHelper.write_to_file(RiskSummary.get_path(xccdf_file), "wb", json.dumps(summary, indent=1))
+        except (IOError, OSError) as err:
+            logger_report.debug("Risk summary of '%s' was not written: %s", xccdf_file, err)
+            return False
+        return True
+
+    @staticmethod
+    def load(xccdf_file):
+        """Function returns the rules from the summary or None if it is missing or stale"""
+        summary_file = RiskSummary.get_path(xccdf_file)
+        try:
+            summary = json.loads(FileHelper.get_file_content(summary_file, "rb"))
+            if summary['checksum'] != RiskSummary.get_checksum(xccdf_file):
+                logger_report.debug("Risk summary '%s' is stale", summary_file)
+                return None
+            return [(x['id'], x['result'], x['messages']) for x in summary['rules']]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
@@ -8,21 +8,15 @@ import shutil
 import six
 from distutils import dir_util
 
-from preupg.utils import FileHelper, SystemIdentification
+from preupg.utils import FileHelper, SystemIdentification, MessageHelper
 from preupg.xmlgen.oscap_group_xml import OscapGroupXml
 from preupg import settings
 from preupg import xccdf
 from preupg.logger import logger_debug
 from preupg.settings import ReturnValues
-
-try:
-    from xml.etree import ElementTree
-except ImportError:
-    from elementtree import ElementTree
-try:
-    from xml.etree.ElementTree import ParseError
-except ImportError:
-    from xml.parsers.expat import ExpatError as ParseError
+from preupg.scheduler import ModuleScheduler
+from preupg.exception import ModuleDependencyError
+from preupg import xmltree
 
 XCCDF_FRAGMENT = "{http://fedorahosted.org/sce-community-content/wiki/XCCDF-fragment}"
 SCE = "http://open-scap.org/page/SCE"
@@ -58,7 +52,7 @@ class XCCDFCompose(object):
         report_filename = os.path.join(self.dir_name, settings.content_file)
         try:
             FileHelper.write_to_file(report_filename, "wb",
-                                     ElementTree.tostring(target_tree, "utf-8"),
+                                     xmltree.tostring(target_tree, "utf-8"),
                                      False)
             if generate_from_ini:
                 print ('Generate report file for preupgrade-assistant is:', ''.join(report_filename))
@@ -105,9 +99,9 @@ class ComposeXML(object):
                 # print("Directory '%s' is missing a group.xml file!" % (new_dir))
                 continue
             try:
-                ret[dirname] = (ElementTree.parse(group_file_path).getroot(),
+                ret[dirname] = (xmltree.parse(group_file_path),
                                 cls.collect_group_xmls(new_dir, level=level + 1, generate_from_ini=generate_from_ini))
-            except ParseError as e:
+            except xmltree.ParseError as e:
                 print ("Encountered a parse error in file ", group_file_path, " details: ", e)
         return ret
 
@@ -132,7 +126,7 @@ class ComposeXML(object):
                 """
                 continue
 
-            for element in tree.findall(".//" + xccdf.XMLNS + "Rule"):
+            for element in xmltree.findall(tree, ".//" + xccdf.XMLNS + "Rule"):
                 checks = element.findall(xccdf.XMLNS + "check")
                 if len(checks) != 1:
                     print ("Rule of id ", element.get("id", ""),
@@ -173,7 +167,7 @@ class ComposeXML(object):
             old_base_dir = os.path.join(source_dir, f)
 
             path_prefix = os.path.relpath(old_base_dir, new_base_dir)
-            for element in tree.findall(".//" + xccdf.XMLNS + "check-content-ref"):
+            for element in xmltree.findall(tree, ".//" + xccdf.XMLNS + "check-content-ref"):
                 old_href = element.get("href")
                 assert(old_href is not None)
                 element.set("href", os.path.join(path_prefix, old_href))
@@ -256,14 +250,14 @@ class ComposeXML(object):
             for rule in selected_rules:
                 # if it's selected by default, we don't care
                 if rule not in default_selected_rules:
-                    elem = ElementTree.Element(xccdf.XMLNS + "select")
+                    elem = xmltree.Element(xccdf.XMLNS + "select")
                     elem.set("idref", rule)
                     elem.set("selected", "true")
                     profile.append(elem)
 
             for rule in default_selected_rules:
                 if rule not in selected_rules:
-                    elem = ElementTree.Element(xccdf.XMLNS + "select")
+                    elem = xmltree.Element(xccdf.XMLNS + "select")
                     elem.set("idref", rule)
                     elem.set("selected", "false")
                     profile.append(elem)
@@ -272,7 +266,7 @@ class ComposeXML(object):
     def update_content_ref(cls, target_tree, content):
         if not content:
             return target_tree
-        for content_ref in target_tree.findall(".//" + xccdf.XMLNS + "check"):
+        for content_ref in xmltree.findall(target_tree, ".//" + xccdf.XMLNS + "check"):
             for check_ref in content_ref.findall("*"):
                 if check_ref.tag == xccdf.XMLNS + "check-content-ref":
                     reference = check_ref.get("href")
@@ -280,6 +274,23 @@ class ComposeXML(object):
 
         return target_tree
 
+    @classmethod
+    def check_dependencies(cls, target_tree, ignore_unknown=False):
+        """
+        Function checks that modules depend only on existing modules
+        and that there is no cycle between them
+        """
+        try:
+            dependencies = xccdf.XccdfHelper.get_rule_dependencies(target_tree, ignore_unknown)
+        except ModuleDependencyError as e:
+            MessageHelper.print_error_msg(title="Wrong value for tag 'depends_on'", msg="\n%s" % e)
+            raise
+        cycle = ModuleScheduler.find_cycle(dependencies)
+        if cycle:
+            MessageHelper.print_error_msg(title="Modules depend on each other in a cycle:",
+                                          msg="\n%s" % ' -> '.join(cycle))
+            raise ModuleDependencyError("Cyclic dependency between modules: %s" % ' -> '.join(cycle))
+
     @classmethod
     def refresh_status(cls, target_tree):
         for status in target_tree.findall(xccdf.XMLNS + "status"):
@@ -312,7 +323,7 @@ class ComposeXML(object):
     def get_xml_tree(cls):
         template_file = ComposeXML.get_template_file()
         try:
-            target_tree = ElementTree.parse(template_file).getroot()
+            target_tree = xmltree.parse(template_file)
         except IOError:
             print('Problem with reading %s file' % settings.xccdf_template)
             return None
@@ -333,6 +344,8 @@ class ComposeXML(object):
         cls.merge_trees(target_tree, target_tree, group_xmls)
         target_tree = cls.update_content_ref(target_tree, content)
         cls.resolve_selects(target_tree)
+        if generate_from_ini:
+            cls.check_dependencies(target_tree, ignore_unknown=content is not None)
         cls.refresh_status(target_tree)
         cls.indent(target_tree)
 
@@ -16,16 +16,8 @@ except ImportError:
 
 from preupg.xmlgen.xml_utils import XmlUtils
 from preupg.utils import MessageHelper, FileHelper, SystemIdentification
-try:
-    from xml.etree import ElementTree
-except ImportError:
-    from elementtree import ElementTree
 from preupg import settings
-
-try:
-    from xml.etree.ElementTree import ParseError
-except ImportError:
-    from xml.parsers.expat import ExpatError as ParseError
+from preupg import xmltree
 
 
 class OscapGroupXml(object):
@@ -79,8 +71,8 @@ class OscapGroupXml(object):
         """The functions is used for collecting all INI files into the one."""
         # load content without decoding to unicode - ElementTree requests this
         try:
-            self.ret[self.dirname] = (ElementTree.parse(os.path.join(self.dirname, "group.xml")).getroot())
-        except ParseError as par_err:
+            self.ret[self.dirname] = xmltree.parse(os.path.join(self.dirname, "group.xml"))
+        except xmltree.ParseError as par_err:
             print("Encountered a parse error in file ", self.dirname, " details: ", par_err)
         return self.ret
 
@@ -103,7 +95,7 @@ class OscapGroupXml(object):
         try:
             # encoding must be set! otherwise ElementTree return non-ascii characters
             # as html entities instead, which are unsusable for us
-            data = ElementTree.tostring(target_tree, "utf-8")
+            data = xmltree.tostring(target_tree, "utf-8")
             FileHelper.write_to_file(file_name, "wb", data, False)
         except IOError as ioe:
             print ('Problem with writing to file ', file_name, ioe.message)
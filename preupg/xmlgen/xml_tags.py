@@ -40,6 +40,7 @@ RULE_SECTION = """
         {check_description}
         {config_section}
       </description>
+      {requires}
       {fix}
       <check system="http://open-scap.org/page/SCE">
         <check-import import-name="stdout" />
@@ -48,6 +49,7 @@ RULE_SECTION = """
       </check>
     </Rule>
 """
+REQUIRES = """<requires idref=\""""+TAG_GROUP+"""{module}" />"""
 PLATFORM = """platform=\"cpe:/o:PLATFORM_NAME:PLATFORM_ID\""""
 FIX = """<fix """+PLATFORM+""" system="urn:xccdf:fix:script:{script_type}">
 {solution}
@@ -69,6 +71,8 @@ DIC_VALUES = {'current_directory': '/root/preupgrade',
               'solution_file': '',
               'result_part': '',
               'module_path': '',
+              'exclusive': '0',
+              'timeout': '',
               }
 
 GLOBAL_DIC_VALUES = {'tmp_preupgrade': 'SCENARIO',
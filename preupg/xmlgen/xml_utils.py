@@ -39,7 +39,8 @@ class XmlUtils(object):
         test_dict = copy.deepcopy(self.ini_files)
         allowed_tags = ['check_script', 'content_description', 'content_title', 'applies_to',
                         'author', 'binary_req', 'solution', 'bugzilla', 'config_file',
-                        'group_title', 'mode', 'requires', 'solution_type']
+                        'group_title', 'mode', 'requires', 'solution_type',
+                        'depends_on', 'exclusive', 'timeout']
         for ini, content in six.iteritems(test_dict):
             content_dict = content[0]
             for tag in allowed_tags:
@@ -238,6 +239,21 @@ class XmlUtils(object):
             self.update_values_list(self.select_rules, "{scap_name}",
                                     key[name].split('.')[0])
 
+    def fnc_depends_on(self, key, name):
+        """
+        Function adds requires elements for modules which have to finish
+        before this one. Modules are separated by comma, e.g. system/repos
+        """
+        requires_tag = []
+        if name in key and key[name] is not None:
+            for module in key[name].split(','):
+                module = module.strip().strip('/')
+                if not module:
+                    continue
+                requires_tag.append(xml_tags.REQUIRES)
+                self.update_values_list(requires_tag, "{module}", '_'.join(module.split('/')))
+        self.update_values_list(self.rule, "{requires}", '\n      '.join(requires_tag))
+
     def fnc_check_description(self, key, name):
         """ Function updates a check_description """
         if name in key and key[name] is not None:
@@ -304,6 +320,7 @@ class XmlUtils(object):
             'solution': self.fnc_solution_text,
             'applies_to': self.dummy_fnc,
             'binary_req': self.dummy_fnc,
+            'depends_on': self.fnc_depends_on,
             'content_title': self.update_text,
             'content_description': self.update_text,
         }
@@ -326,6 +343,21 @@ class XmlUtils(object):
             else:
                 xml_tags.DIC_VALUES['result_part'] = 'admin'
 
+            # Exclusive modules touch shared state and are never run in parallel
+            if key.get('exclusive', '').strip().lower() in ['1', 'yes', 'true']:
+                xml_tags.DIC_VALUES['exclusive'] = '1'
+            else:
+                xml_tags.DIC_VALUES['exclusive'] = '0'
+
+            # Time limit of the module in seconds, empty means the default
+            # from preupgrade-assistant.conf and 0 means no limit
+            timeout = key.get('timeout', '').strip()
+            if timeout and not timeout.isdigit():
+                MessageHelper.print_error_msg(title="Wrong value for tag 'timeout' in INI file '%s'\n" % main,
+                                              msg="'%s' is not a number of seconds" % timeout)
+                raise MissingTagsIniFileError
+            xml_tags.DIC_VALUES['timeout'] = timeout
+
             self.update_values_list(self.rule, "{rule_tag}", ''.join(xml_tags.RULE_SECTION))
             value_tag, check_export_tag = self.add_value_tag()
             self.update_values_list(self.rule, "{check_export}", ''.join(check_export_tag))
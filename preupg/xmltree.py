@@ -0,0 +1,198 @@
+"""
+The xmltree module is the XML backend of preupg. It uses lxml when it is
+installed, which parses and serializes XCCDF documents in C, evaluates
+compiled XPath expressions and reads results bigger than the default
+limits of libxml2. Otherwise ElementTree from the standard library is used.
+lxml older than 3.5 is not used, it can not declare namespaces on the root
+of an existing tree, see set_namespace().
+
+Elements of both backends have the ElementTree API. Trees must not be
+mixed, so new elements are created by Element() and SubElement() here.
+
+XSLT stylesheets are applied by lxml only, see transform().
+"""
+
+from __future__ import unicode_literals
+import threading
+
+try:
+    from xml.etree import ElementTree
+except ImportError:
+    from elementtree import ElementTree
+try:
+    from xml.etree.ElementTree import ParseError as ETParseError
+except ImportError:
+    from xml.parsers.expat import ExpatError as ETParseError
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+BACKENDS = ['lxml', 'etree']
+
+if etree is not None:
+    # errors raised by parse() of any backend
+    ParseError = (ETParseError, etree.ParseError)
+    # errors raised by transform()
+    XSLTError = (IOError, etree.Error)
+else:
+    ParseError = ETParseError
+    XSLTError = IOError
+
+# cleanup_namespaces() accepts top_nsmap and keep_ns_prefixes since lxml 3.5
+_lxml_usable = etree is not None and etree.LXML_VERSION >= (3, 5)
+_backend = 'lxml' if _lxml_usable else 'etree'
+# compiled XPath expressions, path -> ETXPath
+_xpath_cache = {}
+# compiled stylesheets, path -> XSLT or the error raised by its compilation
+_xslt_cache = {}
+_xslt_lock = threading.Lock()
+
+
+def get_backend():
+    """Function returns name of the used backend, 'lxml' or 'etree'"""
+    return _backend
+
+
+def is_available(backend):
+    """Returns True if the backend can be used"""
+    return backend == 'etree' or (backend == 'lxml' and _lxml_usable)
+
+
+def set_backend(backend):
+    """Function switches the backend, returns the previous one"""
+    global _backend
+    if backend not in BACKENDS:
+        raise ValueError("Unknown XML backend '%s'" % backend)
+    if not is_available(backend):
+        raise ImportError("The lxml module 3.5 or newer is not installed")
+    previous = _backend
+    _backend = backend
+    return previous
+
+
+def _get_lxml_parser():
+    return etree.XMLParser(huge_tree=True, remove_comments=True, remove_pis=True)
+
+
+def parse(source):
+    """Function parses the file name or the file object and returns its root element"""
+    if _backend == 'lxml':
+        return etree.parse(source, _get_lxml_parser()).getroot()
+    return ElementTree.parse(source).getroot()
+
+
+def fromstring(data):
+    """Function parses XML document from bytes and returns its root element"""
+    if _backend == 'lxml':
+        return etree.fromstring(data, _get_lxml_parser())
+    return ElementTree.fromstring(data)
+
+
+def iterparse(source, events=('end',)):
+    """Function returns iterator over (event, element) of the file"""
+    if _backend == 'lxml':
+        return etree.iterparse(source, events=events, huge_tree=True,
+                               remove_comments=True, remove_pis=True)
+    return ElementTree.iterparse(source, events=events)
+
+
+def tostring(element, encoding="utf-8"):
+    """Function returns the element serialized to bytes"""
+    if _backend == 'lxml':
+        return etree.tostring(element, encoding=encoding)
+    return ElementTree.tostring(element, encoding)
+
+
+def write(element, file_name, encoding="utf-8"):
+    """Function serializes the element to the file without making a copy in memory"""
+    f = open(file_name, 'wb')
+    try:
+        if _backend == 'lxml':
+            etree.ElementTree(element).write(f, encoding=encoding)
+        else:
+            ElementTree.ElementTree(element).write(f, encoding)
+    finally:
+        f.close()
+
+
+def Element(tag, attrib=None):
+    """Function creates a new element of the backend"""
+    if _backend == 'lxml':
+        return etree.Element(tag, attrib or {})
+    return ElementTree.Element(tag, attrib or {})
+
+
+def SubElement(parent, tag, attrib=None):
+    """Function creates a new element as the last child of parent"""
+    if _backend == 'lxml':
+        return etree.SubElement(parent, tag, attrib or {})
+    return ElementTree.SubElement(parent, tag, attrib or {})
+
+
+def findall(tree, path):
+    """
+    Function returns list of elements matching ElementPath path like
+    './/{namespace}Rule'. lxml evaluates it as compiled XPath.
+    """
+    if _backend != 'lxml' or not isinstance(tree, etree._Element):
+        return tree.findall(path)
+    try:
+        xpath = _xpath_cache[path]
+    except KeyError:
+        xpath = _xpath_cache[path] = etree.ETXPath(path)
+    return xpath(tree)
+
+
+def set_namespace(root, prefix, uri):
+    """Function declares the namespace prefix on the root element"""
+    if _backend == 'lxml':
+        if root.nsmap.get(prefix) != uri:
+            # the declaration can not be added to an existing lxml element
+            # as an attribute, cleanup_namespaces moves it to the root.
+            # It would remove unused declarations, they are kept as they are
+            prefixes = set([x[0] for x in root.xpath('//namespace::*') if x[0]])
+            prefixes.add(prefix)
+            etree.cleanup_namespaces(root, top_nsmap={prefix: uri}, keep_ns_prefixes=list(prefixes))
+        return
+    root.set('xmlns:' + prefix, uri)
+
+
+def get_xslt(stylesheet):
+    """
+    Function returns the stylesheet compiled by lxml. Each stylesheet
+    is compiled once per process, the compiled one can be used
+    from more threads at the same time.
+    """
+    if etree is None:
+        raise ImportError("The lxml module is not installed")
+    _xslt_lock.acquire()
+    try:
+        xslt = _xslt_cache.get(stylesheet)
+        if xslt is None:
+            try:
+                xslt = etree.XSLT(etree.parse(stylesheet))
+            except XSLTError as err:
+                # do not compile the broken stylesheet again
+                xslt = err
+            _xslt_cache[stylesheet] = xslt
+    finally:
+        _xslt_lock.release()
+    if isinstance(xslt, Exception):
+        raise xslt
+    return xslt
+
+
+def transform(stylesheet, xml_file, output_file, params=None):
+    """
+    Function applies the stylesheet to the XML file and writes the result
+    to output_file. params is a dictionary of string stylesheet parameters.
+    libxslt does not hold the GIL, so more files can be transformed in threads.
+    """
+    xslt = get_xslt(stylesheet)
+    doc = etree.parse(xml_file, _get_lxml_parser())
+    xslt_params = {}
+    for name, value in (params or {}).items():
+        xslt_params[str(name)] = etree.XSLT.strparam(value)
+    result = xslt(doc, **xslt_params)
+    result.write_output(output_file)
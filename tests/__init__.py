@@ -33,12 +33,18 @@ def suite():
     from tests import test_kickstart
     from tests import test_inplace_risks
     from tests import test_creator
+    from tests import test_scan
+    from tests import test_common
+    from tests import test_xmltree
     suite.addTests(test_preupg.suite())
     suite.addTests(test_xml.suite())
     suite.addTests(test_kickstart.suite())
     suite.addTests(test_inplace_risks.suite())
     suite.addTests(test_api.suite())
     suite.addTests(test_creator.suite())
+    suite.addTests(test_scan.suite())
+    suite.addTests(test_common.suite())
+    suite.addTests(test_xmltree.suite())
     return suite
 
 if __name__ == '__main__':
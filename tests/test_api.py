@@ -2,8 +2,11 @@ from __future__ import unicode_literals
 import unittest
 import shutil
 import os
+import tempfile
+import time
 
 from preupg import script_api
+from preupg.pkgindex import PackageIndex
 from preupg.utils import FileHelper
 
 try:
@@ -66,6 +69,14 @@ class TestAPICheck(base.TestCase):
         expected_binaries = "strings,nm"
         self.assertEqual(script_api.check_rpm_to(check_bin=expected_binaries), 0)
 
+    def test_find_executable(self):
+        strings = script_api._find_executable("strings")
+        self.assertTrue(os.path.isabs(strings))
+        self.assertEqual(script_api._find_executable(strings), strings)
+        self.assertEqual(script_api._find_executable("/bin/preupg"), None)
+        self.assertEqual(script_api._find_executable("/etc"), None)
+        self.assertEqual(script_api._find_executable("fooupg"), None)
+
     def test_not_check_rpm_to_binaries(self):
         expected_binaries = "/usr/bin/fooupg,/bin/preupg"
         try:
@@ -83,6 +94,17 @@ class TestAPICheck(base.TestCase):
     def test_config_file_changed(self):
         self.assertTrue(script_api.config_file_changed("/etc/foo/test.conf"))
         self.assertFalse(script_api.config_file_changed("/etc/foobar/test.conf"))
+        # substrings of changed files are not changed files
+        self.assertFalse(script_api.config_file_changed("/etc/foo/test"))
+        self.assertFalse(script_api.config_file_changed("test.conf"))
+
+    def test_config_dir_changed(self):
+        self.assertTrue(script_api.config_dir_changed("/etc/foo"))
+        self.assertTrue(script_api.config_dir_changed("/etc/foo/bar/"))
+        self.assertTrue(script_api.config_dir_changed("/etc"))
+        self.assertFalse(script_api.config_dir_changed("/etc/fo"))
+        self.assertFalse(script_api.config_dir_changed("/etc/foo/test.conf"))
+        self.assertFalse(script_api.config_dir_changed("/usr"))
 
     def test_is_dist_native(self):
         self.assertTrue(script_api.is_dist_native('foobar'))
@@ -139,10 +161,93 @@ class TestAPICheck(base.TestCase):
             self.assertTrue(os.path.isfile(os.path.join(preupgrade_hook_dir, f)))
 
 
+class TestPackageIndex(base.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.rpm_qa = os.path.join(self.temp_dir, 'rpm_qa.log')
+        names = ['foo', 'foo-libs', 'Foo', 'bar', 'a', 'z', 'foo-devel', 'libfoo', 'foo2']
+        FileHelper.write_to_file(self.rpm_qa, 'wb', ''.join(["%s\tVendor\t(none)\n" % x for x in names]))
+        self.names = names
+        # tests replace the logs and the cache, they are restored in tearDown
+        self.saved = (script_api.VALUE_RPM_QA, script_api.VALUE_RPM_RHSIGNED, script_api.PREUPGRADE_CACHE)
+        script_api.DEVEL_MODE = 0
+        script_api.DIST_NATIVE = 'sign'
+
+    def tearDown(self):
+        script_api._PACKAGE_INDEXES.clear()
+        script_api.VALUE_RPM_QA, script_api.VALUE_RPM_RHSIGNED, script_api.PREUPGRADE_CACHE = self.saved
+        script_api.DEVEL_MODE = 0
+        script_api.DIST_NATIVE = 'sign'
+        shutil.rmtree(self.temp_dir)
+
+    def test_index(self):
+        index = PackageIndex(self.rpm_qa)
+        self.assertFalse(index.is_valid())
+        self.assertTrue(PackageIndex.build(self.rpm_qa))
+        self.assertTrue(index.is_valid())
+        self.assertEqual(index.get_names(), sorted(self.names))
+        for name in self.names:
+            self.assertTrue(index.contains(name))
+        for name in ['fo', 'foo-', 'foo-lib', 'b', 'zz', '0', 'Vendor', '']:
+            self.assertFalse(index.contains(name))
+        self.assertFalse(PackageIndex.build(os.path.join(self.temp_dir, 'missing.log')))
+
+    def test_script_api(self):
+        script_api.VALUE_RPM_QA = self.rpm_qa
+        # without the index the log is read
+        self.assertTrue(script_api.is_pkg_installed('foo-libs'))
+        PackageIndex.build(self.rpm_qa)
+        FileHelper.write_to_file(self.rpm_qa + '.idx', 'wb', "only\tfrom index\n")
+        self.assertTrue(script_api.is_pkg_installed('only'))
+        self.assertFalse(script_api.is_pkg_installed('foo-libs'))
+
+    def test_dist_native_list(self):
+        script_api.VALUE_RPM_QA = self.rpm_qa
+        script_api.VALUE_RPM_RHSIGNED = os.path.join(self.temp_dir, 'rpm_rhsigned.log')
+        script_api.PREUPGRADE_CACHE = self.temp_dir
+        FileHelper.write_to_file(script_api.VALUE_RPM_RHSIGNED, 'wb', "z\tVendor\nfoo\tVendor\nother\tVendor\n")
+        self.assertEqual(script_api.get_dist_native_list(), ['foo', 'z'])
+        # the stored list is used by the next call
+        cache = os.path.join(self.temp_dir, script_api.DIST_NATIVE_LIST)
+        content = FileHelper.get_file_content(cache, 'rb')
+        FileHelper.write_to_file(cache, 'wb', content + "stored\n")
+        self.assertEqual(script_api.get_dist_native_list(), ['foo', 'z', 'stored'])
+        script_api.DEVEL_MODE = 1
+        script_api.DIST_NATIVE = 'all'
+        self.assertEqual(script_api.get_dist_native_list(), self.names)
+        script_api.DIST_NATIVE = os.path.join(self.temp_dir, 'native')
+        FileHelper.write_to_file(script_api.DIST_NATIVE, 'wb', "bar\nfoo2")
+        self.assertEqual(script_api.get_dist_native_list(), ['bar', 'foo2'])
+        # a changed input is not hidden by the stored list
+        FileHelper.write_to_file(script_api.DIST_NATIVE, 'wb', "a\n")
+        os.utime(script_api.DIST_NATIVE, (time.time() + 10, time.time() + 10))
+        self.assertEqual(script_api.get_dist_native_list(), ['a'])
+        # neither when its mtime is the same
+        mtime = os.stat(script_api.DIST_NATIVE).st_mtime
+        FileHelper.write_to_file(script_api.DIST_NATIVE, 'wb', "a\nz\n")
+        os.utime(script_api.DIST_NATIVE, (mtime, mtime))
+        self.assertEqual(script_api.get_dist_native_list(), ['a', 'z'])
+
+    def test_dist_native_rule(self):
+        script_api.VALUE_RPM_QA = self.rpm_qa
+        script_api.VALUE_RPM_RHSIGNED = os.path.join(self.temp_dir, 'rpm_rhsigned.log')
+        FileHelper.write_to_file(script_api.VALUE_RPM_RHSIGNED, 'wb', "")
+        script_api.DEVEL_MODE = 1
+        script_api.DIST_NATIVE = os.path.join(self.temp_dir, 'native')
+        script_api.PREUPGRADE_CACHE = self.temp_dir
+        FileHelper.write_to_file(script_api.DIST_NATIVE, 'wb', "foo-libs\tVendor\nfoo\nbar")
+        # the same packages are native for both functions
+        native = script_api.get_dist_native_list()
+        self.assertEqual(native, ['foo', 'foo-libs', 'bar'])
+        self.assertEqual([x for x in self.names if script_api.is_dist_native(x)], native)
+
+
 def suite():
     loader = unittest.TestLoader()
     suite = unittest.TestSuite()
     suite.addTest(loader.loadTestsFromTestCase(TestAPICheck))
+    suite.addTest(loader.loadTestsFromTestCase(TestPackageIndex))
     return suite
 
 if __name__ == '__main__':
@@ -0,0 +1,256 @@
+from __future__ import unicode_literals
+import unittest
+import tempfile
+import shutil
+import os
+import time
+import stat
+
+from preupg.common import Common, CommonScript
+from preupg.rpmverify import RpmVerifier, RpmVerifyHelper, PackageFile, DigestIndex
+from preupg.rpmverify import FILE_CONFIG, FILE_MISSINGOK
+from preupg import rpmverify
+from preupg.conf import Conf, DummyConf
+from preupg.utils import FileHelper
+from preupg import settings
+
+try:
+    import base
+except ImportError:
+    import tests.base as base
+
+SCRIPTS = """# comment
+sleep {sleep}; echo slow | tee -a runs.log=slow.log=SLOW=Slow log=NO===input.txt
+sleep {sleep}; echo fast | tee -a runs.log=fast.log=FAST=Fast log=YES=Fast_log
+grep slow slow.log | tee -a runs.log=grep.log=GREP=Grepped log=NO==slow.log
+"""
+
+
+class TestCommon(base.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        self.common = self._get_common()
+
+    def _get_common(self, sleep=0, refresh_common=False, scripts=SCRIPTS):
+        common_scripts = os.path.join(self.temp_dir, 'scripts.txt')
+        FileHelper.write_to_file(common_scripts, 'w', scripts.format(sleep=sleep))
+        return Common(Conf(DummyConf(common_scripts=common_scripts,
+                                     cache_dir=self.temp_dir,
+                                     refresh_common=refresh_common,
+                                     jobs=4),
+                           settings))
+
+    def _get_runs(self):
+        return FileHelper.get_file_content(os.path.join(self.common.get_common_dir(), 'runs.log'),
+                                           'rb', True)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir)
+
+    def test_parse_line(self):
+        script = CommonScript('rpm -Va=rpm_Va.log=ALLCHANGED=All changed files=YES=All_changed_files\n')
+        self.assertEqual(script.cmd, 'rpm -Va')
+        self.assertEqual(script.kickstart_name, 'All_changed_files')
+        self.assertEqual(script.depends_on, [])
+        script = CommonScript('grep -e "c /" rpm_Va.log=rpm_etc_Va.log=CONFIGCHANGED=Changed=NO==rpm_Va.log, a.log')
+        self.assertEqual(script.kickstart, 'NO')
+        self.assertEqual(script.depends_on, ['rpm_Va.log', 'a.log'])
+        self.assertEqual(script.inputs, [])
+        self.assertTrue(script.is_cacheable())
+        script = CommonScript('getent group=group.log=GROUP=All groups=YES=Groups==/etc/group,/etc/nsswitch.conf')
+        self.assertEqual(script.inputs, ['/etc/group', '/etc/nsswitch.conf'])
+
+    def test_requires(self):
+        self.assertEqual(len(self.common.scripts), 3)
+        requires = dict((x.log_file, [y.log_file for y in deps])
+                        for x, deps in self.common.get_requires().items())
+        self.assertEqual(requires, {'slow.log': [], 'fast.log': [], 'grep.log': ['slow.log']})
+
+    def test_parallel_gathering(self):
+        self.common = self._get_common(sleep=1)
+        start = time.time()
+        self.assertEqual(self.common.common_results(), 1)
+        # slow and fast logs are gathered at the same time
+        self.assertTrue(time.time() - start < 1.9)
+        common_dir = self.common.get_common_dir()
+        self.assertEqual(FileHelper.get_file_content(os.path.join(common_dir, 'fast.log'), 'rb'), "fast\n")
+        # grep waits for slow.log
+        self.assertEqual(FileHelper.get_file_content(os.path.join(common_dir, 'grep.log'), 'rb'), "slow\n")
+
+    def test_reuse_unchanged(self):
+        self.common.common_results()
+        self.assertEqual(len(self._get_runs()), 3)
+        # only the log without inputs is gathered again
+        self.common = self._get_common()
+        self.common.common_results()
+        self.assertEqual(self._get_runs()[3:], ["fast\n"])
+        self.assertEqual(sorted(self.common.reused), ['grep.log', 'slow.log'])
+        # changed input invalidates also the dependent log
+        FileHelper.write_to_file(os.path.join(self.common.get_common_dir(), 'input.txt'), 'w', "changed")
+        self.common = self._get_common()
+        self.common.common_results()
+        self.assertEqual(sorted(self._get_runs()[4:]), ["fast\n", "slow\n", "slow\n"])
+        self.common = self._get_common(refresh_common=True)
+        self.common.common_results()
+        self.assertEqual(len(self._get_runs()), 10)
+        self.assertEqual(self.common.reused, set())
+
+    def test_changed_tracked_file(self):
+        tracked = os.path.join(self.temp_dir, 'tracked.conf')
+        scripts = "cat {0}=tracked.log=TRACKED=Tracked file=NO\n".format(tracked)
+        FileHelper.write_to_file(tracked, 'w', "option=1\n")
+        self.common = self._get_common(scripts=scripts)
+        self.common.common_results()
+        # log without inputs is never reused, changes on disk are reported
+        FileHelper.write_to_file(tracked, 'w', "option=2\n")
+        self.common = self._get_common(scripts=scripts)
+        self.common.common_results()
+        self.assertEqual(self.common.reused, set())
+        self.assertEqual(FileHelper.get_file_content(
+            os.path.join(self.common.get_common_dir(), 'tracked.log'), 'rb'), "option=2\n")
+
+    def test_not_cached(self):
+        scripts_txt = os.path.join(os.path.dirname(settings.__file__), '..',
+                                   'data', 'preassessment', 'scripts.txt')
+        lines = FileHelper.get_file_content(scripts_txt, 'rb', True)
+        scripts = dict((x.log_file, x) for x in
+                       [CommonScript(l) for l in lines if l.strip() and not l.startswith("#")])
+        # rpm -Va detects changes on disk and getent returns also users and
+        # groups of LDAP, SSSD or NIS, they have to be gathered on every run
+        for log_file in ['rpm_Va.log', 'passwd.log', 'group.log']:
+            self.assertEqual(scripts[log_file].inputs, [])
+            self.assertFalse(scripts[log_file].is_cacheable())
+
+
+class TestRpmVerify(base.TestCase):
+
+    # RPMVERIFY_ALL
+    vflags = ~0
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.temp_dir, 'file.conf')
+        FileHelper.write_to_file(self.file_name, 'wb', "option=1\n")
+        file_stat = os.lstat(self.file_name)
+        self.user = RpmVerifyHelper.get_user_name(file_stat.st_uid)
+        self.group = RpmVerifyHelper.get_group_name(file_stat.st_gid)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _get_entry(self, name, flags=FILE_CONFIG, **kwargs):
+        file_stat = os.lstat(name)
+        values = {'size': file_stat.st_size,
+                  'mode': file_stat.st_mode,
+                  'mtime': int(file_stat.st_mtime)}
+        values.update(kwargs)
+        if 'digest' not in values:
+            values['digest'] = RpmVerifyHelper.get_file_digest(name, 'sha256')[0]
+        return PackageFile(name, values['size'], values['mode'], values['mtime'], flags,
+                           0, 0, self.vflags, self.user, self.group, values['digest'],
+                           algorithm='sha256')
+
+    def test_unchanged(self):
+        self.assertEqual(RpmVerifyHelper.verify_file(self._get_entry(self.file_name)), None)
+
+    def test_changed(self):
+        entry = self._get_entry(self.file_name)
+        FileHelper.write_to_file(self.file_name, 'wb', "option=2\nother=1\n")
+        os.utime(self.file_name, (entry.mtime + 10, entry.mtime + 10))
+        self.assertEqual(RpmVerifyHelper.verify_file(entry),
+                         "S.5....T.  c " + self.file_name)
+        entry = self._get_entry(self.file_name, flags=0, mode=stat.S_IFREG | 0o600)
+        os.chmod(self.file_name, 0o644)
+        self.assertEqual(RpmVerifyHelper.verify_file(entry),
+                         ".M.......    " + self.file_name)
+
+    def test_missing(self):
+        entry = self._get_entry(self.file_name)
+        os.unlink(self.file_name)
+        self.assertEqual(RpmVerifyHelper.verify_file(entry), "missing   c " + self.file_name)
+        entry.flags |= FILE_MISSINGOK
+        self.assertEqual(RpmVerifyHelper.verify_file(entry), None)
+
+    def test_symlink_and_directory(self):
+        link_name = os.path.join(self.temp_dir, 'link')
+        os.symlink(self.file_name, link_name)
+        entry = self._get_entry(link_name, flags=0, digest='')
+        entry.linkto = self.file_name
+        self.assertEqual(RpmVerifyHelper.verify_file(entry), None)
+        entry.linkto = '/other'
+        self.assertEqual(RpmVerifyHelper.verify_file(entry), "....L....    " + link_name)
+        # size and time of directories are not checked
+        entry = self._get_entry(self.temp_dir, flags=0, size=1, mtime=1, digest='')
+        self.assertEqual(RpmVerifyHelper.verify_file(entry), None)
+
+    def test_order_and_format(self):
+        other_name = os.path.join(self.temp_dir, 'other')
+        FileHelper.write_to_file(other_name, 'wb', "data")
+        packages = [[self._get_entry(self.file_name, size=1)],
+                    [self._get_entry(other_name, flags=0)] * 2,
+                    [self._get_entry(other_name, flags=0, digest='0')]]
+        lines = RpmVerifier(jobs=3).verify(packages)
+        self.assertEqual(lines, ["S........  c " + self.file_name,
+                                 "..5......    " + other_name])
+        # lines can be parsed by ConfigFilesHelper.copy_modified_config_files
+        opts, flags, filename = lines[0].split()
+        self.assertEqual((flags, filename), ('c', self.file_name))
+
+    def test_prelinked(self):
+        # prelink -y prints the original content, without the data added by prelink
+        original = b"\x7fELF original content\n"
+        prelink = os.path.join(self.temp_dir, 'prelink')
+        FileHelper.write_to_file(prelink, 'wb', '#!/bin/sh\n[ "$1" = "-y" ] && head -c %d "$2"\n' % len(original))
+        os.chmod(prelink, 0o755)
+        binary = os.path.join(self.temp_dir, 'binary')
+        FileHelper.write_to_file(binary, 'wb', original, False)
+        entry = self._get_entry(binary, flags=0)
+        FileHelper.write_to_file(binary, 'ab', b"prelink data", False)
+        os.utime(binary, (entry.mtime, entry.mtime))
+        self.assertEqual(RpmVerifyHelper.verify_file(entry), "S.5......    " + binary)
+        default_prelink = rpmverify.PRELINK
+        rpmverify.PRELINK = prelink
+        try:
+            self.assertEqual(RpmVerifyHelper.verify_file(entry), None)
+            index = DigestIndex(os.path.join(self.temp_dir, 'index.json'))
+            self.assertEqual(RpmVerifyHelper.verify_file(entry, index), None)
+            self.assertEqual(index.current[binary][-1], len(original))
+            # files which are not ELF are not passed to prelink
+            self.assertEqual(RpmVerifyHelper.get_file_digest(prelink, 'sha256')[1], os.path.getsize(prelink))
+        finally:
+            rpmverify.PRELINK = default_prelink
+
+    def test_digest_index(self):
+        index_file = os.path.join(self.temp_dir, 'index.json')
+        packages = [[self._get_entry(self.file_name)]]
+        verifier = RpmVerifier(jobs=2, index_file=index_file)
+        self.assertEqual(verifier.verify(packages), [])
+        index = DigestIndex(index_file)
+        self.assertEqual(list(index.previous.keys()), [self.file_name])
+        # untouched file is not read again
+        self.assertEqual(RpmVerifyHelper.verify_file(packages[0][0], index), None)
+        self.assertEqual(index.digested, 0)
+        # content changed without change of size and mtime
+        entry = packages[0][0]
+        FileHelper.write_to_file(self.file_name, 'wb', "option=2\n")
+        os.utime(self.file_name, (entry.mtime, entry.mtime))
+        index = DigestIndex(index_file)
+        self.assertEqual(RpmVerifyHelper.verify_file(entry, index), "..5......  c " + self.file_name)
+        self.assertEqual(index.digested, 1)
+        self.assertEqual(verifier.verify(packages), ["..5......  c " + self.file_name])
+        index = DigestIndex(index_file, refresh=True)
+        self.assertEqual(index.previous, {})
+
+
+def suite():
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTest(loader.loadTestsFromTestCase(TestCommon))
+    suite.addTest(loader.loadTestsFromTestCase(TestRpmVerify))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=3).run(suite())
@@ -4,7 +4,8 @@ import tempfile
 import shutil
 import os
 
-from preupg.xccdf import XccdfHelper
+from preupg.xccdf import XccdfHelper, RiskSummary
+from preupg.report_parser import ReportParser
 from preupg.utils import FileHelper
 from preupg import settings
 from preupg.settings import ModuleValues
@@ -162,11 +163,67 @@ class TestCombinedRiskCheck(base.TestCase):
         self.assertEqual(self._update_xccdf_file(['not_applicable', 'pass'], [None, None]), ModuleValues.NOT_ALL)
 
 
+class TestRiskSummary(base.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.result = os.path.join(self.temp_dir, 'result.xml')
+        content = FileHelper.get_file_content(os.path.join(os.getcwd(), 'tests', 'generated_results',
+                                                           'inplace_combined_risk_test.xml'), 'rb', decode_flag=False)
+        content = content.replace(b'INPLACE_TAG1', b'preupg.risk.SLIGHT: Slight risk\npreupg.log.DEBUG: Debug\n'
+                                                   b'preupg_log_DEBUG: Not debug\n'
+                                                   b'preupg.risk.HIGH: High risk\npreupg.risk.HIGH: High risk')
+        content = content.replace(b'INPLACE_TAG2', b'')
+        content = content.replace(b'RESULT_VALUE1', b'needs_action').replace(b'RESULT_VALUE2', b'pass')
+        FileHelper.write_to_file(self.result, 'wb', content)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_summary(self):
+        summary_file = os.path.join(self.temp_dir, 'result' + settings.risk_summary_suffix)
+        self.assertEqual(RiskSummary.load(self.result), None)
+        self.assertEqual(XccdfHelper.check_inplace_risk(self.result, 0), ModuleValues.NEEDS_ACTION)
+        self.assertTrue(os.path.exists(summary_file))
+        rules = RiskSummary.load(self.result)
+        self.assertEqual(rules, [('xccdf_preupg_rule_dummy_preupg_dummy1', 'needs_action',
+                                  ['preupg.risk.SLIGHT: Slight risk', 'preupg.risk.HIGH: High risk']),
+                                 ('xccdf_preupg_rule_dummy_preupg_dummy2', 'pass', [])])
+        self.assertEqual(XccdfHelper.get_max_risk(rules[0][2]), 'HIGH')
+        self.assertEqual(XccdfHelper.get_max_risk(rules[1][2]), None)
+        # the summary is used instead of the XML file
+        RiskSummary.write(self.result, [('xccdf_preupg_rule_dummy_preupg_dummy1', 'error', [])])
+        self.assertEqual(XccdfHelper.check_inplace_risk(self.result, 0), ModuleValues.ERROR)
+        # until the XML file changes
+        FileHelper.write_to_file(self.result, 'ab', '\n')
+        self.assertEqual(RiskSummary.load(self.result), None)
+        self.assertEqual(XccdfHelper.check_inplace_risk(self.result, 0), ModuleValues.NEEDS_ACTION)
+        self.assertEqual(len(RiskSummary.load(self.result)), 2)
+
+    def test_extract_risks(self):
+        rp = ReportParser(self.result)
+        risks = rp.extract_risks(remove_debug=True)
+        self.assertEqual(risks, {'xccdf_preupg_rule_dummy_preupg_dummy1': ['preupg.risk.SLIGHT: Slight risk',
+                                                                           'preupg.risk.HIGH: High risk'],
+                                 'xccdf_preupg_rule_dummy_preupg_dummy2': []})
+        content = FileHelper.get_file_content(self.result, 'rb')
+        self.assertFalse('preupg.log.DEBUG' in content)
+        self.assertTrue('preupg_log_DEBUG: Not debug' in content)
+        self.assertTrue('preupg.risk.HIGH' in content)
+        # later consumers use the extracted risks
+        rp.risks['xccdf_preupg_rule_dummy_preupg_dummy2'] = ['preupg.risk.MEDIUM: Cached risk']
+        self.assertEqual(rp.get_rule_risks()[1], ('xccdf_preupg_rule_dummy_preupg_dummy2', 'pass',
+                                                  ['preupg.risk.MEDIUM: Cached risk']))
+        self.assertEqual(ReportParser(self.result).get_rule_risks(), XccdfHelper.get_rule_risks(
+            XccdfHelper.iter_elements(self.result, 'rule-result')))
+
+
 def suite():
     loader = unittest.TestLoader()
     suite = unittest.TestSuite()
     suite.addTest(loader.loadTestsFromTestCase(TestRiskCheck))
     suite.addTest(loader.loadTestsFromTestCase(TestCombinedRiskCheck))
+    suite.addTest(loader.loadTestsFromTestCase(TestRiskSummary))
     return suite
 
 if __name__ == '__main__':
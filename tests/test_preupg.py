@@ -3,13 +3,19 @@ import unittest
 import tempfile
 import shutil
 import os
+import time
+import tarfile
 
 from preupg.application import Application
 from preupg.conf import Conf, DummyConf
 from preupg.cli import CLI
 from preupg import settings, xml_manager
-from preupg.utils import PostupgradeHelper, SystemIdentification, FileHelper, OpenSCAPHelper
+from preupg.settings import ReturnValues
+from preupg.utils import PostupgradeHelper, SystemIdentification, FileHelper, OpenSCAPHelper, TarballHelper
+from preupg.utils import DirHelper
 from preupg.report_parser import ReportParser
+from preupg.scanning import ScanProgress
+from preupg.xccdf import XccdfHelper
 
 try:
     import base
@@ -171,6 +177,115 @@ class TestXMLUpdates(base.TestCase):
 
         self.assertEquals(found_current, 1)
 
+    def test_batch_changes(self):
+        shutil.copyfile(self.content, self.test_content)
+        rp = ReportParser(self.test_content)
+        original = FileHelper.get_file_content(self.test_content, 'rb', False, False)
+        rp.begin()
+        rp.modify_platform_tag("12")
+        rp.modify_result_path("/abc/def", "FOOBAR6_7", 'migrate')
+        # nothing is written before commit
+        self.assertEqual(FileHelper.get_file_content(self.test_content, 'rb', False, False), original)
+        rp.commit()
+        batched = FileHelper.get_file_content(self.test_content, 'rb', False, False)
+        self.assertNotEqual(batched, original)
+        shutil.copyfile(self.content, self.test_content)
+        rp = ReportParser(self.test_content)
+        rp.modify_platform_tag("12")
+        rp.modify_result_path("/abc/def", "FOOBAR6_7", 'migrate')
+        self.assertEqual(FileHelper.get_file_content(self.test_content, 'rb', False, False), batched)
+
+
+class TestReportIndexes(base.TestCase):
+
+    rule1 = "xccdf_preupg_rule_dummy_preupg_dummy1"
+    rule2 = "xccdf_preupg_rule_dummy_preupg_dummy2"
+
+    def setUp(self):
+        self.rp = ReportParser(os.path.join('tests', 'generated_results', 'inplace_combined_risk_test.xml'))
+
+    def test_lookups(self):
+        self.assertEqual(self.rp.get_rule(self.rule1).get('id'), self.rule1)
+        self.assertEqual(self.rp.get_select(self.rule2).get('idref'), self.rule2)
+        self.assertEqual(self.rp.get_rule_result(self.rule2).get('idref'), self.rule2)
+        self.assertEqual(self.rp.get_rule("xccdf_preupg_rule_dummy_preupg"), None)
+        self.assertEqual(self.rp.get_name_of_checks(), {self.rule1: "Dummy content",
+                                                        self.rule2: "Dummy content"})
+        self.assertEqual(self.rp.check_rules([self.rule1, "dummy2", "dummy3"]), ["dummy3"])
+
+    def test_update_data(self):
+        progress = ScanProgress(2, False, quiet=True)
+        progress.output_data = ["Dummy:%s:fail" % self.rule1,
+                                "Dummy:%s1:fail" % self.rule1,
+                                "Dummy:%s:fail" % self.rule2]
+        progress.update_data(["%s:needs_action" % self.rule1, "%s:needs_inspection" % self.rule1])
+        self.assertEqual(progress.get_output_data(), ["Dummy:%s:needs_action" % self.rule1,
+                                                      "Dummy:%s1:fail" % self.rule1,
+                                                      "Dummy:%s:fail" % self.rule2])
+
+
+class TestReportStream(base.TestCase):
+
+    result = os.path.join('tests', 'generated_results', 'inplace_combined_risk_test.xml')
+
+    def test_stream(self):
+        rp = ReportParser(self.result)
+        stream = ReportParser(self.result, stream=True)
+        self.assertEqual(stream.target_tree, None)
+        self.assertEqual([x.get('idref') for x in stream.get_all_result_rules()],
+                         [x.get('idref') for x in rp.get_all_result_rules()])
+        self.assertEqual([x.text for x in stream.get_all_results()],
+                         [x.text for x in rp.get_all_results()])
+        self.assertEqual(stream.get_solution_files(), rp.get_solution_files())
+        self.assertEqual(stream.get_rule_risks(), rp.get_rule_risks())
+
+    def test_elements_freed(self):
+        rules = XccdfHelper.iter_elements(self.result, "rule-result")
+        first = next(rules)
+        self.assertTrue(len(first))
+        second = next(rules)
+        self.assertEqual(len(first), 0)
+        self.assertEqual(second.get('idref'), "xccdf_preupg_rule_dummy_preupg_dummy2")
+        self.assertEqual(list(rules), [])
+
+
+class TestReportSplit(base.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.result = os.path.join(self.temp_dir, 'result.xml')
+        shutil.copyfile(os.path.join('tests', 'generated_results', 'inplace_combined_risk_test.xml'), self.result)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _get_rule_results(self, path):
+        return [x.get('idref') for x in ReportParser(path).get_all_result_rules()]
+
+    def test_split_reports(self):
+        rp = ReportParser(self.result)
+        # the second module is for users
+        for values in rp.get_nodes(rp.target_tree, "Value", prefix='.//'):
+            if values.get('id') == 'xccdf_preupg_value_dummy_preupg_dummy2_state_result_part':
+                rp.get_nodes(values, "value")[0].text = 'user'
+        reports = rp.split_reports(['admin', 'user'])
+        self.assertEqual(reports, {'admin': os.path.join(self.temp_dir, 'result-admin.xml'),
+                                   'user': os.path.join(self.temp_dir, 'result-user.xml')})
+        self.assertEqual(self._get_rule_results(reports['admin']), ['xccdf_preupg_rule_dummy_preupg_dummy1'])
+        self.assertEqual(self._get_rule_results(reports['user']), ['xccdf_preupg_rule_dummy_preupg_dummy2'])
+        # the loaded tree is not changed
+        self.assertEqual(len(rp.get_all_result_rules()), 2)
+        self.assertEqual(rp.get_report_type('user'), reports['user'])
+
+    def test_modules_of_one_group(self):
+        FileHelper.write_to_file(os.path.join(self.temp_dir, 'result-user.xml'), 'wb', "old report")
+        rp = ReportParser(self.result)
+        reports = rp.split_reports(['admin', 'user'])
+        self.assertEqual(list(reports.keys()), ['admin'])
+        self.assertEqual(self._get_rule_results(reports['admin']), ['xccdf_preupg_rule_dummy_preupg_dummy1',
+                                                                    'xccdf_preupg_rule_dummy_preupg_dummy2'])
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'result-user.xml')))
+
 
 class TestCLI(base.TestCase):
     def test_opts(self):
@@ -305,6 +420,32 @@ class TestScenario(base.TestCase):
         a.basename = os.path.basename(a.content)
         self.assertEqual(a.get_scenario(), "FOOBAR6_77")
 
+    def test_plan(self):
+        common_scripts = os.path.join(self.temp_dir, 'scripts.txt')
+        FileHelper.write_to_file(common_scripts, 'w', "echo common=common.log=COMMON=Common=NO\n")
+        conf = {
+            "contents": "tests/FOOBAR6_7/dummy_preupg/all-xccdf-upgrade.xml",
+            "profile": "xccdf_preupg_profile_default",
+            "assessment_results_dir": self.temp_dir,
+            "skip_common": False,
+            "common_scripts": common_scripts,
+            "cache_dir": self.temp_dir,
+            "plan": True,
+            "temp_dir": self.temp_dir,
+            "id": None,
+            "debug": True,  # so root check won't fail
+        }
+        dc = DummyConf(**conf)
+        cli = CLI(["--contents", "tests/FOOBAR6_7/dummy_preupg/all-xccdf-upgrade.xml", "--plan"])
+        a = Application(Conf(dc, settings, cli))
+        self.assertEqual(a.run(), 0)
+        # the plan does not gather common logs
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, settings.common_name)))
+        # the upgrade path is found in the source dir, it has no content
+        a.conf.contents = None
+        self.assertEqual(a.run(), ReturnValues.SCENARIO)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, settings.common_name)))
+
     def test_migration_content_scenario(self):
         """
         Basic test for whole program
@@ -378,6 +519,97 @@ class TestPremigratePrefix(base.TestCase):
         self.assertEqual(version, None)
 
 
+class TestThirdParty(base.TestCase):
+    temp_dir = None
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_result_namespace(self):
+        helper = OpenSCAPHelper(self.temp_dir, "result", "result.xml", "result.html", "all-xccdf.xml")
+        self.assertEqual(helper.get_default_xml_result_path(), os.path.join(self.temp_dir, "result.xml"))
+        helper = OpenSCAPHelper(self.temp_dir, "result", "result.xml", "result.html", "all-xccdf.xml",
+                                third_party="vendor")
+        self.assertEqual(helper.get_default_xml_result_path(), os.path.join(self.temp_dir, "vendor_result.xml"))
+        self.assertEqual(helper.get_default_html_result_path(), os.path.join(self.temp_dir, "vendor_result.html"))
+
+    def test_third_party_contents(self):
+        content = "tests/FOOBAR6_7/dummy_preupg/all-xccdf-migrate.xml"
+        a = setup_preupg_environment(["--contents", content], content, self.temp_dir)
+        third_party_dir = os.path.join(self.temp_dir, settings.add_ons)
+        for name in ['first', 'second']:
+            os.makedirs(os.path.join(third_party_dir, name))
+            shutil.copyfile(content, os.path.join(third_party_dir, name, settings.content_file))
+        special_pkg_list = os.path.join(self.temp_dir, settings.kickstart_dir, 'special_pkg_list')
+        os.makedirs(os.path.dirname(special_pkg_list))
+        FileHelper.write_to_file(special_pkg_list, 'w', "main\n")
+        running = []
+
+        class ThirdPartyScan(Application):
+
+            def run_scan_process(self, quiet=False):
+                running.append(self.third_party)
+                time.sleep(0.5)
+                # both contents are scanned at the same time
+                test.assertEqual(len(running), 2)
+                output = os.path.join(self.get_output_dir(), settings.kickstart_dir, 'special_pkg_list')
+                FileHelper.write_to_file(output, 'a', self.third_party + "\n")
+                self.scanning_progress = ScanProgress(0, False, quiet=quiet)
+                self.scanning_progress.output_data = [self.third_party]
+
+            def prepare_xml_for_html(self):
+                pass
+
+        test = self
+        a.__class__ = ThirdPartyScan
+        scans = a.run_third_party_modules(third_party_dir)
+        a.wait_third_party_modules(scans)
+        self.assertEqual(sorted(a.report_data), ['first', 'second'])
+        self.assertEqual(a.report_data['first'], ['first'])
+        self.assertEqual(a.third_party, "")
+        # outputs of the contents are merged
+        self.assertEqual(sorted(FileHelper.get_file_content(special_pkg_list, 'rb', True)),
+                         ["first\n", "main\n", "second\n"])
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, settings.add_ons_output_dir)))
+
+    def test_merge_dir(self):
+        source = os.path.join(self.temp_dir, 'source')
+        target = os.path.join(self.temp_dir, 'target')
+        for dir_name in [source, target]:
+            os.makedirs(os.path.join(dir_name, 'dirtyconf', 'etc'))
+            FileHelper.write_to_file(os.path.join(dir_name, 'dirtyconf', 'etc', 'same.conf'), 'w', "same\n")
+            FileHelper.write_to_file(os.path.join(dir_name, 'list'), 'w', os.path.basename(dir_name) + "\n")
+        os.makedirs(os.path.join(source, 'postupgrade.d', 'vendor'))
+        FileHelper.write_to_file(os.path.join(source, 'postupgrade.d', 'vendor', 'fix.sh'), 'w', "true\n")
+        DirHelper.merge_dir(source, target)
+        self.assertFalse(os.path.exists(source))
+        self.assertEqual(FileHelper.get_file_content(os.path.join(target, 'dirtyconf', 'etc', 'same.conf'), 'rb'),
+                         "same\n")
+        self.assertEqual(FileHelper.get_file_content(os.path.join(target, 'list'), 'rb'), "target\nsource\n")
+        self.assertTrue(os.path.exists(os.path.join(target, 'postupgrade.d', 'vendor', 'fix.sh')))
+
+    def test_tarball(self):
+        result_dir = os.path.join(self.temp_dir, 'preupgrade')
+        for dir_name in settings.preupgrade_dirs:
+            os.makedirs(os.path.join(result_dir, dir_name))
+        for file_name in [settings.PREUPG_README, 'result.xml', 'vendor_result.html', 'other_result.xml']:
+            FileHelper.write_to_file(os.path.join(result_dir, file_name), 'w', '')
+        tarball_result_dir = settings.tarball_result_dir
+        settings.tarball_result_dir = self.temp_dir
+        try:
+            tarball = TarballHelper.tarball_result_dir('preupg_test-{0}', result_dir, False,
+                                                       third_parties=['vendor'])
+        finally:
+            settings.tarball_result_dir = tarball_result_dir
+        names = [os.path.basename(x) for x in tarfile.open(tarball).getnames()]
+        self.assertTrue('result.xml' in names)
+        self.assertTrue('vendor_result.html' in names)
+        self.assertFalse('other_result.xml' in names)
+
+
 def suite():
     loader = unittest.TestLoader()
     suite = unittest.TestSuite()
@@ -388,9 +620,13 @@ def suite():
     suite.addTest(loader.loadTestsFromTestCase(TestHashes))
     suite.addTest(loader.loadTestsFromTestCase(TestSolutionReplacement))
     suite.addTest(loader.loadTestsFromTestCase(TestXMLUpdates))
+    suite.addTest(loader.loadTestsFromTestCase(TestReportIndexes))
+    suite.addTest(loader.loadTestsFromTestCase(TestReportStream))
+    suite.addTest(loader.loadTestsFromTestCase(TestReportSplit))
     suite.addTest(loader.loadTestsFromTestCase(TestScenario))
     suite.addTest(loader.loadTestsFromTestCase(TestPreupgradePrefix))
     suite.addTest(loader.loadTestsFromTestCase(TestPremigratePrefix))
+    suite.addTest(loader.loadTestsFromTestCase(TestThirdParty))
     return suite
 
 if __name__ == '__main__':
@@ -0,0 +1,658 @@
+from __future__ import unicode_literals
+import unittest
+import tempfile
+import shutil
+import os
+import time
+import threading
+import subprocess
+import signal
+
+try:
+    from xml.etree import ElementTree
+except ImportError:
+    from elementtree import ElementTree
+
+from preupg import sce
+from preupg.sce import SCEScanner, SCEHelper, SCERule, ModuleWatchdog, REUSED_MESSAGE, SKIPPED_MESSAGE
+from preupg.incremental import IncrementalCache
+from preupg.history import ModuleHistory
+from preupg.journal import ScanJournal
+from preupg.forkserver import ForkServer
+from preupg.scheduler import ModuleScheduler
+from preupg.utils import FileHelper, ProcessHelper, OutputTail
+from preupg.xccdf import XMLNS, XccdfHelper
+from preupg.xmlgen.compose import ComposeXML
+from preupg.exception import ModuleDependencyError
+from preupg import settings
+
+try:
+    import base
+except ImportError:
+    import tests.base as base
+
+CONTENT = """<?xml version="1.0" encoding="UTF-8"?>
+<Benchmark xmlns="http://checklists.nist.gov/xccdf/1.2" id="xccdf_preupg_benchmark_test">
+  <title>Test</title>
+  <Profile id="xccdf_preupg_profile_default">
+    <title>Default</title>
+    {selects}
+  </Profile>
+  <Value id="xccdf_preupg_value_tmp_preupgrade" operator="equals" type="string">
+    <value>/tmp/preupgrade</value>
+  </Value>
+  <Group id="xccdf_preupg_group_test">
+    <title>Test group</title>
+    {rules}
+  </Group>
+</Benchmark>
+"""
+
+RULE = """<Rule id="xccdf_preupg_rule_{name}" selected="true">
+      <title>{name}</title>
+      {requires}
+      <check system="http://open-scap.org/page/SCE">
+        <check-import import-name="stdout"/>
+        <check-import import-name="stderr"/>
+        <check-export export-name="TMP_PREUPGRADE" value-id="xccdf_preupg_value_tmp_preupgrade"/>
+        <check-content-ref href="{name}/check"/>
+      </check>
+    </Rule>
+"""
+
+SCRIPT = """#!/bin/bash
+echo "$XCCDF_VALUE_TMP_PREUPGRADE {name}"
+exit $XCCDF_RESULT_{result}
+"""
+
+
+class ScanTestCase(base.TestCase):
+
+    """Creates an assessment with four check scripts in a temporary directory"""
+
+    checks = [('first', 'PASS'), ('second', 'FAIL'),
+              ('third', 'NOT_APPLICABLE'), ('fourth', 'INFORMATIONAL')]
+    requires = {}
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.content = os.path.join(self.temp_dir, settings.content_file)
+        self.result = os.path.join(self.temp_dir, settings.xml_result_name)
+        rules = []
+        selects = []
+        for name, result in self.checks:
+            os.mkdir(os.path.join(self.temp_dir, name))
+            script = os.path.join(self.temp_dir, name, 'check')
+            FileHelper.write_to_file(script, 'w', SCRIPT.format(name=name, result=result))
+            os.chmod(script, 0o755)
+            rules.append(RULE.format(name=name, requires=self.requires.get(name, "")))
+            selects.append('<select idref="xccdf_preupg_rule_{0}" selected="true"/>'.format(name))
+        selects.append('<select idref="xccdf_preupg_rule_skipped" selected="false"/>')
+        rules.append(RULE.format(name='skipped', requires=""))
+        FileHelper.write_to_file(self.content, 'w', CONTENT.format(rules="".join(rules),
+                                                                   selects="".join(selects)))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _get_results(self):
+        tree = ElementTree.parse(self.result).getroot()
+        results = {}
+        for rule_result in tree.findall(".//" + XMLNS + "rule-result"):
+            stdout = None
+            for check_import in rule_result.findall(".//" + XMLNS + "check-import"):
+                if check_import.get("import-name") == "stdout":
+                    stdout = check_import.text
+            results[rule_result.get("idref")] = (rule_result.find(XMLNS + "result").text, stdout)
+        return results
+
+
+class TestSCEScanner(ScanTestCase):
+
+    requires = {'first': '<requires idref="xccdf_preupg_rule_fourth"/>',
+                'second': '<requires idref="xccdf_preupg_group_test"/>'}
+
+    def test_parallel_scan(self):
+        lines = []
+        scanner = SCEScanner(self.content, self.result, 2)
+        self.assertEqual(scanner.run(function=lines.append), 0)
+        results = self._get_results()
+        expected = {'first': 'pass', 'second': 'fail',
+                    'third': 'notapplicable', 'fourth': 'informational'}
+        for name, result in expected.items():
+            rule_id = 'xccdf_preupg_rule_' + name
+            self.assertEqual(results[rule_id], (result, "/tmp/preupgrade %s\n" % name))
+            self.assertTrue("%s:%s\n" % (rule_id, result) in lines)
+        self.assertEqual(results['xccdf_preupg_rule_skipped'][0], 'notselected')
+        self.assertEqual(len(lines), 4)
+
+    def test_missing_script(self):
+        os.unlink(os.path.join(self.temp_dir, 'first', 'check'))
+        SCEScanner(self.content, self.result, 1).run()
+        results = self._get_results()
+        self.assertEqual(results['xccdf_preupg_rule_first'][0], 'error')
+        self.assertEqual(results['xccdf_preupg_rule_second'][0], 'fail')
+
+    def test_dependencies(self):
+        scanner = SCEScanner(self.content, self.result, 4)
+        requires = dict((x.rule_id, [y.rule_id for y in deps]) for x, deps in scanner.get_requires().items())
+        self.assertEqual(requires['xccdf_preupg_rule_first'], ['xccdf_preupg_rule_fourth'])
+        self.assertEqual(sorted(requires['xccdf_preupg_rule_second']),
+                         ['xccdf_preupg_rule_first', 'xccdf_preupg_rule_fourth', 'xccdf_preupg_rule_third'])
+        lines = []
+        scanner.run(function=lines.append)
+        self.assertEqual(lines[-1], "xccdf_preupg_rule_second:fail\n")
+        self.assertTrue(lines.index("xccdf_preupg_rule_fourth:informational\n") <
+                        lines.index("xccdf_preupg_rule_first:pass\n"))
+
+    def test_cyclic_dependencies(self):
+        tree = ElementTree.parse(self.content).getroot()
+        ComposeXML.check_dependencies(tree)
+        rule = [x for x in tree.findall(".//" + XMLNS + "Rule") if x.get("id") == "xccdf_preupg_rule_fourth"][0]
+        ElementTree.SubElement(rule, XMLNS + "requires", {'idref': "xccdf_preupg_rule_second"})
+        self.assertRaises(ModuleDependencyError, ComposeXML.check_dependencies, tree)
+
+    def test_unknown_dependency(self):
+        tree = ElementTree.parse(self.content).getroot()
+        rule = tree.find(".//" + XMLNS + "Rule")
+        ElementTree.SubElement(rule, XMLNS + "requires", {'idref': "xccdf_preupg_group_missing"})
+        self.assertRaises(ModuleDependencyError, XccdfHelper.get_rule_dependencies, tree)
+        self.assertTrue(XccdfHelper.get_rule_dependencies(tree, ignore_unknown=True))
+
+    def test_result_names(self):
+        self.assertEqual(SCEHelper.get_result_name(101), 'pass')
+        self.assertEqual(SCEHelper.get_result_name(105), 'notapplicable')
+        self.assertEqual(SCEHelper.get_result_name(0), 'error')
+        self.assertEqual(SCEHelper.get_result_env()['XCCDF_RESULT_FIXED'], '109')
+
+
+class TestPlatform(ScanTestCase):
+
+    rhel6 = "cpe:/o:redhat:enterprise_linux:6"
+
+    def setUp(self):
+        super(TestPlatform, self).setUp()
+        self.redhat_release = sce.REDHAT_RELEASE
+        sce.REDHAT_RELEASE = os.path.join(self.temp_dir, 'redhat-release')
+        FileHelper.write_to_file(sce.REDHAT_RELEASE, 'w',
+                                 "Red Hat Enterprise Linux Server release 6.9 (Santiago)\n")
+
+    def tearDown(self):
+        sce.REDHAT_RELEASE = self.redhat_release
+        super(TestPlatform, self).tearDown()
+
+    def _set_platforms(self, benchmark, group):
+        content = FileHelper.get_file_content(self.content, 'r')
+        platform = '<title>{0}</title>\n  <platform idref="{1}"/>'
+        content = content.replace('<title>Test</title>', platform.format('Test', benchmark))
+        content = content.replace('<title>Test group</title>', platform.format('Test group', group))
+        FileHelper.write_to_file(self.content, 'w', content)
+
+    def test_system_platform(self):
+        self.assertEqual(SCEHelper.get_system_platform(), self.rhel6)
+        FileHelper.write_to_file(sce.REDHAT_RELEASE, 'w', "Fedora release 25 (Twenty Five)\n")
+        self.assertEqual(SCEHelper.get_system_platform(), None)
+        os.unlink(sce.REDHAT_RELEASE)
+        self.assertEqual(SCEHelper.get_system_platform(), None)
+
+    def test_is_platform_applicable(self):
+        self.assertTrue(SCEHelper.is_platform_applicable(self.rhel6, self.rhel6))
+        self.assertTrue(SCEHelper.is_platform_applicable("cpe:/o:redhat:enterprise_linux", self.rhel6))
+        self.assertFalse(SCEHelper.is_platform_applicable("cpe:/o:redhat:enterprise_linux:7", self.rhel6))
+        self.assertFalse(SCEHelper.is_platform_applicable(self.rhel6, None))
+        for idref in ["cpe:/o:redhat:enterprise_linux:6::server", "cpe:/o:centos:centos:6", "#platform"]:
+            self.assertEqual(SCEHelper.is_platform_applicable(idref, self.rhel6), None)
+
+    def test_applicable(self):
+        self._set_platforms(self.rhel6, "cpe:/o:redhat:enterprise_linux")
+        scanner = SCEScanner(self.content, self.result, 2)
+        self.assertEqual(len(scanner.get_rules()), 4)
+        self.assertEqual(scanner.get_unknown_platforms(), [])
+
+    def test_not_applicable(self):
+        self._set_platforms(self.rhel6, "cpe:/o:redhat:enterprise_linux:7")
+        lines = []
+        scanner = SCEScanner(self.content, self.result, 2)
+        self.assertEqual(scanner.get_rules(), [])
+        scanner.run(function=lines.append)
+        results = self._get_results()
+        # modules are not executed like by oscap
+        for name, dummy_result in self.checks:
+            rule_id = 'xccdf_preupg_rule_' + name
+            self.assertEqual(results[rule_id], ('notapplicable', None))
+            self.assertTrue("%s:notapplicable\n" % rule_id in lines)
+        self.assertEqual(results['xccdf_preupg_rule_skipped'][0], 'notselected')
+
+    def test_unknown_platform(self):
+        self._set_platforms(self.rhel6, "cpe:/o:centos:centos:6")
+        scanner = SCEScanner(self.content, self.result, 2)
+        self.assertEqual(scanner.get_unknown_platforms(), ["cpe:/o:centos:centos:6"])
+
+
+class TestIncremental(ScanTestCase):
+
+    def _get_cache(self, rpmdb_state=""):
+        common_scripts = os.path.join(self.temp_dir, 'scripts.txt')
+        FileHelper.write_to_file(common_scripts, 'w', "getent passwd=passwd.log=PASSWD=All users=YES=Users\n")
+        FileHelper.write_to_file(os.path.join(self.temp_dir, 'passwd.log'), 'w', "root\n")
+        return IncrementalCache('FOOBAR6_7', self.temp_dir, common_scripts,
+                                cache_file=os.path.join(self.temp_dir, 'incremental.json'),
+                                rpmdb_state=rpmdb_state, output_dir=self.temp_dir)
+
+    def _get_messages(self):
+        tree = ElementTree.parse(self.result).getroot()
+        messages = {}
+        for rule_result in tree.findall(".//" + XMLNS + "rule-result"):
+            messages[rule_result.get("idref")] = [x.text for x in rule_result.findall(XMLNS + "message")]
+        return messages
+
+    def test_reuse_results(self):
+        scanner = SCEScanner(self.content, self.result, 2, cache=self._get_cache())
+        scanner.run()
+        self.assertEqual(scanner.get_reused_count(), 0)
+        first_results = self._get_results()
+
+        script = os.path.join(self.temp_dir, 'second', 'check')
+        FileHelper.write_to_file(script, 'w', SCRIPT.format(name='changed', result='PASS'))
+        scanner = SCEScanner(self.content, self.result, 2, cache=self._get_cache())
+        scanner.run()
+        self.assertEqual(scanner.get_reused_count(), 3)
+        results = self._get_results()
+        messages = self._get_messages()
+        self.assertEqual(results['xccdf_preupg_rule_second'], ('pass', "/tmp/preupgrade changed\n"))
+        self.assertEqual(messages['xccdf_preupg_rule_second'], [])
+        for name in ['first', 'third', 'fourth']:
+            rule_id = 'xccdf_preupg_rule_' + name
+            self.assertEqual(results[rule_id], first_results[rule_id])
+            self.assertEqual(messages[rule_id], [REUSED_MESSAGE])
+
+    def test_changed_inputs(self):
+        SCEScanner(self.content, self.result, 2, cache=self._get_cache()).run()
+        scanner = SCEScanner(self.content, self.result, 2, cache=self._get_cache(rpmdb_state="changed"))
+        scanner.run()
+        self.assertEqual(scanner.get_reused_count(), 0)
+
+        SCEScanner(self.content, self.result, 2, cache=self._get_cache()).run()
+        cache = self._get_cache()
+        # common logs are read by API functions, the scripts do not mention them
+        FileHelper.write_to_file(os.path.join(self.temp_dir, 'passwd.log'), 'w', "root\nuser\n")
+        scanner = SCEScanner(self.content, self.result, 2, cache=cache)
+        scanner.run()
+        self.assertEqual(scanner.get_reused_count(), 0)
+
+    def test_side_outputs(self):
+        FileHelper.write_to_file(os.path.join(self.temp_dir, 'third', 'check'), 'w',
+                                 "#!/bin/bash\nmkdir -p ../postupgrade.d\necho 'fix' > ../postupgrade.d/fix.sh\n"
+                                 "exit $XCCDF_RESULT_FAIL\n")
+        SCEScanner(self.content, self.result, 1, cache=self._get_cache()).run()
+        shutil.rmtree(os.path.join(self.temp_dir, settings.postupgrade_dir))
+        scanner = SCEScanner(self.content, self.result, 1, cache=self._get_cache())
+        scanner.run()
+        # the module writing to postupgrade.d is executed again
+        self.assertFalse(scanner.results['xccdf_preupg_rule_third'].reused)
+        self.assertEqual(scanner.get_reused_count(), 3)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, settings.postupgrade_dir, 'fix.sh')))
+
+    def test_solution_text_restored(self):
+        FileHelper.write_to_file(os.path.join(self.temp_dir, 'third', 'check'), 'w',
+                                 "#!/bin/bash\necho 'solution' > solution.txt\nexit $XCCDF_RESULT_FAIL\n")
+        SCEScanner(self.content, self.result, 1, cache=self._get_cache()).run()
+        os.unlink(os.path.join(self.temp_dir, 'third', 'solution.txt'))
+        SCEScanner(self.content, self.result, 1, cache=self._get_cache()).run()
+        self.assertEqual(FileHelper.get_file_content(os.path.join(self.temp_dir, 'third', 'solution.txt'), 'rb'),
+                         "solution\n")
+
+
+class TestModuleHistory(ScanTestCase):
+
+    def test_records(self):
+        history = ModuleHistory(os.path.join(self.temp_dir, 'history.json'))
+        self.assertEqual(history.get_expected('rule'), None)
+        for duration in range(10):
+            history.add('rule', duration)
+        self.assertEqual(len(history.get_records('rule')), ModuleHistory.max_records)
+        self.assertEqual(history.get_expected('rule'), 7)
+        history.save()
+        self.assertEqual(ModuleHistory(history.history_file).get_expected('rule'), 7)
+
+    def test_longest_first(self):
+        history = ModuleHistory(os.path.join(self.temp_dir, 'history.json'))
+        history.add('xccdf_preupg_rule_second', 10)
+        history.add('xccdf_preupg_rule_fourth', 30)
+        history.add('xccdf_preupg_rule_first', 2)
+        # the third module without history is expected to take an average time
+        rules = SCEScanner(self.content, self.result, 2).get_rules()
+        self.assertEqual([x.rule_id for x in history.sort_longest_first(rules)],
+                         ['xccdf_preupg_rule_fourth', 'xccdf_preupg_rule_third',
+                          'xccdf_preupg_rule_second', 'xccdf_preupg_rule_first'])
+
+    def test_makespan(self):
+        self.assertEqual(ModuleHistory.get_makespan([5, 4, 3, 3, 2], 1), 17)
+        self.assertEqual(ModuleHistory.get_makespan([5, 4, 3, 3, 2], 2), 9)
+        self.assertEqual(ModuleHistory.get_makespan([], 4), 0)
+
+    def test_scan_updates_history(self):
+        history = ModuleHistory(os.path.join(self.temp_dir, 'history.json'))
+        SCEScanner(self.content, self.result, 2, history=history).run()
+        history = ModuleHistory(history.history_file)
+        for name, dummy_result in self.checks:
+            records = history.get_records('xccdf_preupg_rule_' + name)
+            self.assertEqual(len(records), 1)
+            self.assertTrue(records[0]['wall'] >= 0)
+            self.assertTrue(records[0]['cpu'] >= 0)
+            self.assertTrue(records[0]['rss'] > 0)
+
+
+class TestTimeout(ScanTestCase):
+
+    hung_script = """#!/bin/bash
+echo "partial output"
+sleep 30 &
+sleep 30
+exit $XCCDF_RESULT_PASS
+"""
+
+    def test_module_timeout(self):
+        FileHelper.write_to_file(os.path.join(self.temp_dir, 'third', 'check'), 'w', self.hung_script)
+        start = time.time()
+        scanner = SCEScanner(self.content, self.result, 2, module_timeout=1)
+        scanner.run()
+        self.assertTrue(time.time() - start < 10)
+        results = self._get_results()
+        self.assertEqual(results['xccdf_preupg_rule_third'], ('error', "partial output\n"))
+        self.assertTrue('killed' in scanner.results['xccdf_preupg_rule_third'].message)
+        self.assertEqual(results['xccdf_preupg_rule_first'][0], 'pass')
+        self.assertEqual(results['xccdf_preupg_rule_fourth'][0], 'informational')
+
+    def test_scan_timeout(self):
+        FileHelper.write_to_file(os.path.join(self.temp_dir, 'first', 'check'), 'w', self.hung_script)
+        start = time.time()
+        scanner = SCEScanner(self.content, self.result, 1, scan_timeout=1)
+        scanner.run()
+        self.assertTrue(time.time() - start < 10)
+        self.assertEqual(self._get_results()['xccdf_preupg_rule_first'], ('error', "partial output\n"))
+        for name in ['second', 'third', 'fourth']:
+            result = scanner.results['xccdf_preupg_rule_' + name]
+            self.assertEqual((result.result, result.message), ('error', SKIPPED_MESSAGE))
+
+    def test_ini_timeout(self):
+        rule = SCERule('rule', 'title', 'check', None, {'XCCDF_VALUE_TIMEOUT': ''})
+        self.assertEqual(rule.get_timeout(60), 60)
+        rule.exports['XCCDF_VALUE_TIMEOUT'] = '600'
+        self.assertEqual(rule.get_timeout(60), 600)
+        rule.exports['XCCDF_VALUE_TIMEOUT'] = '0'
+        self.assertEqual(rule.get_timeout(60), None)
+
+    def test_run_subprocess_timeout(self):
+        lines = []
+        start = time.time()
+        ret_val = ProcessHelper.run_subprocess("echo started; sleep 30 & sleep 30", shell=True,
+                                               function=lines.append, timeout=1)
+        self.assertTrue(time.time() - start < 10)
+        self.assertNotEqual(ret_val, 0)
+        self.assertEqual(lines, ["started\n"])
+
+    def _run_oscap(self, watchdog, count):
+        # every module runs 30 seconds and it is reported like 'oscap --progress'
+        modules = ''.join(["sleep 30; echo xccdf_preupg_rule_%s:error; " % x for x, dummy in self.checks[:count]])
+        lines = []
+        start = time.time()
+        ret_val = ProcessHelper.run_subprocess(modules + "echo finished", shell=True,
+                                               function=lines.append, watchdog=watchdog)
+        self.assertTrue(time.time() - start < 10)
+        self.assertEqual(ret_val, 0)
+        self.assertEqual(lines[-1], "finished\n")
+        return lines
+
+    def test_watchdog_ini_timeout(self):
+        rules = SCEScanner(self.content, None, 1).get_rules()
+        rules[0].exports['XCCDF_VALUE_TIMEOUT'] = '1'
+        rules[1].exports['XCCDF_VALUE_TIMEOUT'] = '2'
+        watchdog = ModuleWatchdog(None, rules)
+        self.assertEqual(watchdog.get_timeout(), 1)
+        self._run_oscap(watchdog, 2)
+        self.assertEqual(watchdog.current, 2)
+        self.assertEqual(watchdog.get_timeout(), None)
+
+    def test_watchdog_scan_timeout(self):
+        rules = SCEScanner(self.content, None, 1).get_rules()
+        watchdog = ModuleWatchdog(None, rules, scan_timeout=1)
+        # oscap finishes, remaining modules are killed as soon as they start
+        lines = self._run_oscap(watchdog, 4)
+        self.assertEqual(len([x for x in lines if x.startswith('xccdf_preupg_rule_')]), 4)
+        self.assertTrue(watchdog.skipping)
+
+    def test_forward_interrupt(self):
+        sp = subprocess.Popen(["sleep", "30"], preexec_fn=os.setpgrp)
+        ProcessHelper.add_process_group(sp.pid)
+        previous = ProcessHelper.forward_interrupt()
+        try:
+            self.assertTrue(previous is not None)
+            self.assertRaises(KeyboardInterrupt, os.kill, os.getpid(), signal.SIGINT)
+            self.assertEqual(sp.wait(), -signal.SIGINT)
+        finally:
+            ProcessHelper.remove_process_group(sp.pid)
+            signal.signal(signal.SIGINT, previous)
+        self.assertFalse(ProcessHelper.process_groups)
+
+    def test_run_subprocess_output(self):
+        output = os.path.join(self.temp_dir, 'output.log')
+        tail = OutputTail(2)
+        ret_val = ProcessHelper.run_subprocess("seq 1 10000; printf 'no new line'", shell=True,
+                                               output=output, tail=tail)
+        self.assertEqual(ret_val, 0)
+        content = FileHelper.get_file_content(output, 'rb')
+        self.assertEqual(len(content.splitlines()), 10001)
+        self.assertTrue(content.endswith("10000\nno new line"))
+        self.assertEqual(tail.get_lines(), ["9999", "10000", "no new line"])
+        tail = OutputTail(1)
+        ProcessHelper.run_subprocess(["echo", "-e", "a\\nb"], tail=tail)
+        self.assertEqual(tail.get_lines(), ["b"])
+
+    def test_descendants(self):
+        sp = subprocess.Popen(["/bin/bash", "-c", "sleep 30 & wait"])
+        try:
+            for dummy_index in range(50):
+                grandchildren = ProcessHelper.get_descendants(os.getpid(), min_depth=2)
+                if grandchildren:
+                    break
+                time.sleep(0.1)
+            self.assertTrue(sp.pid in ProcessHelper.get_descendants(os.getpid()))
+            self.assertFalse(sp.pid in grandchildren)
+            self.assertEqual(len(grandchildren), 1)
+        finally:
+            for pid in ProcessHelper.get_descendants(sp.pid):
+                os.kill(pid, 9)
+            sp.kill()
+            sp.wait()
+
+
+class TestForkServer(ScanTestCase):
+
+    python_script = """#!/usr/bin/env python
+import os
+import sys
+sys.stdout.write("%s {name} %s %d\\n" % (os.environ['XCCDF_VALUE_TMP_PREUPGRADE'],
+                                         os.path.basename(os.getcwd()), os.getppid()))
+sys.stderr.write("error output\\n")
+{end}
+"""
+
+    def setUp(self):
+        ScanTestCase.setUp(self)
+        self.forkserver = ForkServer()
+        self.forkserver.start()
+
+    def tearDown(self):
+        self.forkserver.stop()
+        ScanTestCase.tearDown(self)
+
+    def _write_script(self, name, end):
+        FileHelper.write_to_file(os.path.join(self.temp_dir, name, 'check'), 'w',
+                                 self.python_script.format(name=name, end=end))
+
+    def test_python_modules(self):
+        for name, result in self.checks[:3]:
+            self._write_script(name, "sys.exit(int(os.environ['XCCDF_RESULT_%s']))" % result)
+        self._write_script('fourth', "raise ValueError('broken module')")
+        server_pid = self.forkserver.process.pid
+        scanner = SCEScanner(self.content, self.result, 2, forkserver=self.forkserver)
+        scanner.run()
+        results = self._get_results()
+        for name, result in [('first', 'pass'), ('second', 'fail'), ('third', 'notapplicable')]:
+            self.assertEqual(results['xccdf_preupg_rule_' + name],
+                             (result, "/tmp/preupgrade %s %s %d\n" % (name, name, server_pid)))
+            self.assertEqual(scanner.results['xccdf_preupg_rule_' + name].stderr, "error output\n")
+        fourth = scanner.results['xccdf_preupg_rule_fourth']
+        self.assertEqual(fourth.result, 'error')
+        self.assertTrue('ValueError: broken module' in fourth.stderr)
+
+    def test_future_statements(self):
+        self._write_script('first', "sys.stdout.write(type('abc').__name__)")
+        scanner = SCEScanner(self.content, self.result, 2, forkserver=self.forkserver)
+        scanner.run()
+        # unicode_literals of the fork server does not apply to the script
+        self.assertTrue(scanner.results['xccdf_preupg_rule_first'].stdout.endswith("\nstr"))
+
+    def test_preloaded_script_api(self):
+        self._write_script('first', "preloaded = 'preupg.script_api' in sys.modules\n"
+                                    "from preupg.script_api import *\n"
+                                    "sys.stdout.write('%s %s %s' % (preloaded, MODULE_PATH, os.getcwd()))")
+        env = dict(os.environ)
+        os.environ['XCCDF_VALUE_CURRENT_DIRECTORY'] = self.temp_dir
+        os.environ['XCCDF_VALUE_MODULE_PATH'] = 'forked_module'
+        try:
+            scanner = SCEScanner(self.content, self.result, 2, forkserver=self.forkserver)
+            scanner.run()
+        finally:
+            os.environ.clear()
+            os.environ.update(env)
+        # script_api reads environment of the script, not of the fork server
+        self.assertTrue(scanner.results['xccdf_preupg_rule_first'].stdout.endswith(
+            "\nTrue forked_module %s" % self.temp_dir))
+
+    def test_bash_module_and_timeout(self):
+        self._write_script('first', "import time\ntime.sleep(30)")
+        start = time.time()
+        scanner = SCEScanner(self.content, self.result, 2, module_timeout=1, forkserver=self.forkserver)
+        scanner.run()
+        self.assertTrue(time.time() - start < 10)
+        self.assertEqual(scanner.results['xccdf_preupg_rule_first'].result, 'error')
+        self.assertTrue('killed' in scanner.results['xccdf_preupg_rule_first'].message)
+        # bash scripts are executed as usual
+        self.assertFalse(self.forkserver.can_run(os.path.join(self.temp_dir, 'second', 'check')))
+        self.assertEqual(self._get_results()['xccdf_preupg_rule_second'], ('fail', "/tmp/preupgrade second\n"))
+
+
+class TestScanJournal(ScanTestCase):
+
+    def test_resume(self):
+        journal = ScanJournal(self.temp_dir, 'FOOBAR6_7')
+        journal.set_prepared()
+        SCEScanner(self.content, self.result, 2, journal=journal).run()
+        # simulate an interruption after two modules and a killed write
+        lines = FileHelper.get_file_content(journal.journal_file, 'rb', True)
+        FileHelper.write_to_file(journal.journal_file, 'wb', ''.join(lines[:3]) + lines[3][:20])
+        for name in ['first', 'second', 'third', 'fourth']:
+            FileHelper.write_to_file(os.path.join(self.temp_dir, name, 'check'), 'w',
+                                     SCRIPT.format(name='rerun', result='PASS'))
+        journal = ScanJournal(self.temp_dir, 'FOOBAR6_7')
+        self.assertTrue(journal.is_prepared())
+        self.assertEqual(len(journal.results), 2)
+        scanner = SCEScanner(self.content, self.result, 2, journal=journal)
+        scanner.run()
+        self.assertEqual(scanner.get_resumed_count(), 2)
+        results = self._get_results()
+        rerun = [x for x in results if results[x][1] == "/tmp/preupgrade rerun\n"]
+        self.assertEqual(len(rerun), 2)
+        # rules finished after the resume are recorded too
+        self.assertEqual(len(ScanJournal(self.temp_dir, 'FOOBAR6_7').results), 4)
+
+    def test_interrupted(self):
+        journal = ScanJournal(self.temp_dir, 'FOOBAR6_7')
+        journal.set_prepared()
+        # oscap does not record results of modules
+        self.assertFalse(ScanJournal(self.temp_dir, 'FOOBAR6_7').is_interrupted())
+        SCEScanner(self.content, self.result, 2, journal=journal).run()
+        self.assertTrue(ScanJournal(self.temp_dir, 'FOOBAR6_7').is_interrupted())
+        journal.set_completed()
+        journal = ScanJournal(self.temp_dir, 'FOOBAR6_7')
+        self.assertTrue(journal.is_prepared())
+        self.assertFalse(journal.is_interrupted())
+
+    def test_other_content(self):
+        journal = ScanJournal(self.temp_dir, 'FOOBAR6_7')
+        journal.set_prepared()
+        SCEScanner(self.content, self.result, 2, journal=journal).run()
+        journal = ScanJournal(self.temp_dir, '3rdparty')
+        self.assertFalse(journal.is_prepared())
+        self.assertEqual(journal.results, {})
+
+
+class TestModuleScheduler(base.TestCase):
+
+    def test_all_tasks_done(self):
+        finished = []
+        results = ModuleScheduler(3).run(range(10), lambda x: x * x,
+                                         callback=lambda task, result: finished.append(task))
+        self.assertEqual(results, dict((x, x * x) for x in range(10)))
+        self.assertEqual(sorted(finished), list(range(10)))
+
+    def test_exception_is_raised(self):
+        def function(task):
+            if task == 2:
+                raise ValueError("task failed")
+            return task
+        self.assertRaises(ValueError, ModuleScheduler(2).run, range(4), function)
+
+    def test_requires(self):
+        finished = []
+        lock = threading.Lock()
+
+        def function(task):
+            time.sleep(0.05 * (3 - task))
+            with lock:
+                finished.append(task)
+        ModuleScheduler(3).run(range(3), function, requires={0: [1], 1: [2]})
+        self.assertEqual(finished, [2, 1, 0])
+
+    def test_exclusive(self):
+        running = []
+        overlaps = []
+        lock = threading.Lock()
+
+        def function(task):
+            with lock:
+                if running and (task == 'exclusive' or 'exclusive' in running):
+                    overlaps.append(task)
+                running.append(task)
+            time.sleep(0.02)
+            with lock:
+                running.remove(task)
+        tasks = ['a', 'b', 'exclusive', 'c', 'd']
+        results = ModuleScheduler(4).run(tasks, function, exclusive=set(['exclusive']))
+        self.assertEqual(sorted(results), sorted(tasks))
+        self.assertEqual(overlaps, [])
+
+    def test_cycle(self):
+        self.assertEqual(ModuleScheduler.find_cycle({1: [2], 2: [3], 3: [1]}), ['1', '2', '3', '1'])
+        self.assertEqual(ModuleScheduler.find_cycle({1: [2, 3], 2: [3], 3: []}), None)
+        self.assertRaises(ModuleDependencyError, ModuleScheduler(2).run, [1, 2], lambda x: x,
+                          requires={1: [2], 2: [1]})
+
+
+def suite():
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTest(loader.loadTestsFromTestCase(TestSCEScanner))
+    suite.addTest(loader.loadTestsFromTestCase(TestPlatform))
+    suite.addTest(loader.loadTestsFromTestCase(TestIncremental))
+    suite.addTest(loader.loadTestsFromTestCase(TestModuleHistory))
+    suite.addTest(loader.loadTestsFromTestCase(TestTimeout))
+    suite.addTest(loader.loadTestsFromTestCase(TestForkServer))
+    suite.addTest(loader.loadTestsFromTestCase(TestScanJournal))
+    suite.addTest(loader.loadTestsFromTestCase(TestModuleScheduler))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=3).run(suite())
@@ -469,6 +469,28 @@ A solution text for test suite"
         check_rpm_to = [x for x in lines if 'check_rpm_to "bash" "sed"' in x]
         self.assertTrue(check_rpm_to)
 
+    def test_xml_depends_on(self):
+        self.loaded_ini[self.filename][0]['depends_on'] = 'system/repos, packages'
+        self.loaded_ini[self.filename][0]['exclusive'] = 'yes'
+        self.xml_utils = XmlUtils(self.dirname, self.loaded_ini)
+        self.rule = self.xml_utils.prepare_sections()
+        self.assertTrue([x for x in self.rule if '<requires idref="xccdf_preupg_group_system_repos" />' in x])
+        self.assertTrue([x for x in self.rule if '<requires idref="xccdf_preupg_group_packages" />' in x])
+        self.assertTrue([x for x in self.rule if 'export-name="EXCLUSIVE"' in x])
+        self.assertFalse([x for x in self.rule if '{requires}' in x])
+
+    def test_xml_without_depends_on(self):
+        self.assertFalse([x for x in self.rule if '<requires' in x or '{requires}' in x])
+
+    def test_xml_timeout(self):
+        self.loaded_ini[self.filename][0]['timeout'] = '600'
+        self.xml_utils = XmlUtils(self.dirname, self.loaded_ini)
+        self.rule = self.xml_utils.prepare_sections()
+        self.assertTrue([x for x in self.rule if 'export-name="TIMEOUT"' in x])
+        self.loaded_ini[self.filename][0]['timeout'] = 'long'
+        self.xml_utils = XmlUtils(self.dirname, self.loaded_ini)
+        self.assertRaises(MissingTagsIniFileError, lambda: list(self.xml_utils.prepare_sections()))
+
 
 class TestIncorrectINI(base.TestCase):
 
@@ -0,0 +1,184 @@
+from __future__ import unicode_literals
+import unittest
+import tempfile
+import shutil
+import os
+import re
+
+from preupg import xmltree
+from preupg import settings
+from preupg.report_parser import ReportParser
+from preupg.scheduler import ModuleScheduler
+from preupg.utils import FileHelper, OpenSCAPHelper, SystemIdentification
+from preupg.xccdf import XccdfHelper, XMLNS
+
+try:
+    import base
+except ImportError:
+    import tests.base as base
+
+
+class TestXMLBackends(base.TestCase):
+
+    """Results of both backends have to be the same, lxml is tested only if it is installed"""
+
+    results_dir = os.path.join(os.path.dirname(__file__), 'generated_results')
+    xhtml = 'http://www.w3.org/1999/xhtml/'
+
+    def setUp(self):
+        self.backend = xmltree.get_backend()
+        self.files = sorted([os.path.join(self.results_dir, x) for x in os.listdir(self.results_dir)
+                             if x.endswith('.xml')])
+
+    def tearDown(self):
+        xmltree.set_backend(self.backend)
+
+    def _get_elements(self, root):
+        return [(x.tag, sorted(x.attrib.items()), (x.text or '').strip())
+                for x in xmltree.findall(root, './/*')]
+
+    @staticmethod
+    def _get_root_namespaces(data):
+        """Returns set of (prefix, uri) declared by the root element of the document"""
+        start = re.search(br'<[^?!][^>]*>', data).group(0)
+        return set([(x.decode('utf-8'), y.decode('utf-8'))
+                    for x, y in re.findall(br'xmlns(?::([\w.-]+))?="([^"]*)"', start)])
+
+    def _collect(self, backend):
+        xmltree.set_backend(backend)
+        data = {}
+        for file_name in self.files:
+            rp = ReportParser(file_name)
+            elements = self._get_elements(rp.target_tree)
+            xmltree.set_namespace(rp.target_tree, 'xhtml', self.xhtml)
+            serialized = xmltree.tostring(rp.target_tree)
+            root = xmltree.fromstring(serialized)
+            declared = self._get_root_namespaces(FileHelper.get_file_content(file_name, 'rb', False, False))
+            data[file_name] = {
+                'results': [(x.get('idref'), rp.get_nodes_text(x, 'result')) for x in rp.get_all_result_rules()],
+                'stream': [x.get('idref') for x in ReportParser(file_name, stream=True).get_all_result_rules()],
+                'names': rp.get_name_of_checks(),
+                'solutions': rp.get_solution_files(),
+                'risks': XccdfHelper.get_rule_risks(XccdfHelper.iter_elements(file_name, 'rule-result')),
+                'dependencies': XccdfHelper.get_rule_dependencies(rp.target_tree, ignore_unknown=True),
+                'elements': elements,
+                'serialized': self._get_elements(root),
+                # declarations of the root are kept
+                'namespaces': self._get_root_namespaces(serialized) & (declared | set([('xhtml', self.xhtml)])),
+            }
+        return data
+
+    def test_parity(self):
+        expected = self._collect('etree')
+        for data in expected.values():
+            self.assertTrue(data['results'])
+            self.assertEqual(data['stream'], [x[0] for x in data['results']])
+            self.assertEqual(data['serialized'], data['elements'])
+            self.assertTrue(('xhtml', self.xhtml) in data['namespaces'])
+        if xmltree.is_available('lxml'):
+            self.assertEqual(self._collect('lxml'), expected)
+
+    def test_set_namespace(self):
+        document = ('<Benchmark xmlns="%s" xmlns:dc="urn:dc" xmlns:unused="urn:unused">'
+                    '<dc:title/><Rule xmlns:other="urn:other"/></Benchmark>' % XMLNS.strip('{}'))
+        used = set([('', XMLNS.strip('{}')), ('dc', 'urn:dc'), ('xhtml', self.xhtml)])
+        for backend in xmltree.BACKENDS:
+            if not xmltree.is_available(backend):
+                continue
+            xmltree.set_backend(backend)
+            root = xmltree.fromstring(document.encode('utf-8'))
+            xmltree.set_namespace(root, 'xhtml', self.xhtml)
+            data = xmltree.tostring(root)
+            namespaces = self._get_root_namespaces(data)
+            # ElementTree does not keep prefixes of the parsed document
+            self.assertEqual(set([x[1] for x in namespaces]), set([x[1] for x in used]) |
+                             (set(['urn:unused']) if backend == 'lxml' else set()))
+            if backend == 'lxml':
+                self.assertEqual(namespaces, used | set([('unused', 'urn:unused')]))
+                self.assertTrue(b'xmlns:other="urn:other"' in data)
+
+    def test_findall(self):
+        for backend in xmltree.BACKENDS:
+            if not xmltree.is_available(backend):
+                continue
+            xmltree.set_backend(backend)
+            root = xmltree.parse(self.files[0])
+            for path in ['.//' + XMLNS + 'Rule', './' + XMLNS + 'TestResult/' + XMLNS + 'rule-result',
+                         XMLNS + 'Profile', './/' + XMLNS + 'missing']:
+                self.assertEqual([x.get('id') for x in xmltree.findall(root, path)],
+                                 [x.get('id') for x in root.findall(path)])
+
+    def test_backends(self):
+        self.assertTrue(xmltree.is_available('etree'))
+        self.assertRaises(ValueError, xmltree.set_backend, 'foo')
+        if not xmltree.is_available('lxml'):
+            self.assertRaises(ImportError, xmltree.set_backend, 'lxml')
+
+
+class TestXSLT(base.TestCase):
+
+    """HTML reports are generated in-process only if lxml is installed"""
+
+    stylesheet = os.path.join(os.getcwd(), 'data', 'report', 'simple', 'xccdf-report.xsl')
+    result = os.path.join(os.getcwd(), 'tests', 'generated_results', 'inplace_risk_test.xml')
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.data_dir = settings.data_dir
+        self.get_system = SystemIdentification.get_system
+
+    def tearDown(self):
+        settings.data_dir = self.data_dir
+        SystemIdentification.get_system = self.get_system
+        shutil.rmtree(self.temp_dir)
+
+    def test_transform(self):
+        if not xmltree.is_available('lxml'):
+            self.assertRaises(ImportError, xmltree.get_xslt, self.stylesheet)
+            return
+        # the stylesheet is compiled only once
+        self.assertTrue(xmltree.get_xslt(self.stylesheet) is xmltree.get_xslt(self.stylesheet))
+        expected = os.path.join(self.temp_dir, 'expected.html')
+        xmltree.transform(self.stylesheet, self.result, expected, {'pwd': self.temp_dir})
+        expected = FileHelper.get_file_content(expected, 'rb', decode_flag=False)
+        self.assertTrue(b'<html' in expected)
+
+        def transform(name):
+            html_file = os.path.join(self.temp_dir, name)
+            xmltree.transform(self.stylesheet, self.result, html_file, {'pwd': self.temp_dir})
+            return FileHelper.get_file_content(html_file, 'rb', decode_flag=False)
+        names = ['report%d.html' % x for x in range(8)]
+        results = ModuleScheduler(4).run(names, transform)
+        self.assertEqual([results[x] for x in names], [expected] * len(names))
+
+    def test_broken_stylesheet(self):
+        stylesheet = os.path.join(self.temp_dir, 'broken.xsl')
+        FileHelper.write_to_file(stylesheet, 'wb', '<xsl:stylesheet/>')
+        if not xmltree.is_available('lxml'):
+            return
+        self.assertRaises(xmltree.XSLTError, xmltree.get_xslt, stylesheet)
+        # the error is remembered
+        os.unlink(stylesheet)
+        self.assertRaises(xmltree.XSLTError, xmltree.get_xslt, stylesheet)
+
+    def test_generate_in_process(self):
+        html_file = os.path.join(self.temp_dir, 'result.html')
+        SystemIdentification.get_system = staticmethod(lambda: None)
+        settings.data_dir = os.path.join(os.getcwd(), 'data')
+        generated = OpenSCAPHelper.generate_in_process(self.result, html_file, old_style=True)
+        self.assertEqual(generated, xmltree.is_available('lxml'))
+        self.assertEqual(os.path.exists(html_file), generated)
+        # oscap is used if the stylesheet can not be compiled
+        settings.data_dir = self.temp_dir
+        self.assertFalse(OpenSCAPHelper.generate_in_process(self.result, html_file))
+
+
+def suite():
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTest(loader.loadTestsFromTestCase(TestXMLBackends))
+    suite.addTest(loader.loadTestsFromTestCase(TestXSLT))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=3).run(suite())